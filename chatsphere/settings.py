@@ -236,6 +236,28 @@ SOCIALACCOUNT_PROVIDERS = {
     },
 }
 
+# Cache: Redis when CACHE_REDIS_URL is set, per-process memory otherwise. LocMemCache
+# is only safe for a single process: invalidations (cache.delete, version bumps) never
+# reach the other HTTP workers or the Daphne processes, so run several with Redis
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv('CACHE_REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Mutual-connection sets are cached until a Connection write bumps their version. That
+# bump only reaches every process through a shared cache, so with LocMemCache they
+# also expire after ADJACENCY_CACHE_TTL seconds
+ADJACENCY_CACHE_TTL = None if os.getenv('CACHE_REDIS_URL') else int(os.getenv('ADJACENCY_CACHE_TTL', '30'))
+
 # Django Channels Configuration
 ASGI_APPLICATION = "chatsphere.asgi.application"
 
@@ -254,3 +276,36 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Aura recalculation: read paths serve the cached total and queue a background
+# recompute when the row is dirty or older than AURA_RECALC_MAX_AGE seconds
+AURA_RECALC_MAX_AGE = int(os.getenv('AURA_RECALC_MAX_AGE', '3600'))
+AURA_RECALC_ASYNC = os.getenv('AURA_RECALC_ASYNC', 'True') == 'True'
+
+# Leaderboard cache: the first LEADERBOARD_CACHE_PAGES pages are cached for up to
+# LEADERBOARD_CACHE_TTL seconds and invalidated when an aura change reaches them
+LEADERBOARD_CACHE_PAGES = int(os.getenv('LEADERBOARD_CACHE_PAGES', '5'))
+LEADERBOARD_CACHE_TTL = int(os.getenv('LEADERBOARD_CACHE_TTL', '300'))
+
+# Chat read receipts are buffered per socket and written as one UPDATE after
+# READ_RECEIPT_FLUSH_DELAY seconds, or once READ_RECEIPT_BATCH_SIZE ids are queued
+READ_RECEIPT_FLUSH_DELAY = float(os.getenv('READ_RECEIPT_FLUSH_DELAY', '0.5'))
+READ_RECEIPT_BATCH_SIZE = int(os.getenv('READ_RECEIPT_BATCH_SIZE', '50'))
+
+# Write-behind chat persistence (opt-in): messages are broadcast straight away and
+# stored in bulk once CHAT_WRITE_BEHIND_BATCH_SIZE are buffered or after
+# CHAT_WRITE_BEHIND_FLUSH_INTERVAL seconds. Batches the database rejects are
+# appended to CHAT_WRITE_BEHIND_SPOOL and stored by `manage.py replay_message_spool`
+CHAT_WRITE_BEHIND = os.getenv('CHAT_WRITE_BEHIND', 'False') == 'True'
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv('CHAT_WRITE_BEHIND_BATCH_SIZE', '200'))
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('CHAT_WRITE_BEHIND_FLUSH_INTERVAL', '0.2'))
+CHAT_WRITE_BEHIND_SPOOL = os.getenv('CHAT_WRITE_BEHIND_SPOOL', str(BASE_DIR / 'message_spool.jsonl'))
+
+# Presence: each open socket is kept alive in Redis (the channel layer's first host) for
+# PRESENCE_TTL seconds and refreshed every PRESENCE_HEARTBEAT_INTERVAL seconds
+PRESENCE_TTL = int(os.getenv('PRESENCE_TTL', '90'))
+PRESENCE_HEARTBEAT_INTERVAL = int(os.getenv('PRESENCE_HEARTBEAT_INTERVAL', '30'))
+
+# Chat tail cache: each process keeps the newest CHAT_TAIL_CACHE_MESSAGES messages of
+# its CHAT_TAIL_CACHE_CONVERSATIONS most recently opened conversations in memory
+CHAT_TAIL_CACHE_CONVERSATIONS = int(os.getenv('CHAT_TAIL_CACHE_CONVERSATIONS', '1000'))
+CHAT_TAIL_CACHE_MESSAGES = int(os.getenv('CHAT_TAIL_CACHE_MESSAGES', '50'))
@@ -29,4 +29,7 @@ urlpatterns = [
     # Send Notification / Announcement
     path('users/<int:user_id>/notify/', views.send_user_notification, name='send_user_notification'),
     path('broadcast/', views.send_broadcast, name='send_broadcast'),
+
+    # Chat tail cache counters
+    path('chat-cache/', views.chat_cache_stats, name='chat_cache_stats'),
 ]
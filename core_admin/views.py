@@ -3,7 +3,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Avg, Count, OuterRef, Q, Subquery, Sum
+from django.db.models import Case, Count, F, FloatField, Q, When
+from django.db.models.functions import Cast
 from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
@@ -13,6 +14,9 @@ from core_chatsphere.models import (
     AuraPoints, BannedAcc, Connection, ConversationMessage,
     DailyStreak, RatingPoints, Report, ModerationLog,
 )
+from core_chatsphere.leaderboard import cursor_page, get_top_payload
+from core_chatsphere.message_cache import tail_cache
+from core_chatsphere.utils import refresh_aura_if_stale
 
 User = get_user_model()
 
@@ -123,12 +127,19 @@ def user_list(request):
     q = request.GET.get('q', '').strip()
     filter_type = request.GET.get('filter', 'all')
 
+    # Rating stats come from the per-user histogram on AuraPoints (one LEFT JOIN)
     users = User.objects.annotate(
-        aura_total=Subquery(
-            AuraPoints.objects.filter(user=OuterRef('pk')).values('aura_points')[:1]
+        aura_total=F('aura__aura_points'),
+        rating_count=(
+            F('aura__rating_count_1') + F('aura__rating_count_2') + F('aura__rating_count_3')
+            + F('aura__rating_count_4') + F('aura__rating_count_5')
+        ),
+    ).annotate(
+        avg_rating=Case(
+            When(rating_count__gt=0, then=Cast('aura__rating_sum', FloatField()) / F('rating_count')),
+            default=None,
+            output_field=FloatField(),
         ),
-        rating_count=Count('ratings_received'),
-        avg_rating=Avg('ratings_received__rate_points'),
     ).order_by('-date_joined')
 
     if q:
@@ -163,30 +174,24 @@ def user_detail(request, user_id):
     user = get_object_or_404(User, id=user_id)
 
     aura, _ = AuraPoints.objects.get_or_create(user=user)
-    aura.recalc()
+    refresh_aura_if_stale(aura)
 
     streak, _ = DailyStreak.objects.get_or_create(user=user)
 
-    ratings_stats = RatingPoints.objects.filter(given_to=user).aggregate(
-        avg=Avg('rate_points'), total=Count('id')
-    )
-
     reports_received = Report.objects.filter(reported_to=user).order_by('-created_at')[:10]
     reports_made = Report.objects.filter(user=user).order_by('-created_at')[:10]
 
     ban = BannedAcc.objects.filter(user=user).first()
 
     # Connection count
-    outgoing = set(Connection.objects.filter(user=user).values_list('connection_with_id', flat=True))
-    incoming = set(Connection.objects.filter(connection_with=user).values_list('user_id', flat=True))
-    mutual_count = len(outgoing & incoming)
+    mutual_count = Connection.mutual_count(user)
 
     context = {
         'profile_user': user,
         'aura': aura,
         'streak': streak,
-        'avg_rating': round(ratings_stats['avg'] or 0, 1),
-        'total_ratings': ratings_stats['total'],
+        'avg_rating': round(aura.avg_rating, 1),
+        'total_ratings': aura.total_ratings,
         'reports_received': reports_received,
         'reports_made': reports_made,
         'ban': ban,
@@ -312,14 +317,18 @@ def connections_list(request):
 # ─────────────────────────────────────────────
 @admin_required
 def aura_list(request):
-    aura_qs = AuraPoints.objects.select_related('user').order_by('-aura_points')
+    aura_qs = AuraPoints.objects.select_related('user')
 
-    paginator = Paginator(aura_qs, 10)
-    page = paginator.get_page(request.GET.get('page'))
+    # Keyset pagination: deep pages cost the same as the first one
+    try:
+        page = cursor_page(aura_qs, request.GET.get('cursor'), 10)
+    except ValueError:
+        page = cursor_page(aura_qs, None, 10)
 
     context = {
         'aura_entries': page,
-        'total': paginator.count,
+        # From the cached leaderboard payload, so paging never runs a full COUNT
+        'total': get_top_payload()['total'],
     }
     return render(request, 'core_admin/aura.html', context)
 
@@ -426,3 +435,12 @@ def send_broadcast(request):
             return redirect('core_admin:dashboard')
             
     return render(request, 'core_admin/broadcast.html', {'users': users_list})
+
+
+# ─────────────────────────────────────────────
+# CHAT TAIL CACHE
+# ─────────────────────────────────────────────
+@admin_required
+def chat_cache_stats(request):
+    """Hit/miss counters of this process's chat tail cache, as JSON."""
+    return JsonResponse(tail_cache.stats())
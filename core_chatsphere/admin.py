@@ -4,7 +4,10 @@ from .models import *
 # Register your models here.
 admin.site.register(User)
 admin.site.register(AuraPoints)
+admin.site.register(AuraDailySnapshot)
+admin.site.register(AuraPeriodScore)
 admin.site.register(Connection)
+admin.site.register(ConnectionSuggestion)
 admin.site.register(ConversationMessage)
 admin.site.register(RatingPoints)
 admin.site.register(Report)
@@ -1,17 +1,26 @@
 """
 Django Channels WebSocket consumers for real-time messaging.
 Handles sending and receiving messages in real-time.
+
+UserConsumer (ws/user/) is one socket per user that carries every
+conversation, presence, notifications and bans. ChatConsumer
+(ws/chat/<user_id>/) is the same consumer pinned to a single conversation,
+kept for clients that open one socket per chat.
 """
 
 import json
 import asyncio
+import uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.utils import timezone
-from django.db.models import Q
-from .models import ConversationMessage
 from better_profanity import profanity
+from .message_buffer import message_buffer
+from .presence import get_presence_store
+from .utils import chat_room_name, user_group_name
 from .profanity_words import NEPALI_HINDI_PROFANITY
 
 # Load default profanity words list
@@ -22,95 +31,216 @@ profanity.add_censor_words(NEPALI_HINDI_PROFANITY)
 
 User = get_user_model()
 
+# Most messages streamed for one resume frame; the client resumes again while has_more
+RESUME_PAGE_SIZE = 200
+
+
+class UserConsumer(AsyncWebsocketConsumer):
+    """
+    Multiplexed WebSocket for everything a signed-in user receives.
+
+    Client frames name a conversation by the other user's id:
+        {"type": "subscribe", "conversation": 42}
+        {"type": "unsubscribe", "conversation": 42}
+        {"type": "chat_message", "conversation": 42, "message": "hi", "client_msg_id": "<uuid>"}
+        {"type": "mark_as_read", "conversation": 42, "message_id": 7}
+        {"type": "resume", "conversation": 42, "last_message_id": 1234}
 
-class ChatConsumer(AsyncWebsocketConsumer):
-    """WebSocket consumer for real-time chat functionality."""
+    Server frames about a conversation (chat_message, message_committed,
+    message_read, user_presence) carry the same "conversation" key;
+    notification frames are user-wide. The ban state is checked once at
+    connect and bans are then pushed through the user's group. A
+    conversation's room group is only joined, after one can_chat check,
+    when the client subscribes to or writes in it.
 
-    # Class-level set tracking user IDs that currently have a messaging
-    # WebSocket open.  Shared across all consumer instances in this process.
-    _online_users: set = set()
+    After a reconnect the client sends `resume` with the last message id it
+    saw; the missing messages are streamed in id order, followed by the other
+    user's read watermark and a `resumed` frame. Sends are de-duplicated by
+    client_msg_id, so a client can safely retry unacknowledged messages.
+    """
 
     async def connect(self):
         """Called when a WebSocket connection is established."""
-        self.user_id = self.scope['url_route']['kwargs']['user_id']
         self.user = self.scope['user']
-        self.room_name = f"chat_{min(self.user.id, self.user_id)}_{max(self.user.id, self.user_id)}"
+        self.rooms = {}
+        self._pending_reads = {}
+        self._pending_receipts = 0
+        self._read_flush_task = None
 
-        # Verify that the requesting user is allowed to chat with this user_id
-        if not await self.can_chat():
+        if not await self.authorize():
             await self.close()
             return
 
-        await self.channel_layer.group_add(self.room_name, self.channel_name)
-
-        # Join a global per-user presence group so other rooms can detect us
-        self.presence_group = f"presence_{self.user.id}"
-        await self.channel_layer.group_add(self.presence_group, self.channel_name)
-        ChatConsumer._online_users.add(self.user.id)
+        # Bans and notifications are pushed to this group
+        self.user_group = user_group_name(self.user.id)
+        await self.channel_layer.group_add(self.user_group, self.channel_name)
 
         await self.accept()
 
-        # Notify the chat room that this user is now online
-        await self.channel_layer.group_send(
-            self.room_name,
-            {
-                'type': 'user_presence',
-                'user_id': self.user.id,
-                'status': 'online',
-            }
-        )
+        # Register this socket; only the user's first open socket announces them online
+        self.presence = get_presence_store()
+        if await self.presence.connect(self.user.id, self.channel_name):
+            await self.broadcast_presence('online')
+        self._presence_task = asyncio.create_task(self._presence_heartbeat())
 
-        # Check if the OTHER user (the one we're chatting with) is already
-        # online on any messaging page and immediately send their status
-        peer_user_id = int(self.user_id)
-        peer_is_online = peer_user_id in ChatConsumer._online_users
-        await self.send(text_data=json.dumps({
-            'type': 'user_presence',
-            'user_id': peer_user_id,
-            'status': 'online' if peer_is_online else 'offline',
-        }))
+        await self.after_connect()
+
+    async def authorize(self):
+        """Whether the socket may open: a signed-in user without an active ban."""
+        return self.user.is_authenticated and not await self.is_banned()
+
+    async def after_connect(self):
+        """Hook run once the socket is accepted and registered."""
 
     async def disconnect(self, close_code):
         """Called when a WebSocket connection is closed."""
-        # Leave the global presence group
-        if hasattr(self, 'presence_group'):
-            await self.channel_layer.group_discard(self.presence_group, self.channel_name)
-            ChatConsumer._online_users.discard(self.user.id)
-
-        # Notify the other user that this user is now offline
-        if hasattr(self, 'room_name'):
+        # Persist read receipts still waiting for the debounce window
+        if getattr(self, '_pending_reads', None):
+            await self.flush_read_receipts()
+
+        if hasattr(self, 'presence'):
+            self._presence_task.cancel()
+            # Announce offline only once the user's last socket has closed
+            if await self.presence.disconnect(self.user.id, self.channel_name):
+                await self.broadcast_presence('offline')
+
+        if hasattr(self, 'user_group'):
+            await self.channel_layer.group_discard(self.user_group, self.channel_name)
+        for room_name in getattr(self, 'rooms', {}).values():
+            await self.channel_layer.group_discard(room_name, self.channel_name)
+
+    async def _presence_heartbeat(self):
+        """Keep this socket's presence entry from expiring while it stays open."""
+        while True:
+            await asyncio.sleep(settings.PRESENCE_HEARTBEAT_INTERVAL)
+            await self.presence.heartbeat(self.user.id, self.channel_name)
+
+    async def broadcast_presence(self, status):
+        """Send a presence change to the chat rooms shared with the user's mutual connections."""
+        for other_id in await self.mutual_connection_ids():
+            room_name = chat_room_name(self.user.id, other_id)
             await self.channel_layer.group_send(
-                self.room_name,
+                room_name,
                 {
                     'type': 'user_presence',
+                    'room': room_name,
                     'user_id': self.user.id,
-                    'status': 'offline',
+                    'status': status,
                 }
             )
-            await self.channel_layer.group_discard(self.room_name, self.channel_name)
+
+    async def join_room(self, peer_id):
+        """Join the conversation's room group without checking can_chat."""
+        room_name = chat_room_name(self.user.id, peer_id)
+        await self.channel_layer.group_add(room_name, self.channel_name)
+        self.rooms[peer_id] = room_name
+
+    async def subscribe(self, peer_id):
+        """Join the conversation's room group once the user may chat with peer_id."""
+        if peer_id in self.rooms:
+            return True
+        if peer_id == self.user.id or not await self.can_chat(peer_id):
+            return False
+        await self.join_room(peer_id)
+        return True
+
+    async def unsubscribe(self, peer_id):
+        room_name = self.rooms.pop(peer_id, None)
+        if room_name:
+            await self.channel_layer.group_discard(room_name, self.channel_name)
+
+    def peer_for_room(self, room_name):
+        """The other user of a chat_<low>_<high> room."""
+        low, high = (int(part) for part in room_name.split('_')[1:])
+        return high if low == self.user.id else low
+
+    def conversation_for(self, data):
+        """The other user's id a client frame is addressed to, or None."""
+        try:
+            return int(data.get('conversation'))
+        except (TypeError, ValueError):
+            return None
+
+    async def send_error(self, message, peer_id=None):
+        payload = {'type': 'error', 'message': message}
+        if peer_id is not None:
+            payload['conversation'] = peer_id
+        await self.send(text_data=json.dumps(payload))
 
     async def receive(self, text_data):
         """Called when a message is received from the WebSocket."""
-        # Terminate connection immediately if user is banned
-        if await self.is_user_banned():
-            await self.close()
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send_error('Invalid JSON payload')
             return
 
+        message_type = data.get('type')
+        peer_id = self.conversation_for(data)
+        if peer_id is None:
+            await self.send_error('Missing conversation')
+            return
+
+        if message_type == 'unsubscribe':
+            await self.unsubscribe(peer_id)
+            return
+        if not await self.subscribe(peer_id):
+            await self.send_error('You cannot chat with this user', peer_id)
+            return
+
+        if message_type == 'subscribe':
+            online = peer_id in await self.presence.online_ids([peer_id])
+            await self.send(text_data=json.dumps({
+                'type': 'subscribed',
+                'conversation': peer_id,
+                'status': 'online' if online else 'offline',
+            }))
+        elif message_type == 'resume':
+            await self.handle_resume(peer_id, data)
+        elif message_type == 'chat_message':
+            await self.handle_chat_message(peer_id, data)
+        elif message_type == 'mark_as_read':
+            await self.handle_mark_as_read(peer_id, data)
+
+    async def handle_resume(self, peer_id, data):
+        """Stream the messages stored after the client's last seen id, then the peer's read watermark."""
         try:
-            data = json.loads(text_data)
-            message_type = data.get('type')
+            last_message_id = max(int(data.get('last_message_id') or 0), 0)
+        except (TypeError, ValueError):
+            await self.send_error('Invalid last_message_id', peer_id)
+            return
 
-            if message_type == 'chat_message':
-                await self.handle_chat_message(data)
-            elif message_type == 'mark_as_read':
-                await self.handle_mark_as_read(data)
-        except json.JSONDecodeError:
+        rows, has_more, peer_watermark = await self.messages_after(peer_id, last_message_id)
+        for row in rows:
+            await self.send(text_data=json.dumps({
+                'type': 'chat_message',
+                'conversation': peer_id,
+                'message': row['conv_message'],
+                'sender_id': row['sender_id'],
+                'receiver_id': row['receiver_id'],
+                'created_at': row['created_at'].isoformat(),
+                'message_id': row['id'],
+                'client_msg_id': str(row['client_msg_id']) if row['client_msg_id'] else None,
+                'is_read': row['receiver_id'] == peer_id and row['id'] <= peer_watermark,
+            }))
+        if peer_watermark:
             await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Invalid JSON payload'
+                'type': 'message_read',
+                'conversation': peer_id,
+                'up_to_id': peer_watermark,
+                'user_id': peer_id,
             }))
 
-    async def handle_chat_message(self, data):
+        online = peer_id in await self.presence.online_ids([peer_id])
+        await self.send(text_data=json.dumps({
+            'type': 'resumed',
+            'conversation': peer_id,
+            'last_message_id': rows[-1]['id'] if rows else last_message_id,
+            'has_more': has_more,
+            'status': 'online' if online else 'offline',
+        }))
+
+    async def handle_chat_message(self, peer_id, data):
         """Handle incoming chat messages."""
         message = data.get('message', '').strip()
 
@@ -123,60 +253,169 @@ class ChatConsumer(AsyncWebsocketConsumer):
         message = await asyncio.to_thread(profanity.censor, message)
         print(f"[ChatSphere] Censor operation took: {(time.time() - t0) * 1000:.2f}ms")
 
+        try:
+            client_msg_id = uuid.UUID(str(data.get('client_msg_id')))
+        except ValueError:
+            client_msg_id = uuid.uuid4()
+
+        if settings.CHAT_WRITE_BEHIND:
+            await self.broadcast_then_buffer(peer_id, message, client_msg_id)
+            return
+
         # Save message to database
         t1 = time.time()
-        saved_message = await self.save_message(message)
+        saved_message = await self.save_message(peer_id, message, client_msg_id)
         print(f"[ChatSphere] Save to DB operation took: {(time.time() - t1) * 1000:.2f}ms")
 
-        if saved_message:
+        if not saved_message:
+            return
+        event = {
+            'type': 'chat_message',
+            'room': self.rooms[peer_id],
+            'message': saved_message['conv_message'],
+            'sender_id': saved_message['sender'],
+            'receiver_id': saved_message['receiver'],
+            'created_at': saved_message['created_at'],
+            'message_id': saved_message['id'],
+            'client_msg_id': saved_message['client_msg_id'],
+            'is_read': saved_message['is_read'],
+        }
+        if saved_message.get('duplicate'):
+            # A retry of a message already stored: only the sender needs its id again
+            await self.chat_message(event)
+        else:
             # Broadcast message to all users in the chat room
-            await self.channel_layer.group_send(
-                self.room_name,
-                {
-                    'type': 'chat_message',
-                    'message': saved_message['conv_message'],
-                    'sender_id': saved_message['sender'],
-                    'receiver_id': saved_message['receiver'],
-                    'created_at': saved_message['created_at'],
-                    'message_id': saved_message['id'],
-                    'is_read': saved_message['is_read'],
-                }
-            )
+            await self.channel_layer.group_send(self.rooms[peer_id], event)
+
+    async def broadcast_then_buffer(self, peer_id, message, client_msg_id):
+        """
+        Write-behind path: broadcast with the id and timestamp assigned here,
+        then leave storage to the process-wide buffer. message_id stays null
+        until the room receives the batch's message_committed event.
+        """
+        from .models import ConversationMessage
+
+        if client_msg_id in message_buffer:
+            return  # A retry of a message still waiting in the buffer; its ack is on the way
+        stored = await self.find_stored_message(client_msg_id)
+        if stored is not None:
+            # A retry of a message already flushed: echo it to the sender instead of broadcasting it again
+            await self.chat_message({
+                'room': self.rooms[peer_id],
+                'message': stored['conv_message'],
+                'sender_id': stored['sender'],
+                'receiver_id': stored['receiver'],
+                'created_at': stored['created_at'],
+                'message_id': stored['id'],
+                'client_msg_id': stored['client_msg_id'],
+                'is_read': stored['is_read'],
+            })
+            return
 
-    async def handle_mark_as_read(self, data):
-        """Handle marking messages as read."""
-        message_id = data.get('message_id')
+        msg = ConversationMessage(
+            sender_id=self.user.id,
+            receiver_id=peer_id,
+            conv_message=message,
+            created_at=timezone.now(),
+            client_msg_id=client_msg_id,
+        )
+        await self.channel_layer.group_send(
+            self.rooms[peer_id],
+            {
+                'type': 'chat_message',
+                'room': self.rooms[peer_id],
+                'message': msg.conv_message,
+                'sender_id': msg.sender_id,
+                'receiver_id': msg.receiver_id,
+                'created_at': msg.created_at.isoformat(),
+                'message_id': None,
+                'client_msg_id': str(client_msg_id),
+                'is_read': False,
+            }
+        )
+        await message_buffer.add(msg)
+
+    async def handle_mark_as_read(self, peer_id, data):
+        """
+        Queue read receipts for this socket. Accepts a single integer
+        `message_id` or a `message_ids` list of them, anything else gets an
+        error frame; the queue is flushed after READ_RECEIPT_FLUSH_DELAY
+        seconds, or straight away once READ_RECEIPT_BATCH_SIZE ids are waiting.
+        """
+        message_ids = data['message_ids'] if 'message_ids' in data else [data.get('message_id')]
+        if not isinstance(message_ids, list) or not all(
+            isinstance(message_id, int) and not isinstance(message_id, bool) for message_id in message_ids
+        ):
+            await self.send_error('message_ids must be a list of message ids', peer_id)
+            return
+        for message_id in message_ids:
+            self._pending_reads[peer_id] = max(self._pending_reads.get(peer_id, 0), message_id)
+            self._pending_receipts += 1
 
-        if message_id:
-            await self.mark_message_as_read(message_id)
+        if not self._pending_reads:
+            return
+        if self._pending_receipts >= settings.READ_RECEIPT_BATCH_SIZE:
+            await self.flush_read_receipts()
+        elif self._read_flush_task is None:
+            self._read_flush_task = asyncio.create_task(self._flush_read_receipts_later())
+
+    async def _flush_read_receipts_later(self):
+        await asyncio.sleep(settings.READ_RECEIPT_FLUSH_DELAY)
+        self._read_flush_task = None
+        await self.flush_read_receipts()
+
+    async def flush_read_receipts(self):
+        """Advance each conversation's read watermark to its highest queued id and broadcast one receipt each."""
+        if self._read_flush_task is not None:
+            self._read_flush_task.cancel()
+            self._read_flush_task = None
+        if not self._pending_reads:
+            return
 
-            # Broadcast read receipt to all users in the room
-            await self.channel_layer.group_send(
-                self.room_name,
-                {
-                    'type': 'message_read',
-                    'message_id': message_id,
-                    'user_id': self.user.id,
-                }
-            )
+        pending, self._pending_reads, self._pending_receipts = self._pending_reads, {}, 0
+        for peer_id, up_to_id in pending.items():
+            watermark = await self.mark_messages_as_read(peer_id, up_to_id)
+            if watermark:
+                # Everything addressed to us in this conversation up to the watermark is read
+                room_name = chat_room_name(self.user.id, peer_id)
+                await self.channel_layer.group_send(
+                    room_name,
+                    {
+                        'type': 'message_read',
+                        'room': room_name,
+                        'up_to_id': watermark,
+                        'user_id': self.user.id,
+                    }
+                )
 
     async def chat_message(self, event):
         """Send a chat message to the WebSocket."""
         await self.send(text_data=json.dumps({
             'type': 'chat_message',
+            'conversation': self.peer_for_room(event['room']),
             'message': event['message'],
             'sender_id': event['sender_id'],
             'receiver_id': event['receiver_id'],
             'created_at': event['created_at'],
             'message_id': event['message_id'],
+            'client_msg_id': event['client_msg_id'],
             'is_read': event['is_read'],
         }))
 
+    async def message_committed(self, event):
+        """Acknowledge buffered messages once their batch is stored."""
+        await self.send(text_data=json.dumps({
+            'type': 'message_committed',
+            'conversation': self.peer_for_room(event['room']),
+            'messages': event['messages'],
+        }))
+
     async def message_read(self, event):
         """Send a message read receipt to the WebSocket."""
         await self.send(text_data=json.dumps({
             'type': 'message_read',
-            'message_id': event['message_id'],
+            'conversation': self.peer_for_room(event['room']),
+            'up_to_id': event['up_to_id'],
             'user_id': event['user_id'],
         }))
 
@@ -184,65 +423,158 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """Send a user presence update to the WebSocket."""
         await self.send(text_data=json.dumps({
             'type': 'user_presence',
+            'conversation': self.peer_for_room(event['room']),
             'user_id': event['user_id'],
             'status': event['status'],
         }))
 
+    async def notification(self, event):
+        """Push a new notification to the WebSocket."""
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'id': event['id'],
+            'title': event['title'],
+            'message': event['message'],
+            'created_at': event['created_at'],
+        }))
+
+    async def account_banned(self, event):
+        """Close the socket as soon as the user is banned."""
+        await self.close(code=4003)
+
     @database_sync_to_async
-    def is_user_banned(self):
-        """Check if the current requesting user is banned."""
+    def is_banned(self):
         from .models import BannedAcc
+
         return BannedAcc.objects.filter(user=self.user, active=True).exists()
 
     @database_sync_to_async
-    def can_chat(self):
+    def mutual_connection_ids(self):
+        """Ids of the user's mutual connections, from the cached adjacency."""
+        from .utils import get_mutual_connection_ids
+
+        return get_mutual_connection_ids(self.user.id)
+
+    @database_sync_to_async
+    def can_chat(self, peer_id):
         """Check if the requesting user can chat with the target user."""
-        from .models import Connection, BannedAcc
+        from .models import BannedAcc
+        from .utils import is_mutual_connection
 
-        # If either user is banned, prevent chat connection
-        if BannedAcc.objects.filter(user=self.user, active=True).exists():
-            return False
-        if BannedAcc.objects.filter(user_id=self.user_id, active=True).exists():
+        # Check if both users are connected (cached mutual adjacency, no query on a warm cache)
+        if not is_mutual_connection(self.user.id, peer_id):
             return False
 
-        # Check if both users are connected (connection exists in either direction)
-        return Connection.objects.filter(
-            Q(user=self.user, connection_with_id=self.user_id) |
-            Q(user_id=self.user_id, connection_with=self.user)
-        ).exists()
+        # If either user is banned, prevent chat connection
+        return not BannedAcc.objects.filter(user_id__in=[self.user.id, peer_id], active=True).exists()
 
     @database_sync_to_async
-    def save_message(self, message):
-        """Save a message to the database."""
-        try:
-            other_user = User.objects.get(id=self.user_id)
-            msg = ConversationMessage.objects.create(
-                sender=self.user,
-                receiver=other_user,
-                conv_message=message,
-            )
+    def save_message(self, peer_id, message, client_msg_id=None):
+        """Save a message to the database, or return the stored one when client_msg_id repeats."""
+        from .models import Conversation
 
-            return {
-                'id': msg.id,
-                'sender': msg.sender.id,
-                'receiver': msg.receiver.id,
-                'conv_message': msg.conv_message,
-                'created_at': msg.created_at.isoformat(),
-                'is_read': msg.is_read,
-            }
+        try:
+            other_user = User.objects.get(id=peer_id)
+            # Stores the message and updates the conversation's inbox state atomically
+            msg = Conversation.send(self.user, other_user, message, client_msg_id=client_msg_id)
         except User.DoesNotExist:
             return None
+        except IntegrityError:
+            # client_msg_id already stored: the client retried a message we kept
+            return self._stored_message(client_msg_id)
+
+        return {
+            'id': msg.id,
+            'sender': msg.sender_id,
+            'receiver': msg.receiver_id,
+            'conv_message': msg.conv_message,
+            'created_at': msg.created_at.isoformat(),
+            'client_msg_id': str(msg.client_msg_id),
+            'is_read': False,
+            'duplicate': False,
+        }
+
+    def _stored_message(self, client_msg_id):
+        """This user's stored message with the given client_msg_id, shaped like save_message's result."""
+        from .models import ConversationMessage
+
+        msg = ConversationMessage.objects.filter(
+            client_msg_id=client_msg_id, sender=self.user
+        ).select_related('conversation').first()
+        if msg is None:
+            return None
+        return {
+            'id': msg.id,
+            'sender': msg.sender_id,
+            'receiver': msg.receiver_id,
+            'conv_message': msg.conv_message,
+            'created_at': msg.created_at.isoformat(),
+            'client_msg_id': str(msg.client_msg_id),
+            'is_read': msg.conversation.is_read(msg.id, msg.receiver_id),
+            'duplicate': True,
+        }
 
     @database_sync_to_async
-    def mark_message_as_read(self, message_id):
-        """Mark a message as read."""
-        try:
-            msg = ConversationMessage.objects.get(id=message_id)
-            if msg.receiver == self.user and not msg.is_read:
-                msg.is_read = True
-                msg.read_at = timezone.now()
-                msg.save()
-                return True
-        except ConversationMessage.DoesNotExist:
-            pass
-        return False
+    def find_stored_message(self, client_msg_id):
+        return self._stored_message(client_msg_id)
+
+    @database_sync_to_async
+    def messages_after(self, peer_id, last_message_id):
+        """
+        Up to RESUME_PAGE_SIZE messages of the conversation with ids above
+        last_message_id, whether more follow, and the peer's read watermark.
+        """
+        from .models import Conversation, ConversationMessage
+        from .serializers import MESSAGE_VALUE_FIELDS
+
+        conversation = Conversation.between(self.user, peer_id)
+        if conversation is None:
+            return [], False, 0
+        rows = list(
+            ConversationMessage.objects.filter(conversation=conversation, id__gt=last_message_id)
+            .order_by('id').values(*MESSAGE_VALUE_FIELDS)[:RESUME_PAGE_SIZE + 1]
+        )
+        return rows[:RESUME_PAGE_SIZE], len(rows) > RESUME_PAGE_SIZE, conversation.read_state(peer_id)[0]
+
+    @database_sync_to_async
+    def mark_messages_as_read(self, peer_id, up_to_id):
+        """Advance this user's read watermark; returns the new watermark or None."""
+        from .models import Conversation
+
+        return Conversation.advance_read_watermark(self.user, peer_id, up_to_id)
+
+
+class ChatConsumer(UserConsumer):
+    """
+    WebSocket consumer for a single conversation (ws/chat/<user_id>/).
+    Frames need no "conversation" key: every frame is about the chat with user_id.
+    """
+
+    async def connect(self):
+        """Called when a WebSocket connection is established."""
+        self.user_id = int(self.scope['url_route']['kwargs']['user_id'])
+        await super().connect()
+
+    async def authorize(self):
+        # Verify that the requesting user is allowed to chat with this user_id
+        # (also rejects a banned user), then join the room before announcing presence
+        if not await self.can_chat(self.user_id):
+            return False
+        await self.join_room(self.user_id)
+        return True
+
+    async def after_connect(self):
+        # Tell this socket whether the OTHER user is online on any worker
+        peer_is_online = self.user_id in await self.presence.online_ids([self.user_id])
+        await self.send(text_data=json.dumps({
+            'type': 'user_presence',
+            'conversation': self.user_id,
+            'user_id': self.user_id,
+            'status': 'online' if peer_is_online else 'offline',
+        }))
+
+    def conversation_for(self, data):
+        return self.user_id
+
+    async def unsubscribe(self, peer_id):
+        """The pinned conversation cannot be left; close the socket instead."""
@@ -1,4 +1,4 @@
-from core_chatsphere.models import Notification, ConversationMessage
+from core_chatsphere.models import Notification, Conversation
 
 def unread_notifications_count(request):
     """
@@ -16,6 +16,6 @@ def unread_messages_count(request):
     for authenticated users.
     """
     if request.user.is_authenticated:
-        count = ConversationMessage.objects.filter(receiver=request.user, is_read=False).count()
+        count = Conversation.total_unread(request.user)
         return {"unread_messages_count": count}
     return {"unread_messages_count": 0}
@@ -0,0 +1,435 @@
+"""
+Aura leaderboard helpers.
+Includes rank index maintenance, "around me" neighbourhood lookups, keyset
+(cursor) pagination over the (aura_points, id) ordering and the cached top pages.
+"""
+import base64
+import bisect
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Rank, RowNumber
+from django.utils import timezone
+
+from .models import AuraPoints
+
+
+def rebuild_ranks(batch_size=2000):
+    """
+    Recompute aura_rank and leaderboard_position for every AuraPoints row.
+
+    Ranks follow the leaderboard ordering (highest aura first); tied users share
+    an aura_rank but get distinct positions, broken by id. Every row is stamped
+    with the time the ranking was read, so rows changed afterwards are known stale.
+
+    Args:
+        batch_size (int): Rows written per bulk_update
+
+    Returns:
+        int: Number of rows ranked
+    """
+    ranked_at = timezone.now()
+    ranked = AuraPoints.objects.annotate(
+        computed_rank=Window(Rank(), order_by=F("aura_points").desc()),
+        computed_position=Window(RowNumber(), order_by=[F("aura_points").desc(), F("id").asc()]),
+    ).values_list("id", "computed_rank", "computed_position")
+
+    total = 0
+    batch = []
+    for aura_id, rank, position in ranked.iterator(chunk_size=batch_size):
+        batch.append(AuraPoints(id=aura_id, aura_rank=rank, leaderboard_position=position, ranked_at=ranked_at))
+        if len(batch) >= batch_size:
+            AuraPoints.objects.bulk_update(batch, ["aura_rank", "leaderboard_position", "ranked_at"])
+            total += len(batch)
+            batch = []
+    if batch:
+        AuraPoints.objects.bulk_update(batch, ["aura_rank", "leaderboard_position", "ranked_at"])
+        total += len(batch)
+    return total
+
+
+def rank_is_current(aura):
+    """True when the row's stored rank was computed after its last change."""
+    return aura.ranked_at is not None and aura.aura_rank is not None and aura.updated_at <= aura.ranked_at
+
+
+def get_user_rank(aura):
+    """
+    Get a user's leaderboard rank.
+
+    Uses the precomputed aura_rank when it is current and falls back to an
+    indexed count for rows added or changed since the last rebuild.
+
+    Args:
+        aura: The user's AuraPoints instance
+
+    Returns:
+        int: 1-based rank
+    """
+    if rank_is_current(aura):
+        return aura.aura_rank
+    return AuraPoints.objects.filter(aura_points__gt=aura.aura_points).count() + 1
+
+
+def get_neighbours(aura, n=5):
+    """
+    Get the leaderboard entries around a user, including the user.
+
+    The entries come from two indexed scans on (aura_points, id), so rows added
+    or changed since the last rank rebuild are placed correctly. Their
+    aura_rank and leaderboard_position are filled in from the first entry's
+    position and rank, which costs at most two indexed counts.
+
+    Args:
+        aura: The user's AuraPoints instance
+        n (int): Number of entries to return on each side
+
+    Returns:
+        list of AuraPoints ordered by leaderboard position (user loaded)
+    """
+    qs = AuraPoints.objects.select_related("user")
+    above = qs.filter(
+        Q(aura_points__gt=aura.aura_points) | Q(aura_points=aura.aura_points, id__lt=aura.id)
+    ).order_by("aura_points", "-id")[:n]
+    below = qs.filter(
+        Q(aura_points__lt=aura.aura_points) | Q(aura_points=aura.aura_points, id__gt=aura.id)
+    ).order_by("-aura_points", "id")[:n]
+    entries = list(reversed(list(above))) + [aura] + list(below)
+
+    first_position, rank = get_position(entries[0]), get_user_rank(entries[0])
+    for offset, entry in enumerate(entries):
+        if offset and entry.aura_points != entries[offset - 1].aura_points:
+            rank = first_position + offset
+        entry.leaderboard_position = first_position + offset
+        entry.aura_rank = rank
+    return entries
+
+
+LEADERBOARD_PAGE_SIZE = 10
+
+
+def encode_cursor(direction, aura_points, aura_id):
+    """
+    Build an opaque cursor token pointing just past an entry.
+
+    Args:
+        direction (str): "n" to page forward (after the entry), "p" to page back (before it)
+        aura_points (int): The boundary entry's aura points
+        aura_id (int): The boundary entry's AuraPoints id
+
+    Returns:
+        str: URL-safe token
+    """
+    raw = f"{direction}:{aura_points}:{aura_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor token built by encode_cursor.
+
+    Returns:
+        tuple: (direction, aura_points, id)
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        direction, aura_points, aura_id = raw.split(":")
+        if direction not in ("n", "p"):
+            raise ValueError(direction)
+        return direction, int(aura_points), int(aura_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class CursorPage:
+    """
+    One page of the leaderboard fetched by keyset pagination.
+
+    Each entry gets a `position` attribute (1-based row number on the board).
+    """
+
+    def __init__(self, entries, next_cursor, previous_cursor):
+        self.entries = entries
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def get_position(aura):
+    """
+    Get a user's 1-based row position on the leaderboard.
+
+    Uses the precomputed leaderboard_position when it is current and falls back
+    to an indexed count over (aura_points, id).
+    """
+    if rank_is_current(aura) and aura.leaderboard_position is not None:
+        return aura.leaderboard_position
+    return AuraPoints.objects.filter(
+        Q(aura_points__gt=aura.aura_points) | Q(aura_points=aura.aura_points, id__lt=aura.id)
+    ).count() + 1
+
+
+def cursor_page(queryset, cursor=None, limit=10, field="aura_points"):
+    """
+    Fetch one leaderboard page ordered by (-field, id) without OFFSET.
+
+    Every page is an index range scan starting at the cursor, so deep pages
+    cost the same as the first one.
+
+    Args:
+        queryset: Queryset to paginate (AuraPoints, or AuraPeriodScore with field="points")
+        cursor (str): Token from a previous page, or None for the first page
+        limit (int): Entries per page
+        field (str): Score field the board is ordered by
+
+    Returns:
+        CursorPage
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not cursor:
+        direction, entries = "n", list(queryset.order_by(f"-{field}", "id")[:limit + 1])
+        has_more, came_from_page = len(entries) > limit, False
+    else:
+        direction, score, entry_id = decode_cursor(cursor)
+        if direction == "n":
+            entries = list(
+                queryset.filter(
+                    Q(**{f"{field}__lt": score}) | Q(**{field: score, "id__gt": entry_id})
+                ).order_by(f"-{field}", "id")[:limit + 1]
+            )
+        else:
+            entries = list(
+                queryset.filter(
+                    Q(**{f"{field}__gt": score}) | Q(**{field: score, "id__lt": entry_id})
+                ).order_by(field, "-id")[:limit + 1]
+            )
+        has_more, came_from_page = len(entries) > limit, True
+
+    entries = entries[:limit]
+    if direction == "p":
+        entries.reverse()
+        has_next, has_previous = came_from_page, has_more
+    else:
+        has_next, has_previous = has_more, came_from_page
+
+    if entries:
+        first = entries[0]
+        if not cursor:
+            start = 1
+        elif isinstance(first, AuraPoints):
+            start = get_position(first)
+        else:
+            start = queryset.filter(
+                Q(**{f"{field}__gt": getattr(first, field)}) | Q(**{field: getattr(first, field), "id__lt": first.id})
+            ).count() + 1
+        for offset, entry in enumerate(entries):
+            entry.position = start + offset
+
+    return CursorPage(
+        entries,
+        next_cursor=encode_cursor("n", getattr(entries[-1], field), entries[-1].id) if entries and has_next else None,
+        previous_cursor=encode_cursor("p", getattr(entries[0], field), entries[0].id) if entries and has_previous else None,
+    )
+
+
+# ---------- Cached top pages ----------
+# The first LEADERBOARD_CACHE_PAGES pages are cached as one serialized payload
+# under a versioned key. Aura changes bump the version only when they can move
+# an entry into, out of or within the cached range. A missing version (never set,
+# or evicted) starts from the current time so it never revives an older payload.
+_VERSION_KEY = "leaderboard:version"
+_STALE_KEY = "leaderboard:top:stale"
+_REBUILD_LOCK_TIMEOUT = 30
+
+
+def _top_key(version):
+    return f"leaderboard:top:{version}"
+
+
+def _lock_key(version):
+    return f"leaderboard:rebuild:{version}"
+
+
+def serialize_entry(aura, position=None):
+    """Serialize an AuraPoints row (user loaded) into a leaderboard entry dict."""
+    return {
+        "id": aura.id,
+        "user_id": aura.user_id,
+        "username": aura.user.username,
+        "aura_points": aura.aura_points,
+        "position": getattr(aura, "position", None) if position is None else position,
+    }
+
+
+def build_top_payload():
+    """
+    Read the top cached pages of the leaderboard from the database.
+
+    Returns:
+        dict with entries, total and complete (True when the whole board fits)
+    """
+    capacity = settings.LEADERBOARD_CACHE_PAGES * LEADERBOARD_PAGE_SIZE
+    top = AuraPoints.objects.select_related("user").order_by("-aura_points", "id")[:capacity]
+    entries = [serialize_entry(aura, position) for position, aura in enumerate(top, start=1)]
+    complete = len(entries) < capacity
+    return {
+        "entries": entries,
+        "total": len(entries) if complete else AuraPoints.objects.count(),
+        "complete": complete,
+    }
+
+
+def get_top_payload():
+    """
+    Get the cached top pages, rebuilding them on a miss.
+
+    Only one caller rebuilds a given version (single-flight via cache.add); the
+    others serve the previous payload meanwhile, or briefly wait for the new
+    one on a cold cache.
+    """
+    version = cache.get_or_set(_VERSION_KEY, time.time_ns, None)
+    payload = cache.get(_top_key(version))
+    if payload is not None:
+        return payload
+
+    if cache.add(_lock_key(version), True, _REBUILD_LOCK_TIMEOUT):
+        try:
+            payload = build_top_payload()
+            cache.set(_top_key(version), payload, settings.LEADERBOARD_CACHE_TTL)
+            cache.set(_STALE_KEY, payload, None)
+        finally:
+            cache.delete(_lock_key(version))
+        return payload
+
+    payload = cache.get(_STALE_KEY)
+    if payload is not None:
+        return payload
+    for _ in range(10):
+        time.sleep(0.1)
+        payload = cache.get(_top_key(version))
+        if payload is not None:
+            return payload
+    return build_top_payload()
+
+
+def invalidate_leaderboard():
+    """Drop the cached top pages; the next read rebuilds them."""
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, time.time_ns(), None)
+
+
+def note_aura_change(user_id, aura_points=None):
+    """
+    Invalidate the cached top pages if a user's new total affects them.
+
+    Runs after the surrounding transaction commits so a rebuild never caches
+    uncommitted totals.
+
+    Args:
+        user_id (int): User whose aura changed
+        aura_points (int): New total if already known; read from the database otherwise
+    """
+    transaction.on_commit(lambda: _check_cached_range(user_id, aura_points))
+
+
+def _check_cached_range(user_id, aura_points):
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        return
+    payload = cache.get(_top_key(version))
+    if payload is None:
+        # A rebuild may have read the old total; make it rebuild again
+        if cache.get(_lock_key(version)):
+            invalidate_leaderboard()
+        return
+
+    entries = payload["entries"]
+    if payload["complete"] or any(entry["user_id"] == user_id for entry in entries):
+        invalidate_leaderboard()
+        return
+    if aura_points is None:
+        aura_points = AuraPoints.objects.filter(user_id=user_id).values_list("aura_points", flat=True).first()
+    if aura_points is not None and aura_points >= entries[-1]["aura_points"]:
+        invalidate_leaderboard()
+
+
+def leaderboard_page(cursor=None, limit=LEADERBOARD_PAGE_SIZE):
+    """
+    Get one leaderboard page of serialized entries.
+
+    Pages inside the cached range are sliced from the cached payload; deeper
+    pages fall back to a keyset query.
+
+    Args:
+        cursor (str): Token from a previous page, or None for the first page
+        limit (int): Entries per page
+
+    Returns:
+        CursorPage of entry dicts
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    payload = get_top_payload()
+    entries = payload["entries"]
+    direction = "n"
+    if cursor:
+        direction, aura_points, aura_id = decode_cursor(cursor)
+        keys = [(-entry["aura_points"], entry["id"]) for entry in entries]
+        if direction == "n":
+            start = bisect.bisect_right(keys, (-aura_points, aura_id))
+            stop = start + limit
+        else:
+            stop = bisect.bisect_left(keys, (-aura_points, aura_id))
+            start = max(0, stop - limit)
+    else:
+        start, stop = 0, limit
+
+    # A backward cursor past the last cached entry may have uncached rows before it
+    within_cache = stop < len(entries) or (stop == len(entries) and direction == "n")
+    if within_cache or payload["complete"]:
+        page_entries = entries[start:stop]
+        has_previous = start > 0
+        has_next = stop < len(entries) or not payload["complete"]
+        return CursorPage(
+            page_entries,
+            next_cursor=(
+                encode_cursor("n", page_entries[-1]["aura_points"], page_entries[-1]["id"])
+                if page_entries and has_next else None
+            ),
+            previous_cursor=(
+                encode_cursor("p", page_entries[0]["aura_points"], page_entries[0]["id"])
+                if page_entries and has_previous else None
+            ),
+        )
+
+    page = cursor_page(AuraPoints.objects.select_related("user"), cursor, limit)
+    page.entries = [serialize_entry(aura) for aura in page.entries]
+    return page
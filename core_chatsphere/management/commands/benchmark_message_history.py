@@ -0,0 +1,97 @@
+"""
+Benchmark message history serialization: DRF ModelSerializer vs the lean
+`.values()` path used by get_message_history.
+
+Creates a throwaway conversation inside a transaction that is rolled back, so
+it is safe to run against a development database.
+
+Usage:
+    python manage.py benchmark_message_history
+    python manage.py benchmark_message_history --messages 10000 --repeat 5
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core_chatsphere.models import Conversation, ConversationMessage
+from core_chatsphere.serializers import (
+    MESSAGE_VALUE_FIELDS, ConversationMessageSerializer, serialize_message_rows,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare ModelSerializer and lean serialization of a long message history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=10000, help="Messages in the history (default: 10000)")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per variant, best is reported")
+
+    def handle(self, *args, **options):
+        count = max(1, options["messages"])
+        repeat = max(1, options["repeat"])
+
+        with transaction.atomic():
+            alice = User.objects.create_user(username="__bench_alice", password=None, full_name="Alice")
+            bob = User.objects.create_user(username="__bench_bob", password=None, full_name="Bob")
+            conversation = Conversation.objects.create(
+                user_low_id=min(alice.id, bob.id), user_high_id=max(alice.id, bob.id)
+            )
+            ConversationMessage.objects.bulk_create(
+                [
+                    ConversationMessage(
+                        conversation=conversation,
+                        sender=alice if i % 2 else bob,
+                        receiver=bob if i % 2 else alice,
+                        conv_message=f"benchmark message {i}",
+                    )
+                    for i in range(count)
+                ],
+                batch_size=2000,
+            )
+            messages_qs = ConversationMessage.objects.filter(conversation=conversation).order_by("id")
+
+            variants = [
+                ("ModelSerializer", lambda: ConversationMessageSerializer(messages_qs.all(), many=True).data),
+                (
+                    "ModelSerializer + select_related",
+                    lambda: ConversationMessageSerializer(
+                        messages_qs.select_related("sender", "receiver", "conversation"), many=True
+                    ).data,
+                ),
+                (
+                    "values() + user map",
+                    lambda: serialize_message_rows(
+                        messages_qs.values(*MESSAGE_VALUE_FIELDS), (alice, bob), conversation
+                    ),
+                ),
+            ]
+
+            results = []
+            for name, run in variants:
+                best, payload = None, None
+                for _ in range(repeat):
+                    executed = []
+                    with connection.execute_wrapper(
+                        lambda execute, sql, params, many, context: executed.append(sql) or execute(sql, params, many, context)
+                    ):
+                        started = time.perf_counter()
+                        payload = run()
+                        elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                results.append((name, best, len(executed), payload))
+
+            transaction.set_rollback(True)
+
+        reference = [dict(item) for item in results[0][3]]
+        baseline = results[0][1]
+        self.stdout.write(f"Serializing {count} messages (best of {repeat}):")
+        for name, best, queries, payload in results:
+            same = [dict(item) for item in payload] == reference
+            self.stdout.write(
+                f"  {name:<34} {best * 1000:9.1f} ms  {queries:6d} queries  "
+                f"x{baseline / best:5.1f}  {'same payload' if same else 'PAYLOAD DIFFERS'}"
+            )
@@ -0,0 +1,29 @@
+"""
+Refresh the leaderboard rank index (AuraPoints.aura_rank / leaderboard_position).
+
+Intended to run periodically (e.g. every few minutes from cron) so the
+leaderboard can read ranks with a single indexed query; rows changed since
+the last run fall back to live indexed counts.
+
+Usage:
+    python manage.py rebuild_aura_ranks
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core_chatsphere.leaderboard import rebuild_ranks
+
+
+class Command(BaseCommand):
+    help = "Recompute leaderboard ranks for all users."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows per bulk update (default: 2000)")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = rebuild_ranks(batch_size=max(1, options["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {total} users in {time.monotonic() - started:.2f}s."
+        ))
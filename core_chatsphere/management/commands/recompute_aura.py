@@ -0,0 +1,193 @@
+"""
+Rebuild cached Aura Points for every user with set-based aggregate queries.
+
+Each chunk of users is computed with one grouped query per component (ratings,
+streaks, warnings, manual reports) and written back with bulk_update, instead
+of running AuraPoints.rebuild() per user. The denormalized rating histogram and
+penalty counters are rebuilt from the source tables as part of the same pass.
+
+Usage:
+    python manage.py recompute_aura
+    python manage.py recompute_aura --workers 4 --chunk-size 2000
+    python manage.py recompute_aura --dry-run   # report drift only
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from core_chatsphere.leaderboard import invalidate_leaderboard
+from core_chatsphere.models import (
+    AuraPoints, DailyStreak, ModerationLog, RatingPoints, Report,
+    MANUAL_REPORT_PENALTY_POINTS, RATING_WEIGHTS, STREAK_POINTS_PER_DAY, WARNING_PENALTY_POINTS,
+)
+
+User = get_user_model()
+
+UPDATE_FIELDS = [
+    "rating_component", "streak_component", "report_penalty",
+    "rating_count_1", "rating_count_2", "rating_count_3", "rating_count_4", "rating_count_5",
+    "rating_sum", "warning_count", "manual_report_count", "aura_points", "last_recalculated", "is_dirty", "updated_at",
+]
+
+
+def compute_chunk(first_id, last_id, dry_run=False):
+    """
+    Recompute aura for users with first_id <= id <= last_id.
+
+    Returns a (rows, drifted_rows, total_drift, max_drift) tuple.
+
+    Unless dry_run, the chunk's AuraPoints rows are locked before the aggregates
+    are read and stay locked until the absolute values are written, so an
+    apply_delta() from a concurrent rating, report, warning or streak waits and
+    lands on top of the recomputed values instead of being overwritten.
+    """
+    if dry_run:
+        return _compute_chunk(first_id, last_id, dry_run)
+    with transaction.atomic():
+        return _compute_chunk(first_id, last_id, dry_run)
+
+
+def _compute_chunk(first_id, last_id, dry_run):
+    def in_range(field):
+        return {f"{field}__gte": first_id, f"{field}__lte": last_id}
+
+    aura_rows = AuraPoints.objects.filter(**in_range("user"))
+    existing = {a.user_id: a for a in (aura_rows if dry_run else aura_rows.select_for_update())}
+
+    rating_histograms = {}
+    for user_id, stars, n in (
+        RatingPoints.objects.filter(**in_range("given_to"))
+        .values("given_to_id", "rate_points").annotate(n=Count("id"))
+        .values_list("given_to_id", "rate_points", "n")
+    ):
+        rating_histograms.setdefault(user_id, {})[stars] = n
+    streaks = dict(
+        DailyStreak.objects.filter(**in_range("user")).values_list("user_id", "current_streak")
+    )
+    warning_counts = dict(
+        ModerationLog.objects.filter(**in_range("user"), action_taken=ModerationLog.Action.WARNING)
+        .values("user_id").annotate(n=Count("id"))
+        .values_list("user_id", "n")
+    )
+    manual_report_counts = dict(
+        Report.objects.filter(**in_range("reported_to"), is_automated=False)
+        .values("reported_to_id").annotate(n=Count("id"))
+        .values_list("reported_to_id", "n")
+    )
+
+    user_ids = list(User.objects.filter(**in_range("id")).values_list("id", flat=True))
+    now = timezone.now()
+
+    to_update, to_create = [], []
+    drifted = total_drift = max_drift = 0
+    for user_id in user_ids:
+        histogram = rating_histograms.get(user_id, {})
+        rating_component = sum(RATING_WEIGHTS[stars] * n for stars, n in histogram.items())
+        streak_component = streaks.get(user_id, 0) * STREAK_POINTS_PER_DAY
+        warning_count = warning_counts.get(user_id, 0)
+        manual_report_count = manual_report_counts.get(user_id, 0)
+        penalty = (
+            warning_count * WARNING_PENALTY_POINTS
+            + manual_report_count * MANUAL_REPORT_PENALTY_POINTS
+        )
+        total = max(0, rating_component + streak_component - penalty)
+
+        aura = existing.get(user_id)
+        if aura is None:
+            aura = AuraPoints(user_id=user_id)
+            to_create.append(aura)
+        else:
+            to_update.append(aura)
+
+        drift = abs(aura.aura_points - total)
+        if drift:
+            drifted += 1
+            total_drift += drift
+            max_drift = max(max_drift, drift)
+
+        aura.rating_component = rating_component
+        for stars in RATING_WEIGHTS:
+            setattr(aura, f"rating_count_{stars}", histogram.get(stars, 0))
+        aura.rating_sum = sum(stars * n for stars, n in histogram.items())
+        aura.streak_component = streak_component
+        aura.report_penalty = penalty
+        aura.warning_count = warning_count
+        aura.manual_report_count = manual_report_count
+        aura.aura_points = total
+        aura.last_recalculated = now
+        aura.is_dirty = False
+        aura.updated_at = now
+
+    if not dry_run:
+        AuraPoints.objects.bulk_create(to_create)
+        AuraPoints.objects.bulk_update(to_update, UPDATE_FIELDS)
+
+    return len(user_ids), drifted, total_drift, max_drift
+
+
+def _init_worker():
+    # Forked workers must not reuse the parent's database connections
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _compute_chunk_in_worker(args):
+    try:
+        return compute_chunk(*args)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Recompute Aura Points for all users with grouped aggregate queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Users per chunk (default: 1000)")
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1, in-process)")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing")
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        workers = max(1, options["workers"])
+        dry_run = options["dry_run"]
+
+        user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+        chunks = [
+            (user_ids[i], user_ids[min(i + chunk_size, len(user_ids)) - 1], dry_run)
+            for i in range(0, len(user_ids), chunk_size)
+        ]
+
+        started = time.monotonic()
+        if workers > 1 and len(chunks) > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                results = list(pool.map(_compute_chunk_in_worker, chunks))
+        else:
+            results = [compute_chunk(*chunk) for chunk in chunks]
+        elapsed = time.monotonic() - started
+
+        rows = sum(r[0] for r in results)
+        drifted = sum(r[1] for r in results)
+        total_drift = sum(r[2] for r in results)
+        max_drift = max((r[3] for r in results), default=0)
+        rate = rows / elapsed if elapsed > 0 else float(rows)
+
+        self.stdout.write(
+            f"{'Checked' if dry_run else 'Recomputed'} {rows} users in {len(chunks)} chunk(s) "
+            f"over {elapsed:.2f}s ({rate:.0f} rows/sec)"
+        )
+        self.stdout.write(
+            f"Drift vs stored values: {drifted} user(s) differed, "
+            f"total {total_drift} points, max {max_drift} points"
+        )
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Dry run: no changes written."))
+        else:
+            invalidate_leaderboard()
+            self.stdout.write(self.style.SUCCESS("Aura Points recompute complete."))
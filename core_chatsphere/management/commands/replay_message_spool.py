@@ -0,0 +1,86 @@
+"""
+Store chat messages that the write-behind buffer could not persist.
+
+The spool file is renamed before it is read, so consumers can keep spooling
+to a fresh file meanwhile. A rename left behind by an interrupted run is
+picked up again, and client_msg_id makes replaying a message twice a no-op.
+
+A batch the database rejects is retried one message at a time. Messages that
+still fail (say their sender was deleted since) and lines that cannot be
+parsed go to the dead-letter file, so they never block the rest of the spool.
+
+Usage:
+    python manage.py replay_message_spool
+    python manage.py replay_message_spool --path /var/spool/chat.jsonl --batch-size 500
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from core_chatsphere.message_buffer import load_spool, spool_messages
+from core_chatsphere.models import Conversation
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Replay chat messages spooled by the write-behind buffer into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None, help="Spool file (default: CHAT_WRITE_BEHIND_SPOOL)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Messages per insert batch (default: 500)")
+        parser.add_argument(
+            "--dead-letter", default=None, help="Where unstorable messages go (default: <spool path>.dead)"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.CHAT_WRITE_BEHIND_SPOOL
+        replaying = f"{path}.replaying"
+        dead_letter = options["dead_letter"] or f"{path}.dead"
+        batch_size = max(1, options["batch_size"])
+
+        def bury_line(line):
+            logger.warning("Unreadable spool line moved to %s", dead_letter)
+            with open(dead_letter, "a", encoding="utf-8") as dead:
+                dead.write(line if line.endswith("\n") else line + "\n")
+
+        replayed = failed = 0
+        while True:
+            if not os.path.exists(replaying):
+                if not os.path.exists(path):
+                    break
+                os.replace(path, replaying)
+
+            messages = load_spool(replaying, on_error=bury_line)
+            for start in range(0, len(messages), batch_size):
+                rejected = self.store(messages[start:start + batch_size])
+                if rejected:
+                    spool_messages(rejected, path=dead_letter)
+                    failed += len(rejected)
+            os.remove(replaying)
+            replayed += len(messages)
+
+        self.stdout.write(self.style.SUCCESS(f"Replayed {replayed - failed} spooled messages."))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} messages could not be stored, see {dead_letter}."))
+
+    def store(self, batch):
+        """Store a batch, falling back to one message at a time; returns the messages that failed."""
+        try:
+            Conversation.send_batch(batch)
+            return []
+        except DatabaseError:
+            logger.exception("Storing a batch of %d spooled messages failed, retrying one by one", len(batch))
+
+        rejected = []
+        for msg in batch:
+            msg.pk = None  # may have been assigned by the rolled-back batch insert
+            try:
+                Conversation.send_batch([msg])
+            except DatabaseError:
+                logger.exception("Spooled message %s could not be stored", msg.client_msg_id)
+                rejected.append(msg)
+        return rejected
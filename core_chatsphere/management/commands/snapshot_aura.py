@@ -0,0 +1,38 @@
+"""
+Nightly job: write today's AuraDailySnapshot opening balance for every user.
+
+Rows already created by today's first write are left untouched, so the job is
+safe to run at any time and more than once.
+
+Usage:
+    python manage.py snapshot_aura
+    python manage.py snapshot_aura --batch-size 5000
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core_chatsphere.models import AuraDailySnapshot, AuraPoints
+
+
+class Command(BaseCommand):
+    help = "Create today's aura snapshot rows for all users."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows per insert batch (default: 2000)")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        today = timezone.localdate()
+
+        created = 0
+        batch = []
+        aura_rows = AuraPoints.objects.values_list("user_id", "aura_points").order_by("user_id")
+        for user_id, aura_points in aura_rows.iterator(chunk_size=batch_size):
+            batch.append(AuraDailySnapshot(user_id=user_id, date=today, aura_points=aura_points))
+            if len(batch) >= batch_size:
+                created += len(AuraDailySnapshot.objects.bulk_create(batch, ignore_conflicts=True))
+                batch = []
+        if batch:
+            created += len(AuraDailySnapshot.objects.bulk_create(batch, ignore_conflicts=True))
+
+        self.stdout.write(self.style.SUCCESS(f"Aura snapshots for {today} written ({created} rows submitted)."))
@@ -0,0 +1,158 @@
+"""
+Write-behind persistence for chat messages, enabled with CHAT_WRITE_BEHIND.
+
+The chat consumers give each message its client_msg_id and created_at up
+front, broadcast it straight away and hand it to the per-process buffer here.
+The buffer is stored with Conversation.send_batch once it holds
+CHAT_WRITE_BEHIND_BATCH_SIZE messages, or CHAT_WRITE_BEHIND_FLUSH_INTERVAL
+seconds after the first one arrived. When the batch commits, every chat room
+in it gets one `message_committed` event mapping client_msg_id to the stored
+message id.
+
+If the database rejects a batch it is appended to the spool file
+(CHAT_WRITE_BEHIND_SPOOL, one JSON object per line) and stored later by
+`python manage.py replay_message_spool`. Replays are idempotent because
+client_msg_id is unique. Messages still buffered when the process dies are
+lost; clients treat a message that never got its ack as unsent.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils.dateparse import parse_datetime
+
+from .utils import chat_room_name
+
+logger = logging.getLogger(__name__)
+
+
+def spool_messages(messages, path=None):
+    """Append unsaved messages to the spool file and fsync it."""
+    path = path or settings.CHAT_WRITE_BEHIND_SPOOL
+    with open(path, "a", encoding="utf-8") as spool:
+        for msg in messages:
+            spool.write(json.dumps({
+                "client_msg_id": str(msg.client_msg_id),
+                "sender_id": msg.sender_id,
+                "receiver_id": msg.receiver_id,
+                "conv_message": msg.conv_message,
+                "created_at": msg.created_at.isoformat(),
+            }) + "\n")
+        spool.flush()
+        os.fsync(spool.fileno())
+
+
+def load_spool(path, on_error=None):
+    """
+    Read a spool file back into unsaved ConversationMessage instances.
+
+    Args:
+        path: The spool file
+        on_error: Called with each line that cannot be parsed; when omitted
+            the parse error is raised
+    """
+    from .models import ConversationMessage
+
+    messages = []
+    with open(path, encoding="utf-8") as spool:
+        for line in spool:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                messages.append(ConversationMessage(
+                    client_msg_id=uuid.UUID(row["client_msg_id"]),
+                    sender_id=row["sender_id"],
+                    receiver_id=row["receiver_id"],
+                    conv_message=row["conv_message"],
+                    created_at=parse_datetime(row["created_at"]),
+                ))
+            except (ValueError, KeyError, TypeError):
+                if on_error is None:
+                    raise
+                on_error(line)
+    return messages
+
+
+class MessageWriteBuffer:
+    """Per-process buffer of broadcast but not yet stored chat messages."""
+
+    def __init__(self):
+        self._pending = []
+        self._flush_task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, client_msg_id):
+        return any(msg.client_msg_id == client_msg_id for msg in self._pending)
+
+    async def add(self, message):
+        """Queue an unsaved ConversationMessage; flushes when the batch is full."""
+        self._pending.append(message)
+        if len(self._pending) >= settings.CHAT_WRITE_BEHIND_BATCH_SIZE:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """
+        Store everything buffered in one batch and acknowledge it.
+
+        Returns:
+            list: The saved messages, or an empty list if nothing was buffered
+            or the batch could not be stored (it is spooled when possible)
+        """
+        from .models import Conversation
+
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return []
+
+        try:
+            saved = await database_sync_to_async(Conversation.send_batch)(batch)
+        except DatabaseError:
+            logger.exception("Storing %d buffered messages failed, spooling them", len(batch))
+            try:
+                await asyncio.to_thread(spool_messages, batch)
+            except OSError:
+                # Already broadcast but neither stored nor spooled: leave a record of what was lost
+                logger.exception(
+                    "Spooling %d buffered messages failed, they are lost: %s",
+                    len(batch), ", ".join(str(msg.client_msg_id) for msg in batch),
+                )
+            return []
+
+        await self._acknowledge(saved)
+        return saved
+
+    async def _acknowledge(self, saved):
+        rooms = {}
+        for msg in saved:
+            rooms.setdefault(chat_room_name(msg.sender_id, msg.receiver_id), []).append({
+                "client_msg_id": str(msg.client_msg_id),
+                "message_id": msg.id,
+            })
+
+        channel_layer = get_channel_layer()
+        for room_name, messages in rooms.items():
+            await channel_layer.group_send(
+                room_name, {"type": "message_committed", "room": room_name, "messages": messages}
+            )
+
+
+message_buffer = MessageWriteBuffer()
@@ -0,0 +1,117 @@
+"""
+Per-process LRU cache of the newest messages of hot conversations.
+
+Opening a chat asks get_message_history for the latest page. For the
+CHAT_TAIL_CACHE_CONVERSATIONS most recently used conversations, this process
+keeps the newest CHAT_TAIL_CACHE_MESSAGES message rows (the MESSAGE_VALUE_FIELDS
+dicts), so that page can be served without querying ConversationMessage.
+
+Conversation.send and Conversation.send_batch append new messages after their
+transaction commits. A message is only appended when it directly follows the
+cached tail; otherwise the entry is dropped. A hit also requires the cached
+newest id to equal Conversation.last_message_id. Another worker's writes
+therefore turn into a miss rather than a stale page. Read state is not cached:
+is_read comes from the conversation's watermark each time a page is served.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class ConversationTailCache:
+    """Bounded LRU of conversation id -> newest message rows, with hit/miss counters."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _last_id(entry):
+        return entry["rows"][-1]["id"] if entry["rows"] else None
+
+    def get(self, conversation, limit):
+        """
+        The newest `limit` rows of the conversation, oldest first, and whether
+        older ones exist; None when the cache cannot answer.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation.pk)
+            if entry is not None and self._last_id(entry) != conversation.last_message_id:
+                del self._entries[conversation.pk]  # another process wrote to the conversation
+                entry = None
+            if entry is None or (limit > len(entry["rows"]) and entry["has_more"]):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(conversation.pk)
+            self.hits += 1
+            rows = entry["rows"]
+            return rows[-limit:], entry["has_more"] or len(rows) > limit
+
+    def fill(self, conversation_id, rows, has_more):
+        """Store the newest rows of a conversation, oldest first; has_more means older rows exist."""
+        size = settings.CHAT_TAIL_CACHE_MESSAGES
+        with self._lock:
+            self._entries[conversation_id] = {
+                "rows": list(rows[-size:]),
+                "has_more": has_more or len(rows) > size,
+            }
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > settings.CHAT_TAIL_CACHE_CONVERSATIONS:
+                self._entries.popitem(last=False)
+
+    def append(self, conversation_id, previous_id, rows):
+        """
+        Add rows stored after message `previous_id` (None for a new
+        conversation) to a cached tail. A tail that does not end at
+        previous_id has missed a message and is dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            if self._last_id(entry) != previous_id:
+                del self._entries[conversation_id]
+                return
+            entry["rows"].extend(rows)
+            overflow = len(entry["rows"]) - settings.CHAT_TAIL_CACHE_MESSAGES
+            if overflow > 0:
+                del entry["rows"][:overflow]
+                entry["has_more"] = True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "conversations": len(self._entries),
+                "capacity": settings.CHAT_TAIL_CACHE_CONVERSATIONS,
+                "messages_per_conversation": settings.CHAT_TAIL_CACHE_MESSAGES,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+tail_cache = ConversationTailCache()
+
+
+def message_row(msg):
+    """The MESSAGE_VALUE_FIELDS dict for a saved ConversationMessage."""
+    return {
+        "id": msg.id,
+        "sender_id": msg.sender_id,
+        "receiver_id": msg.receiver_id,
+        "conv_message": msg.conv_message,
+        "created_at": msg.created_at,
+        "client_msg_id": msg.client_msg_id,
+    }
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0017_moderationlog_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aurapoints',
+            name='is_dirty',
+            field=models.BooleanField(default=False, help_text='Cached components need a full recalculation'),
+        ),
+    ]
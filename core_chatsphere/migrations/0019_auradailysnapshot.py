@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0018_aurapoints_is_dirty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuraDailySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('aura_points', models.IntegerField(default=0, help_text='Aura total at the start of the day')),
+                ('connections_gained', models.IntegerField(default=0)),
+                ('ratings_received', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aura_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Aura daily snapshot',
+                'verbose_name_plural': 'Aura daily snapshots',
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='uniq_aura_snapshot_user_date')],
+            },
+        ),
+    ]
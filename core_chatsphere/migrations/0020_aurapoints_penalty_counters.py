@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_penalty_counters(apps, schema_editor):
+    AuraPoints = apps.get_model('core_chatsphere', 'AuraPoints')
+    ModerationLog = apps.get_model('core_chatsphere', 'ModerationLog')
+    Report = apps.get_model('core_chatsphere', 'Report')
+
+    warning_counts = dict(
+        ModerationLog.objects.filter(action_taken='WARNING')
+        .values('user_id').annotate(n=Count('id')).values_list('user_id', 'n')
+    )
+    manual_report_counts = dict(
+        Report.objects.exclude(report_desc__icontains='Automated Detection')
+        .values('reported_to_id').annotate(n=Count('id')).values_list('reported_to_id', 'n')
+    )
+
+    to_update = []
+    for aura in AuraPoints.objects.filter(user_id__in=set(warning_counts) | set(manual_report_counts)):
+        aura.warning_count = warning_counts.get(aura.user_id, 0)
+        aura.manual_report_count = manual_report_counts.get(aura.user_id, 0)
+        to_update.append(aura)
+    AuraPoints.objects.bulk_update(to_update, ['warning_count', 'manual_report_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0019_auradailysnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aurapoints',
+            name='manual_report_count',
+            field=models.IntegerField(default=0, help_text='User-submitted manual reports received'),
+        ),
+        migrations.AddField(
+            model_name='aurapoints',
+            name='warning_count',
+            field=models.IntegerField(default=0, help_text='Automated moderation warnings received'),
+        ),
+        migrations.RunPython(backfill_penalty_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:03
+
+from django.db import migrations, models
+
+
+def classify_automated_reports(apps, schema_editor):
+    # Automated NSFW reports were only identifiable by their description text
+    Report = apps.get_model('core_chatsphere', 'Report')
+    Report.objects.filter(report_desc__icontains='Automated Detection').update(is_automated=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0020_aurapoints_penalty_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='is_automated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(classify_automated_reports, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['reported_to', 'is_automated', 'created_at'], name='core_chatsp_reporte_a5b2cd_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:04
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_histogram(apps, schema_editor):
+    AuraPoints = apps.get_model('core_chatsphere', 'AuraPoints')
+    RatingPoints = apps.get_model('core_chatsphere', 'RatingPoints')
+
+    histograms = {}
+    for user_id, stars, n in (
+        RatingPoints.objects.values('given_to_id', 'rate_points')
+        .annotate(n=Count('id')).values_list('given_to_id', 'rate_points', 'n')
+    ):
+        histograms.setdefault(user_id, {})[stars] = n
+
+    fields = ['rating_count_1', 'rating_count_2', 'rating_count_3', 'rating_count_4', 'rating_count_5', 'rating_sum']
+    to_update = []
+    for aura in AuraPoints.objects.filter(user_id__in=histograms):
+        histogram = histograms[aura.user_id]
+        for stars in range(1, 6):
+            setattr(aura, f'rating_count_{stars}', histogram.get(stars, 0))
+        aura.rating_sum = sum(stars * n for stars, n in histogram.items())
+        to_update.append(aura)
+    AuraPoints.objects.bulk_update(to_update, fields, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0021_report_is_automated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aurapoints',
+            name='rating_count_1',
+            field=models.IntegerField(default=0, help_text='1-star ratings received'),
+        ),
+        migrations.AddField(
+            model_name='aurapoints',
+            name='rating_count_2',
+            field=models.IntegerField(default=0, help_text='2-star ratings received'),
+        ),
+        migrations.AddField(
+            model_name='aurapoints',
+            name='rating_count_3',
+            field=models.IntegerField(default=0, help_text='3-star ratings received'),
+        ),
+        migrations.AddField(
+            model_name='aurapoints',
+            name='rating_count_4',
+            field=models.IntegerField(default=0, help_text='4-star ratings received'),
+        ),
+        migrations.AddField(
+            model_name='aurapoints',
+            name='rating_count_5',
+            field=models.IntegerField(default=0, help_text='5-star ratings received'),
+        ),
+        migrations.AddField(
+            model_name='aurapoints',
+            name='rating_sum',
+            field=models.IntegerField(default=0, help_text='Sum of all star values received'),
+        ),
+        migrations.RunPython(backfill_rating_histogram, migrations.RunPython.noop),
+    ]
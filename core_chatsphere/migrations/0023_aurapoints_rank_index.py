@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0022_aurapoints_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aurapoints',
+            name='aura_rank',
+            field=models.IntegerField(blank=True, help_text='Leaderboard rank (ties share a rank)', null=True),
+        ),
+        migrations.AddField(
+            model_name='aurapoints',
+            name='leaderboard_position',
+            field=models.IntegerField(blank=True, db_index=True, help_text='Unique position on the leaderboard (1-based)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='aurapoints',
+            index=models.Index(fields=['-aura_points', 'id'], name='core_chatsp_aura_po_59ee7c_idx'),
+        ),
+    ]
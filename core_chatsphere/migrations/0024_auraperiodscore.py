@@ -0,0 +1,81 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:17
+
+import datetime
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+RATING_WEIGHTS = {5: 50, 4: 30, 3: 15, 2: 5, 1: -5}
+MANUAL_REPORT_PENALTY_POINTS = 50
+WARNING_PENALTY_POINTS = 150
+
+
+def backfill_current_periods(apps, schema_editor):
+    AuraPeriodScore = apps.get_model('core_chatsphere', 'AuraPeriodScore')
+    ModerationLog = apps.get_model('core_chatsphere', 'ModerationLog')
+    RatingPoints = apps.get_model('core_chatsphere', 'RatingPoints')
+    Report = apps.get_model('core_chatsphere', 'Report')
+
+    today = timezone.localdate()
+    periods = {
+        'week': today - datetime.timedelta(days=today.weekday()),
+        'month': today.replace(day=1),
+    }
+    rows = []
+    for period_type, period_start in periods.items():
+        since = timezone.make_aware(datetime.datetime.combine(period_start, datetime.time.min))
+        points = defaultdict(int)
+        ratings = (
+            RatingPoints.objects.filter(created_at__gte=since)
+            .values('given_to_id', 'rate_points').annotate(n=Count('id'))
+        )
+        for row in ratings:
+            points[row['given_to_id']] += RATING_WEIGHTS[row['rate_points']] * row['n']
+        reports = (
+            Report.objects.filter(created_at__gte=since, is_automated=False)
+            .values('reported_to_id').annotate(n=Count('id'))
+        )
+        for row in reports:
+            points[row['reported_to_id']] -= MANUAL_REPORT_PENALTY_POINTS * row['n']
+        warnings = (
+            ModerationLog.objects.filter(created_at__gte=since, action_taken='WARNING')
+            .values('user_id').annotate(n=Count('id'))
+        )
+        for row in warnings:
+            points[row['user_id']] -= WARNING_PENALTY_POINTS * row['n']
+        rows.extend(
+            AuraPeriodScore(user_id=user_id, period_type=period_type, period_start=period_start, points=total)
+            for user_id, total in points.items()
+        )
+    AuraPeriodScore.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0023_aurapoints_rank_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuraPeriodScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_type', models.CharField(choices=[('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField(help_text='Monday of the week or first day of the month')),
+                ('points', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aura_period_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Aura period score',
+                'verbose_name_plural': 'Aura period scores',
+                'indexes': [models.Index(fields=['period_type', 'period_start', '-points', 'id'], name='core_chatsp_period__a45310_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'period_type', 'period_start'), name='uniq_aura_period_score')],
+            },
+        ),
+        migrations.RunPython(backfill_current_periods, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:19
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def backfill_is_mutual(apps, schema_editor):
+    Connection = apps.get_model('core_chatsphere', 'Connection')
+    reverse_edge = Connection.objects.filter(user_id=OuterRef('connection_with_id'), connection_with_id=OuterRef('user_id'))
+    Connection.objects.filter(Exists(reverse_edge)).update(is_mutual=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0024_auraperiodscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connection',
+            name='is_mutual',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='connection',
+            index=models.Index(fields=['user', 'is_mutual', 'connection_with'], name='core_chatsp_user_id_98294b_idx'),
+        ),
+        migrations.RunPython(backfill_is_mutual, migrations.RunPython.noop),
+    ]
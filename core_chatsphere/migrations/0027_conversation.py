@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Greatest, Least
+
+
+def backfill_conversations(apps, schema_editor):
+    Conversation = apps.get_model('core_chatsphere', 'Conversation')
+    ConversationMessage = apps.get_model('core_chatsphere', 'ConversationMessage')
+
+    pairs = (
+        ConversationMessage.objects
+        .annotate(low=Least('sender_id', 'receiver_id'), high=Greatest('sender_id', 'receiver_id'))
+        .values('low', 'high')
+        .annotate(
+            last_id=Max('id'),
+            last_at=Max('created_at'),
+            unread_low=Count('id', filter=Q(is_read=False) & Q(receiver_id=models.F('low'))),
+            unread_high=Count('id', filter=Q(is_read=False) & Q(receiver_id=models.F('high'))),
+        )
+    )
+    for pair in pairs.iterator():
+        conversation = Conversation.objects.create(
+            user_low_id=pair['low'],
+            user_high_id=pair['high'],
+            last_message_id=pair['last_id'],
+            last_activity_at=pair['last_at'],
+            unread_low=pair['unread_low'],
+            unread_high=pair['unread_high'],
+        )
+        ConversationMessage.objects.filter(
+            Q(sender_id=pair['low'], receiver_id=pair['high']) | Q(sender_id=pair['high'], receiver_id=pair['low'])
+        ).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0026_connectionsuggestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_low', models.IntegerField(default=0, help_text='Messages user_low has not read yet')),
+                ('unread_high', models.IntegerField(default=0, help_text='Messages user_high has not read yet')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core_chatsphere.conversationmessage')),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationmessage',
+            name='conversation',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='core_chatsphere.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationmessage',
+            index=models.Index(fields=['conversation', 'id'], name='core_chatsp_convers_f1b436_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_low', '-last_activity_at'], name='core_chatsp_user_lo_eaf67b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_high', '-last_activity_at'], name='core_chatsp_user_hi_09804e_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='uniq_conversation_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.CheckConstraint(condition=models.Q(('user_low__lt', models.F('user_high'))), name='conversation_pair_ordered'),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:35
+
+from django.db import migrations, models
+from django.db.models import BigIntegerField, Count, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_watermarks(apps, schema_editor):
+    """
+    Derive each side's watermark from the per-message flags: just below the
+    first unread message they received, or the last message when none are
+    unread. Messages read out of order above that point count as unread again.
+    """
+    Conversation = apps.get_model('core_chatsphere', 'Conversation')
+    ConversationMessage = apps.get_model('core_chatsphere', 'ConversationMessage')
+
+    latest = (
+        ConversationMessage.objects.filter(conversation=OuterRef('pk'))
+        .order_by().values('conversation').annotate(last=Max('id')).values('last')
+    )
+    for side in ('low', 'high'):
+        received = (
+            ConversationMessage.objects.filter(conversation=OuterRef('pk'), receiver_id=OuterRef(f'user_{side}_id'))
+            .order_by().values('conversation')
+        )
+        first_unread = received.filter(is_read=False).annotate(first=Min('id')).values('first')
+        read_at = received.filter(is_read=True).annotate(at=Max('read_at')).values('at')
+        Conversation.objects.update(**{
+            f'last_read_{side}': Coalesce(
+                Subquery(first_unread, output_field=BigIntegerField()) - 1,
+                Subquery(latest, output_field=BigIntegerField()),
+                Value(0),
+            ),
+            f'read_{side}_at': Subquery(read_at),
+        })
+
+        above = (
+            received.filter(id__gt=OuterRef(f'last_read_{side}'))
+            .annotate(n=Count('id')).values('n')
+        )
+        Conversation.objects.update(**{f'unread_{side}': Coalesce(Subquery(above), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0028_conversationmessage_conversation_required'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_read_high',
+            field=models.BigIntegerField(default=0, help_text='Highest message id user_high has read'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_read_low',
+            field=models.BigIntegerField(default=0, help_text='Highest message id user_low has read'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='read_high_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='read_low_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_watermarks, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='conversationmessage',
+            name='core_chatsp_receive_96f8be_idx',
+        ),
+        migrations.RemoveField(
+            model_name='conversationmessage',
+            name='is_read',
+        ),
+        migrations.RemoveField(
+            model_name='conversationmessage',
+            name='read_at',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0029_conversation_read_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationmessage',
+            name='client_msg_id',
+            field=models.UUIDField(blank=True, editable=False, help_text='Id assigned before the row is stored, used to acknowledge and de-duplicate', null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='conversationmessage',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
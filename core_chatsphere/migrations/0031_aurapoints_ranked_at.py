@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_chatsphere', '0030_conversationmessage_client_msg_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aurapoints',
+            name='ranked_at',
+            field=models.DateTimeField(blank=True, help_text='When aura_rank and leaderboard_position were last computed', null=True),
+        ),
+    ]
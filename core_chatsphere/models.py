@@ -4,10 +4,23 @@ from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import Q, Sum, UniqueConstraint, CheckConstraint
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, UniqueConstraint, CheckConstraint, Value
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.utils import timezone
 
 
+# Aura formula weights (see AURA_POINTS_PLAN.md)
+RATING_WEIGHTS = {
+    5: 50,   # 5-star ratings
+    4: 30,   # 4-star ratings
+    3: 15,   # 3-star ratings
+    2: 5,    # 2-star ratings
+    1: -5,   # 1-star ratings
+}
+STREAK_POINTS_PER_DAY = 5
+WARNING_PENALTY_POINTS = 150
+MANUAL_REPORT_PENALTY_POINTS = 50
+
 
 # -----------------------------
 # User
@@ -41,6 +54,8 @@ class Connection(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="connected_by"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # True when the reverse edge exists too; kept in sync on both rows by signals
+    is_mutual = models.BooleanField(default=False)
     # verified = models.OneToOneField(IdentityVerification, on_delete=models.SET_NULL, null=True, blank=True)       
     def clean(self):
         # Prevent self-connection
@@ -60,20 +75,321 @@ class Connection(models.Model):
         indexes = [
             models.Index(fields=["user", "connection_with"]),
             models.Index(fields=["connection_with"]),
+            models.Index(fields=["user", "is_mutual", "connection_with"]),
         ]
 
     def __str__(self) -> str:
         return f"{self.user} ↔ {self.connection_with}"
 
+    @classmethod
+    def mutual_users(cls, user):
+        """Users connected with `user` in both directions, as one indexed join."""
+        user_id = getattr(user, "pk", user)
+        return User.objects.filter(connected_by__user=user_id, connected_by__is_mutual=True)
+
+    @classmethod
+    def mutual_count(cls, user) -> int:
+        """Number of users connected with `user` in both directions."""
+        return cls.objects.filter(user_id=getattr(user, "pk", user), is_mutual=True).count()
+
+    @classmethod
+    def set_mutual(cls, user_a, user_b, is_mutual: bool) -> None:
+        """Set is_mutual on both edges between two users."""
+        cls.objects.filter(
+            Q(user_id=user_a, connection_with_id=user_b) | Q(user_id=user_b, connection_with_id=user_a)
+        ).update(is_mutual=is_mutual)
+
+
+class ConnectionSuggestion(models.Model):
+    """
+    "People you may know": second-degree candidates for a user, ranked by the
+    number of shared mutual connections (optionally weighted by aura).
+    Rebuilt in bulk by the `suggest_connections` command.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="connection_suggestions"
+    )
+    suggested_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField(help_text="1-based position in the user's list")
+    mutual_count = models.IntegerField(help_text="Mutual connections shared with the suggested user")
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "suggested_user"], name="uniq_connection_suggestion"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "rank"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user} → {self.suggested_user} (#{self.rank})"
+
 
 # -----------------------------
 # Conversations (messages between users)
 # -----------------------------
+class Conversation(models.Model):
+    """
+    One row per pair of users who have exchanged messages, ordered so that
+    user_low has the smaller id. Holds the denormalized inbox state: the last
+    message, when it was sent and each side's unread count.
+
+    Read state is a per-side watermark: every message addressed to a user with
+    an id up to their last_read_* is read, so marking a conversation read is a
+    single-row write instead of an update of every unread message.
+    """
+    user_low = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    user_high = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    last_message = models.ForeignKey(
+        "ConversationMessage", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    unread_low = models.IntegerField(default=0, help_text="Messages user_low has not read yet")
+    unread_high = models.IntegerField(default=0, help_text="Messages user_high has not read yet")
+    last_read_low = models.BigIntegerField(default=0, help_text="Highest message id user_low has read")
+    last_read_high = models.BigIntegerField(default=0, help_text="Highest message id user_high has read")
+    read_low_at = models.DateTimeField(null=True, blank=True)
+    read_high_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user_low", "user_high"], name="uniq_conversation_pair"),
+            models.CheckConstraint(check=Q(user_low__lt=F("user_high")), name="conversation_pair_ordered"),
+        ]
+        indexes = [
+            models.Index(fields=["user_low", "-last_activity_at"]),
+            models.Index(fields=["user_high", "-last_activity_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"Conversation {self.user_low_id} ↔ {self.user_high_id}"
+
+    @staticmethod
+    def _pair(user_a, user_b) -> tuple[int, int]:
+        a, b = int(getattr(user_a, "pk", user_a)), int(getattr(user_b, "pk", user_b))
+        return (a, b) if a < b else (b, a)
+
+    @classmethod
+    def _side(cls, user_low_id: int, user_id) -> str:
+        return "low" if int(getattr(user_id, "pk", user_id)) == user_low_id else "high"
+
+    @classmethod
+    def _unread_field(cls, user_low_id: int, user_id) -> str:
+        return f"unread_{cls._side(user_low_id, user_id)}"
+
+    @classmethod
+    def between(cls, user_a, user_b):
+        """Get the conversation between two users, or None if they never messaged."""
+        low, high = cls._pair(user_a, user_b)
+        return cls.objects.filter(user_low_id=low, user_high_id=high).first()
+
+    @classmethod
+    def total_unread(cls, user) -> int:
+        """Unread messages across all of the user's conversations, in one aggregate."""
+        user_id = getattr(user, "pk", user)
+        total = cls.objects.filter(Q(user_low_id=user_id) | Q(user_high_id=user_id)).aggregate(
+            total=Sum(
+                models.Case(
+                    models.When(user_low_id=user_id, then=F("unread_low")),
+                    default=F("unread_high"),
+                )
+            )
+        )["total"]
+        return total or 0
+
+    @classmethod
+    def inbox(cls, user):
+        """The user's conversations, most recently active first."""
+        user_id = getattr(user, "pk", user)
+        return cls.objects.filter(Q(user_low_id=user_id) | Q(user_high_id=user_id)).order_by(
+            F("last_activity_at").desc(nulls_last=True)
+        )
+
+    @classmethod
+    def send(cls, sender, receiver, text: str, client_msg_id=None) -> "ConversationMessage":
+        """
+        Store a message and update the conversation's last message, activity
+        time and the receiver's unread counter in the same transaction.
+        """
+        from django.db import transaction
+
+        from .message_cache import message_row, tail_cache
+
+        low, high = cls._pair(sender, receiver)
+        with transaction.atomic():
+            conversation, _ = cls.objects.get_or_create(user_low_id=low, user_high_id=high)
+            msg = ConversationMessage.objects.create(
+                conversation=conversation,
+                sender_id=getattr(sender, "pk", sender),
+                receiver_id=getattr(receiver, "pk", receiver),
+                conv_message=text,
+                client_msg_id=client_msg_id,
+            )
+            unread_field = cls._unread_field(low, receiver)
+            cls.objects.filter(pk=conversation.pk).update(
+                last_message=msg,
+                last_activity_at=msg.created_at,
+                **{unread_field: F(unread_field) + 1},
+            )
+            previous_id = conversation.last_message_id
+            transaction.on_commit(lambda: tail_cache.append(conversation.pk, previous_id, [message_row(msg)]))
+        return msg
+
+    @classmethod
+    def send_batch(cls, messages) -> list["ConversationMessage"]:
+        """
+        Store many messages at once: the missing conversations and the
+        messages are bulk-inserted, then each conversation gets one UPDATE for
+        its last message, activity time and unread counters. A message whose
+        client_msg_id is already stored is not inserted again; the stored row
+        is returned in its place.
+
+        Args:
+            messages: Unsaved ConversationMessage instances with sender_id,
+                receiver_id, conv_message and optionally created_at and client_msg_id
+
+        Returns:
+            list of saved ConversationMessage, in the order given
+        """
+        from django.db import transaction
+
+        from .message_cache import message_row, tail_cache
+
+        with transaction.atomic():
+            client_ids = {msg.client_msg_id for msg in messages if msg.client_msg_id}
+            stored = {
+                msg.client_msg_id: msg
+                for msg in ConversationMessage.objects.filter(client_msg_id__in=client_ids)
+            } if client_ids else {}
+            pending = []
+            for msg in messages:
+                if msg.client_msg_id and msg.client_msg_id in stored:
+                    continue
+                if msg.client_msg_id:
+                    stored[msg.client_msg_id] = msg
+                pending.append(msg)
+            if not pending:
+                return [stored[msg.client_msg_id] for msg in messages]
+
+            pairs = {cls._pair(msg.sender_id, msg.receiver_id) for msg in pending}
+            lookup = Q()
+            for low, high in pairs:
+                lookup |= Q(user_low_id=low, user_high_id=high)
+            conversations = {(c.user_low_id, c.user_high_id): c for c in cls.objects.filter(lookup)}
+            if pairs - conversations.keys():
+                cls.objects.bulk_create(
+                    [cls(user_low_id=low, user_high_id=high) for low, high in pairs - conversations.keys()],
+                    ignore_conflicts=True,
+                )
+                conversations = {(c.user_low_id, c.user_high_id): c for c in cls.objects.filter(lookup)}
+
+            for msg in pending:
+                msg.conversation = conversations[cls._pair(msg.sender_id, msg.receiver_id)]
+            ConversationMessage.objects.bulk_create(pending)
+
+            per_conversation = {}
+            for msg in pending:
+                state = per_conversation.setdefault(msg.conversation_id, {"last": msg, "low": 0, "high": 0})
+                if msg.id > state["last"].id:
+                    state["last"] = msg
+                state[cls._side(msg.conversation.user_low_id, msg.receiver_id)] += 1
+            for conversation_id, state in per_conversation.items():
+                # Another writer may have stored a newer message in the meantime
+                cls.objects.filter(pk=conversation_id).update(
+                    last_message_id=Greatest(Coalesce(F("last_message_id"), Value(0)), Value(state["last"].id)),
+                    last_activity_at=Greatest(
+                        Coalesce(F("last_activity_at"), Value(state["last"].created_at)),
+                        Value(state["last"].created_at),
+                    ),
+                    unread_low=F("unread_low") + state["low"],
+                    unread_high=F("unread_high") + state["high"],
+                )
+
+            tails = {}
+            for msg in sorted(pending, key=lambda m: m.id):
+                tails.setdefault(msg.conversation, []).append(message_row(msg))
+
+            def update_tail_cache():
+                for conversation, rows in tails.items():
+                    tail_cache.append(conversation.pk, conversation.last_message_id, rows)
+
+            transaction.on_commit(update_tail_cache)
+        return [stored.get(msg.client_msg_id, msg) if msg.client_msg_id else msg for msg in messages]
+
+    @classmethod
+    def advance_read_watermark(cls, reader, other, up_to_id: int | None = None) -> int | None:
+        """
+        Move the reader's watermark up to `up_to_id`, or to the last message
+        when omitted, and recompute their unread counter from the messages
+        still above it. The watermark never moves backwards or past the last
+        message. This is a single-row UPDATE.
+
+        Returns:
+            int | None: The new watermark, or None when it did not move
+        """
+        reader_id = int(getattr(reader, "pk", reader))
+        low, high = cls._pair(reader_id, other)
+        side = cls._side(low, reader_id)
+        last_read, unread = f"last_read_{side}", f"unread_{side}"
+
+        latest = Coalesce(F("last_message_id"), Value(0))
+        if up_to_id is None:
+            target, remaining = latest, Value(0)
+        else:
+            target = Least(Value(int(up_to_id)), latest)
+            above = ConversationMessage.objects.filter(
+                conversation=OuterRef("pk"), receiver_id=reader_id, id__gt=int(up_to_id)
+            ).order_by().values("conversation").annotate(n=Count("id")).values("n")
+            remaining = Coalesce(Subquery(above), Value(0))
+
+        pair = cls.objects.filter(user_low_id=low, user_high_id=high)
+        moved = pair.filter(**{f"{last_read}__lt": target}).update(
+            **{last_read: target, unread: remaining, f"read_{side}_at": timezone.now()}
+        )
+        if not moved:
+            return None
+        return pair.values_list(last_read, flat=True).first()
+
+    def unread_for(self, user) -> int:
+        """Unread message count for one side of the conversation."""
+        return getattr(self, self._unread_field(self.user_low_id, user))
+
+    def read_state(self, receiver) -> tuple[int, "datetime | None"]:
+        """The receiver's watermark and when it last moved."""
+        side = self._side(self.user_low_id, receiver)
+        return getattr(self, f"last_read_{side}"), getattr(self, f"read_{side}_at")
+
+    def is_read(self, message_id: int, receiver) -> bool:
+        """Whether the message addressed to `receiver` is at or below their watermark."""
+        return message_id <= self.read_state(receiver)[0]
+
+    def other_user_id(self, user) -> int:
+        user_id = int(getattr(user, "pk", user))
+        return self.user_high_id if user_id == self.user_low_id else self.user_low_id
+
+    def mark_read(self, reader, up_to_id: int | None = None) -> int | None:
+        """Advance the reader's watermark; see advance_read_watermark."""
+        return self.advance_read_watermark(reader, self.other_user_id(reader), up_to_id)
+
+
 class ConversationMessage(models.Model):
     """
     Your ERD shows 'Conversations' with conv_message, user_id, conv_with.
     Model each row as a message between two users.
     """
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name="messages"
+    )
     sender = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="sent_messages"
     )
@@ -81,15 +397,19 @@ class ConversationMessage(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="received_messages"
     )
     conv_message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
-    read_at = models.DateTimeField(null=True, blank=True)
+    # Set by default rather than auto_now_add so buffered messages keep the
+    # time they were sent, not the time they were flushed
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    client_msg_id = models.UUIDField(
+        null=True, blank=True, unique=True, editable=False,
+        help_text="Id assigned before the row is stored, used to acknowledge and de-duplicate",
+    )
 
     class Meta:
         indexes = [
             models.Index(fields=["sender", "receiver", "created_at"]),
             models.Index(fields=["receiver", "created_at"]),
-            models.Index(fields=["receiver", "is_read"]),
+            models.Index(fields=["conversation", "id"]),
         ]
         ordering = ["created_at"]
 
@@ -141,40 +461,168 @@ class AuraPoints(models.Model):
     streak_component = models.IntegerField(default=0, help_text="Points from daily streak")
     report_penalty = models.IntegerField(default=0, help_text="Negative points from reports")
 
+    # Per-star rating histogram, kept in sync as ratings are created or deleted
+    rating_count_1 = models.IntegerField(default=0, help_text="1-star ratings received")
+    rating_count_2 = models.IntegerField(default=0, help_text="2-star ratings received")
+    rating_count_3 = models.IntegerField(default=0, help_text="3-star ratings received")
+    rating_count_4 = models.IntegerField(default=0, help_text="4-star ratings received")
+    rating_count_5 = models.IntegerField(default=0, help_text="5-star ratings received")
+    rating_sum = models.IntegerField(default=0, help_text="Sum of all star values received")
+
+    # Denormalized penalty counters, kept in sync as Reports/ModerationLogs are created or deleted
+    warning_count = models.IntegerField(default=0, help_text="Automated moderation warnings received")
+    manual_report_count = models.IntegerField(default=0, help_text="User-submitted manual reports received")
+
     # Total Aura Points = rating_component + streak_component - report_penalty
     aura_points = models.IntegerField(default=0, help_text="Total calculated Aura Points")
 
+    # Leaderboard rank index, refreshed periodically by the rebuild_aura_ranks command
+    aura_rank = models.IntegerField(null=True, blank=True, help_text="Leaderboard rank (ties share a rank)")
+    leaderboard_position = models.IntegerField(
+        null=True, blank=True, db_index=True, help_text="Unique position on the leaderboard (1-based)"
+    )
+    ranked_at = models.DateTimeField(
+        null=True, blank=True, help_text="When aura_rank and leaderboard_position were last computed"
+    )
+
     # Metadata for recalculation strategy
     last_rating = models.ForeignKey(
         "RatingPoints", null=True, blank=True, on_delete=models.SET_NULL, related_name="aura_updates"
     )
     last_recalculated = models.DateTimeField(null=True, blank=True, help_text="When components were last recalculated")
+    is_dirty = models.BooleanField(default=False, help_text="Cached components need a full recalculation")
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Aura points"
         verbose_name_plural = "Aura points"
+        indexes = [
+            models.Index(fields=["-aura_points", "id"]),
+        ]
+
+    @property
+    def rating_histogram(self) -> dict:
+        """Number of ratings received per star value (1-5)."""
+        return {stars: getattr(self, f"rating_count_{stars}") for stars in RATING_WEIGHTS}
+
+    @property
+    def total_ratings(self) -> int:
+        return sum(self.rating_histogram.values())
+
+    @property
+    def avg_rating(self) -> float:
+        """Average star rating received, 0 when unrated."""
+        total = self.total_ratings
+        return self.rating_sum / total if total else 0
+
+    def recount_ratings(self) -> None:
+        """
+        Reload the rating histogram from RatingPoints with one grouped query.
+        Repair path only; the histogram is normally maintained by signals.
+        """
+        counts = dict(
+            RatingPoints.objects.filter(given_to_id=self.user_id)
+            .values("rate_points").annotate(n=models.Count("id"))
+            .values_list("rate_points", "n")
+        )
+        for stars in RATING_WEIGHTS:
+            setattr(self, f"rating_count_{stars}", counts.get(stars, 0))
+        self.rating_sum = sum(stars * n for stars, n in counts.items())
 
     @property
     def warning_penalty(self) -> int:
-        """Calculate penalty from automated content warnings (150 points each)."""
-        from core_chatsphere.models import ModerationLog
-        warning_count = ModerationLog.objects.filter(
-            user=self.user,
+        """Penalty from automated content warnings (150 points each)."""
+        return self.warning_count * WARNING_PENALTY_POINTS
+
+    @property
+    def manual_report_penalty(self) -> int:
+        """Penalty from user-submitted manual reports (50 points each)."""
+        return self.manual_report_count * MANUAL_REPORT_PENALTY_POINTS
+
+    def recount_penalties(self) -> None:
+        """
+        Reload warning_count and manual_report_count from the source tables.
+        Repair path only; the counters are normally maintained by signals.
+        """
+        self.warning_count = ModerationLog.objects.filter(
+            user_id=self.user_id,
             action_taken=ModerationLog.Action.WARNING
         ).count()
-        return warning_count * 150
+        self.manual_report_count = Report.objects.filter(
+            reported_to_id=self.user_id, is_automated=False
+        ).count()
 
     @property
-    def manual_report_penalty(self) -> int:
-        """Calculate penalty from user-submitted manual reports (50 points each)."""
-        from core_chatsphere.models import Report
-        manual_report_count = Report.objects.filter(reported_to=self.user).exclude(report_desc__icontains="Automated Detection").count()
-        return manual_report_count * 50
+    def needs_recalc(self) -> bool:
+        """
+        True when the cached total should be rebuilt: the row was marked dirty or
+        it has not been fully recalculated within settings.AURA_RECALC_MAX_AGE seconds.
+        """
+        if self.is_dirty or self.last_recalculated is None:
+            return True
+        max_age = getattr(settings, "AURA_RECALC_MAX_AGE", 3600)
+        return (timezone.now() - self.last_recalculated).total_seconds() > max_age
+
+    @classmethod
+    def mark_dirty(cls, user) -> None:
+        """Flag a user's cached aura for recalculation on the next read."""
+        cls.objects.filter(user_id=getattr(user, "pk", user)).update(is_dirty=True)
+
+    @classmethod
+    def apply_delta(
+        cls, user, rating: int = 0, streak: int = 0, penalty: int = 0,
+        warnings: int = 0, manual_reports: int = 0, ratings: dict | None = None,
+        create_missing: bool = True,
+    ) -> None:
+        """
+        Apply signed deltas to the cached components in a single UPDATE.
+
+        Used by the write paths (ratings, reports, warnings, streak changes) so an
+        event costs one statement instead of a full recalc over the user's history.
+        `ratings` maps star values to count deltas for the rating histogram and adds
+        their weighted points on top of `rating`; `warnings` and `manual_reports`
+        adjust the penalty counters and add their penalty points on top of `penalty`.
+
+        If the user has no AuraPoints row yet, it is created and fully recalculated,
+        which already accounts for the triggering event; deletion paths pass
+        create_missing=False since the user may be mid-cascade. `user` may be a
+        User instance or its primary key.
+        """
+        ratings = {stars: n for stars, n in (ratings or {}).items() if n}
+        rating += sum(RATING_WEIGHTS[stars] * n for stars, n in ratings.items())
+        penalty += warnings * WARNING_PENALTY_POINTS + manual_reports * MANUAL_REPORT_PENALTY_POINTS
+        if not (rating or streak or penalty or warnings or manual_reports or ratings):
+            return
+
+        user_id = getattr(user, "pk", user)
+        histogram = {
+            f"rating_count_{stars}": F(f"rating_count_{stars}") + n for stars, n in ratings.items()
+        }
+        if ratings:
+            histogram["rating_sum"] = F("rating_sum") + sum(stars * n for stars, n in ratings.items())
+        rating_expr = F("rating_component") + rating
+        streak_expr = F("streak_component") + streak
+        penalty_expr = F("report_penalty") + penalty
+        updated = cls.objects.filter(user_id=user_id).update(
+            rating_component=rating_expr,
+            streak_component=streak_expr,
+            report_penalty=penalty_expr,
+            warning_count=F("warning_count") + warnings,
+            manual_report_count=F("manual_report_count") + manual_reports,
+            aura_points=Greatest(rating_expr + streak_expr - penalty_expr, Value(0)),
+            updated_at=timezone.now(),
+            **histogram,
+        )
+        if updated:
+            from .leaderboard import note_aura_change
+            note_aura_change(user_id)
+        elif create_missing:
+            aura, _ = cls.objects.get_or_create(user_id=user_id)
+            aura.rebuild()
 
     def recalc(self) -> int:
         """
-        Recalculate Aura Points using the complete formula:
+        Recalculate Aura Points from scratch using the complete formula:
 
         Total Aura = (Rating Component) + (Streak Component) + (Verified Bonus) - (Report & Warning Penalties)
 
@@ -185,55 +633,251 @@ class AuraPoints(models.Model):
         - Verified Bonus = 50 points if user is verified
         - Report Penalty = manual_reports × 50 points
         - Warning Penalty = moderation_warnings × 150 points
-        """
-        # Rating component: weighted sum by star rating
-        RATING_WEIGHTS = {
-            5: 50,   # 5-star ratings
-            4: 30,   # 4-star ratings
-            3: 15,   # 3-star ratings
-            2: 5,    # 2-star ratings
-            1: -5,   # 1-star ratings
-        }
-
-        rating_component = 0
-        for stars, weight in RATING_WEIGHTS.items():
-            count = RatingPoints.objects.filter(
-                given_to=self.user, rate_points=stars
-            ).count()
-            rating_component += count * weight
 
+        Write paths keep the cached components current through apply_delta(),
+        so this full pass is the verification/repair path. Ratings and penalties
+        are read from the maintained counters and the counters are never written
+        here; use rebuild() to also reload those from the source tables. The
+        dirty flag is only cleared by rebuild().
+        """
         # Streak component: daily streak × 5 points per day
         streak_component = 0
         try:
             from core_chatsphere.models import DailyStreak
             daily_streak = DailyStreak.objects.get(user=self.user)
-            streak_component = daily_streak.current_streak * 5
+            streak_component = daily_streak.current_streak * STREAK_POINTS_PER_DAY
         except DailyStreak.DoesNotExist:
             streak_component = 0
 
+        # Rating component: weighted sum over the rating histogram. It and the
+        # penalties are read from the row itself so a concurrent apply_delta() is
+        # never overwritten
+        rating_expr = sum(
+            (F(f"rating_count_{stars}") * weight for stars, weight in RATING_WEIGHTS.items()), Value(0)
+        )
+
         # Enforce penalties: warnings (150 pts each) + manual reports (50 pts each)
-        total_penalty = self.warning_penalty + self.manual_report_penalty
-
-        # Calculate total (minimum 0, cannot go negative)
-        total = max(0, rating_component + streak_component - total_penalty)
-
-        # Update all components
-        self.rating_component = rating_component
-        self.streak_component = streak_component
-        self.report_penalty = total_penalty
-        self.aura_points = total
-        self.last_recalculated = timezone.now()
-        self.save(update_fields=[
+        total_penalty = (
+            F("warning_count") * WARNING_PENALTY_POINTS + F("manual_report_count") * MANUAL_REPORT_PENALTY_POINTS
+        )
+
+        # Calculate total (minimum 0, cannot go negative) and update all components in one statement
+        now = timezone.now()
+        AuraPoints.objects.filter(pk=self.pk).update(
+            rating_component=rating_expr,
+            streak_component=streak_component,
+            report_penalty=total_penalty,
+            aura_points=Greatest(rating_expr + streak_component - total_penalty, Value(0)),
+            last_recalculated=now,
+            updated_at=now,
+        )
+        self.refresh_from_db(fields=[
             "rating_component", "streak_component", "report_penalty",
-            "aura_points", "last_recalculated", "updated_at"
+            "rating_count_1", "rating_count_2", "rating_count_3", "rating_count_4", "rating_count_5",
+            "rating_sum", "warning_count", "manual_report_count",
+            "aura_points", "last_recalculated", "is_dirty", "updated_at",
         ])
 
-        return total
+        return self.aura_points
+
+    def rebuild(self) -> int:
+        """
+        Reload every counter from the source tables and clear the dirty flag
+        while holding the row lock, then recalculate.
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            AuraPoints.objects.select_for_update().get(pk=self.pk)
+            self.recount_ratings()
+            self.recount_penalties()
+            self.is_dirty = False
+            self.save(update_fields=[
+                "rating_count_1", "rating_count_2", "rating_count_3", "rating_count_4", "rating_count_5",
+                "rating_sum", "warning_count", "manual_report_count", "is_dirty", "updated_at",
+            ])
+            return self.recalc()
 
     def __str__(self) -> str:
         return f"Aura of {self.user}: {self.aura_points} (R:{self.rating_component} S:{self.streak_component} V:0 P:{self.report_penalty})"
 
 
+# -----------------------------
+# Aura daily snapshots (per-user daily rollup for history charts)
+# -----------------------------
+class AuraDailySnapshot(models.Model):
+    """
+    One row per user per day. `aura_points` is the opening balance for the day
+    (the total before that day's first change); the counters accumulate during
+    the day. Rows are created by the nightly `snapshot_aura` job or by the first
+    aura/connection/rating write of the day, whichever comes first.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="aura_snapshots"
+    )
+    date = models.DateField()
+    aura_points = models.IntegerField(default=0, help_text="Aura total at the start of the day")
+    connections_gained = models.IntegerField(default=0)
+    ratings_received = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Aura daily snapshot"
+        verbose_name_plural = "Aura daily snapshots"
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "date"], name="uniq_aura_snapshot_user_date"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user} {self.date}: {self.aura_points}"
+
+    @classmethod
+    def record(cls, user, connections: int = 0, ratings: int = 0) -> None:
+        """
+        Ensure today's snapshot exists for the user and bump its counters.
+
+        Must be called before the day's aura delta is applied so that a newly
+        created row captures the opening balance.
+        """
+        from django.db import IntegrityError, transaction
+
+        user_id = getattr(user, "pk", user)
+        today = timezone.localdate()
+        todays_row = cls.objects.filter(user_id=user_id, date=today)
+
+        if not (connections or ratings):
+            if todays_row.exists():
+                return
+        elif todays_row.update(
+            connections_gained=F("connections_gained") + connections,
+            ratings_received=F("ratings_received") + ratings,
+        ):
+            return
+
+        opening = AuraPoints.objects.filter(user_id=user_id).values_list("aura_points", flat=True).first()
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user_id=user_id, date=today, aura_points=opening or 0,
+                    connections_gained=connections, ratings_received=ratings,
+                )
+        except IntegrityError:
+            # Another request created today's row first
+            if connections or ratings:
+                todays_row.update(
+                    connections_gained=F("connections_gained") + connections,
+                    ratings_received=F("ratings_received") + ratings,
+                )
+
+    @classmethod
+    def history(cls, user, days: int, current_aura: int) -> dict:
+        """
+        Build per-day chart series for the last `days` days (oldest first) from a
+        single range read.
+
+        The end-of-day total for a day is the opening balance of the next snapshot
+        after it; days after the last snapshot end at `current_aura`.
+        """
+        from datetime import timedelta
+
+        today = timezone.localdate()
+        start = today - timedelta(days=days - 1)
+        rows = {
+            row.date: row
+            for row in cls.objects.filter(user=user, date__gte=start, date__lte=today)
+        }
+
+        dates = [start + timedelta(days=i) for i in range(days)]
+        aura_history = [0] * days
+        closing = current_aura
+        for i in range(days - 1, -1, -1):
+            aura_history[i] = closing
+            if dates[i] in rows:
+                closing = rows[dates[i]].aura_points
+
+        return {
+            "dates": dates,
+            "aura_history": aura_history,
+            # Total at the end of the day before the window started
+            "opening_aura": closing,
+            "connections_history": [rows[d].connections_gained if d in rows else 0 for d in dates],
+            "ratings_history": [rows[d].ratings_received if d in rows else 0 for d in dates],
+        }
+
+
+class AuraPeriodScore(models.Model):
+    """
+    Aura earned by a user within one week or month, backing the weekly and
+    monthly leaderboards. Rating, report and warning events add their points to
+    the rows of the period they happened in, so a new period simply starts with
+    new rows and nothing needs resetting at rollover.
+    """
+    class PeriodType(models.TextChoices):
+        WEEK = "week", "Week"
+        MONTH = "month", "Month"
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="aura_period_scores"
+    )
+    period_type = models.CharField(max_length=5, choices=PeriodType.choices)
+    period_start = models.DateField(help_text="Monday of the week or first day of the month")
+    points = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Aura period score"
+        verbose_name_plural = "Aura period scores"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "period_type", "period_start"], name="uniq_aura_period_score"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["period_type", "period_start", "-points", "id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user} {self.period_type} of {self.period_start}: {self.points}"
+
+    @classmethod
+    def period_start_for(cls, period_type: str, day=None):
+        """Get the first day of the week (Monday) or month containing `day` (default: today)."""
+        from datetime import timedelta
+
+        day = day or timezone.localdate()
+        if period_type == cls.PeriodType.WEEK:
+            return day - timedelta(days=day.weekday())
+        return day.replace(day=1)
+
+    @classmethod
+    def add(cls, user, points: int, at=None, create_missing: bool = True) -> None:
+        """
+        Add points to the user's week and month rows for the time `at` (default: now).
+
+        Deletions pass the original event's created_at with negated points so the
+        correction lands in the period the event was counted in, and
+        create_missing=False since the user may be mid-cascade.
+        """
+        from django.db import IntegrityError, transaction
+
+        if not points:
+            return
+        user_id = getattr(user, "pk", user)
+        day = timezone.localdate(at) if at else timezone.localdate()
+        for period_type in cls.PeriodType.values:
+            period_start = cls.period_start_for(period_type, day)
+            row = cls.objects.filter(user_id=user_id, period_type=period_type, period_start=period_start)
+            if row.update(points=F("points") + points) or not create_missing:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(
+                        user_id=user_id, period_type=period_type, period_start=period_start, points=points
+                    )
+            except IntegrityError:
+                # Another request created the row first
+                row.update(points=F("points") + points)
+
+
 # -----------------------------
 # Reports
 # -----------------------------
@@ -252,12 +896,15 @@ class Report(models.Model):
     )
     report_desc = models.TextField()
     report_status = models.CharField(max_length=20, choices=Status.choices, default=Status.OPEN)
+    # True for reports filed by the automated NSFW moderation, False for user-submitted ones
+    is_automated = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         indexes = [
             models.Index(fields=["reported_to", "report_status"]),
             models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["reported_to", "is_automated", "created_at"]),
         ]
 
     def __str__(self) -> str:
@@ -314,7 +961,8 @@ class DailyStreak(models.Model):
         """
         from datetime import timedelta
         today = timezone.now().date()
-        
+        previous_streak = self.current_streak
+
         if self.last_visit_date is None:
             # First visit
             self.current_streak = 1
@@ -322,7 +970,7 @@ class DailyStreak(models.Model):
             self.last_visit_date = today
         elif self.last_visit_date == today:
             # Already visited today, no change
-            pass
+            return
         elif self.last_visit_date == today - timedelta(days=1):
             # Consecutive day, increment streak
             self.current_streak += 1
@@ -336,6 +984,12 @@ class DailyStreak(models.Model):
         
         self.save()
 
+        # Keep the cached aura streak component in step with the new streak
+        streak_delta = (self.current_streak - previous_streak) * STREAK_POINTS_PER_DAY
+        if streak_delta:
+            AuraDailySnapshot.record(self.user_id)
+            AuraPoints.apply_delta(self.user_id, streak=streak_delta)
+
 
 # -----------------------------
 # Notifications
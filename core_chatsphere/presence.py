@@ -0,0 +1,146 @@
+"""
+Cluster-wide presence registry for WebSocket users.
+
+Each open socket is one entry in its user's set of live connections, scored
+by the time it expires. A socket refreshes its entry every
+PRESENCE_HEARTBEAT_INTERVAL seconds and entries older than PRESENCE_TTL are
+dropped, so a worker that dies without running disconnect() cannot leave its
+users online for ever. A user is online while they have at least one live
+connection; connect() and disconnect() report the transitions so that
+"online" and "offline" are only announced for the first and last tab.
+
+The Redis store shares the channel layer's server and works across Daphne
+workers. When the channel layer is the in-memory one (tests, single-process
+development) the in-memory store stands in for it.
+"""
+import time
+
+from django.conf import settings
+
+
+def presence_key(user_id):
+    return f"presence:{user_id}"
+
+
+class MemoryPresenceStore:
+    """Process-local store with the same interface as RedisPresenceStore."""
+
+    def __init__(self):
+        self._connections = {}
+
+    def _live(self, user_id, now):
+        connections = self._connections.get(int(user_id), {})
+        for connection_id, expires in list(connections.items()):
+            if expires <= now:
+                del connections[connection_id]
+        return connections
+
+    async def connect(self, user_id, connection_id):
+        """Register a live connection. Returns True when the user just came online."""
+        now = time.time()
+        connections = self._live(user_id, now)
+        first = not connections
+        connections[connection_id] = now + settings.PRESENCE_TTL
+        self._connections[int(user_id)] = connections
+        return first
+
+    async def heartbeat(self, user_id, connection_id):
+        """Push the connection's expiry PRESENCE_TTL seconds into the future."""
+        self._connections.setdefault(int(user_id), {})[connection_id] = time.time() + settings.PRESENCE_TTL
+
+    async def disconnect(self, user_id, connection_id):
+        """Drop a connection. Returns True when it was the user's last one."""
+        connections = self._live(user_id, time.time())
+        connections.pop(connection_id, None)
+        return not connections
+
+    async def connection_count(self, user_id):
+        return len(self._live(user_id, time.time()))
+
+    async def online_ids(self, user_ids):
+        """The subset of user_ids with at least one live connection."""
+        now = time.time()
+        return {int(user_id) for user_id in user_ids if self._live(user_id, now)}
+
+    def clear(self):
+        self._connections.clear()
+
+
+class RedisPresenceStore:
+    """Live connections per user in a Redis sorted set scored by expiry time."""
+
+    def __init__(self, url):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+
+    async def _touch(self, user_id, connection_id):
+        now = time.time()
+        key = presence_key(user_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zcard(key)
+            pipe.zadd(key, {connection_id: now + settings.PRESENCE_TTL})
+            pipe.expire(key, settings.PRESENCE_TTL)
+            _, live_before, _, _ = await pipe.execute()
+        return live_before
+
+    async def connect(self, user_id, connection_id):
+        """Register a live connection. Returns True when the user just came online."""
+        return await self._touch(user_id, connection_id) == 0
+
+    async def heartbeat(self, user_id, connection_id):
+        """Push the connection's expiry PRESENCE_TTL seconds into the future."""
+        await self._touch(user_id, connection_id)
+
+    async def disconnect(self, user_id, connection_id):
+        """Drop a connection. Returns True when it was the user's last one."""
+        key = presence_key(user_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(key, connection_id)
+            pipe.zremrangebyscore(key, "-inf", time.time())
+            pipe.zcard(key)
+            _, _, remaining = await pipe.execute()
+        return remaining == 0
+
+    async def connection_count(self, user_id):
+        return await self._redis.zcount(presence_key(user_id), time.time(), "+inf")
+
+    async def online_ids(self, user_ids):
+        """The subset of user_ids with at least one live connection, in one round trip."""
+        user_ids = [int(user_id) for user_id in user_ids]
+        if not user_ids:
+            return set()
+        now = time.time()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.zcount(presence_key(user_id), now, "+inf")
+            counts = await pipe.execute()
+        return {user_id for user_id, count in zip(user_ids, counts) if count}
+
+
+_stores = {}
+
+
+def channel_layer_redis_url():
+    """
+    The Redis URL of the default channel layer's first host, which may be
+    configured as a URL, an {"address": ...} dict or a (host, port) pair.
+    """
+    host = settings.CHANNEL_LAYERS["default"].get("CONFIG", {}).get("hosts", [("127.0.0.1", 6379)])[0]
+    if isinstance(host, dict):
+        host = host["address"]
+    if isinstance(host, str):
+        return host
+    return f"redis://{host[0]}:{host[1]}"
+
+
+def get_presence_store():
+    """The presence store matching the configured channel layer."""
+    backend = settings.CHANNEL_LAYERS["default"]["BACKEND"]
+    if backend.endswith("InMemoryChannelLayer"):
+        return _stores.setdefault("memory", MemoryPresenceStore())
+    url = channel_layer_redis_url()
+    if url not in _stores:
+        _stores[url] = RedisPresenceStore(url)
+    return _stores[url]
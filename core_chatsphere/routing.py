@@ -7,5 +7,6 @@ from django.urls import path
 from . import consumers
 
 websocket_urlpatterns = [
+    path("ws/user/", consumers.UserConsumer.as_asgi(), name="user"),
     path("ws/chat/<int:user_id>/", consumers.ChatConsumer.as_asgi(), name="chat"),
 ]
@@ -13,6 +13,9 @@ class ConversationMessageSerializer(serializers.ModelSerializer):
     sender_username = serializers.CharField(source='sender.username', read_only=True)
     sender_full_name = serializers.CharField(source='sender.full_name', read_only=True)
     receiver_username = serializers.CharField(source='receiver.username', read_only=True)
+    # Read state lives on the conversation's per-side watermark
+    is_read = serializers.SerializerMethodField()
+    read_at = serializers.SerializerMethodField()
 
     class Meta:
         model = ConversationMessage
@@ -25,7 +28,65 @@ class ConversationMessageSerializer(serializers.ModelSerializer):
             'receiver_username',
             'conv_message',
             'created_at',
+            'client_msg_id',
             'is_read',
             'read_at',
         ]
-        read_only_fields = ['id', 'created_at', 'read_at']
+        read_only_fields = ['id', 'created_at']
+
+    def get_is_read(self, obj):
+        return obj.conversation.is_read(obj.id, obj.receiver_id)
+
+    def get_read_at(self, obj):
+        if not self.get_is_read(obj):
+            return None
+        read_at = obj.conversation.read_state(obj.receiver_id)[1]
+        return _datetime_field.to_representation(read_at) if read_at else None
+
+
+# Columns read by the lean message serialization path
+MESSAGE_VALUE_FIELDS = ('id', 'sender_id', 'receiver_id', 'conv_message', 'created_at', 'client_msg_id')
+
+_datetime_field = serializers.DateTimeField()
+
+
+def serialize_message_rows(rows, users, conversation):
+    """
+    Build the ConversationMessageSerializer payload from `.values(*MESSAGE_VALUE_FIELDS)` rows.
+
+    A history page only involves two users, so their names come from a small map
+    instead of per-message joins, and the ModelSerializer machinery is skipped.
+
+    Args:
+        rows: Iterable of dicts with MESSAGE_VALUE_FIELDS keys
+        users: Iterable of the User instances taking part in the conversation
+        conversation: The Conversation the rows belong to, for the read watermarks
+
+    Returns:
+        list of dicts with the same shape as ConversationMessageSerializer(many=True).data
+    """
+    names = {user.id: (user.username, user.full_name) for user in users}
+    to_datetime = _datetime_field.to_representation
+    read_state = {}
+    for user_id in names:
+        watermark, read_at = conversation.read_state(user_id)
+        read_state[user_id] = (watermark, to_datetime(read_at) if read_at else None)
+
+    data = []
+    for row in rows:
+        watermark, read_at = read_state[row['receiver_id']]
+        is_read = row['id'] <= watermark
+        data.append({
+            'id': row['id'],
+            'sender': row['sender_id'],
+            'sender_username': names[row['sender_id']][0],
+            'sender_full_name': names[row['sender_id']][1],
+            'receiver': row['receiver_id'],
+            'receiver_username': names[row['receiver_id']][0],
+            'conv_message': row['conv_message'],
+            'created_at': to_datetime(row['created_at']),
+            'client_msg_id': str(row['client_msg_id']) if row['client_msg_id'] else None,
+            'is_read': is_read,
+            'read_at': read_at if is_read else None,
+        })
+    return data
@@ -1,10 +1,117 @@
 from __future__ import annotations
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from allauth.account.signals import user_signed_up
-from .models import AuraPoints, DailyStreak
+from .leaderboard import note_aura_change
+from .utils import invalidate_connection_cache, publish_ban, publish_notification
+from .models import (
+    AuraDailySnapshot, AuraPeriodScore, AuraPoints, BannedAcc, Connection, DailyStreak, ModerationLog, Notification,
+    RatingPoints, Report,
+    MANUAL_REPORT_PENALTY_POINTS, RATING_WEIGHTS, WARNING_PENALTY_POINTS,
+)
 
 
 @receiver(user_signed_up)
 def create_aura_for_social_signup(request, user, **kwargs):
     AuraPoints.objects.get_or_create(user=user)
     DailyStreak.objects.get_or_create(user=user)
+
+
+# ---------- Incremental aura updates ----------
+@receiver(post_save, sender=RatingPoints)
+def apply_rating_to_aura(sender, instance, created, **kwargs):
+    if created:
+        AuraDailySnapshot.record(instance.given_to_id, ratings=1)
+        AuraPoints.apply_delta(instance.given_to_id, ratings={instance.rate_points: 1})
+        AuraPeriodScore.add(instance.given_to_id, RATING_WEIGHTS[instance.rate_points], at=instance.created_at)
+    else:
+        # The previous star value is unknown here, so rebuild the histogram on next read
+        AuraPoints.mark_dirty(instance.given_to_id)
+
+
+@receiver(post_save, sender=Report)
+def apply_report_to_aura(sender, instance, created, **kwargs):
+    # Automated NSFW reports are penalised through their ModerationLog warning instead
+    if created and not instance.is_automated:
+        AuraDailySnapshot.record(instance.reported_to_id)
+        AuraPoints.apply_delta(instance.reported_to_id, manual_reports=1)
+        AuraPeriodScore.add(instance.reported_to_id, -MANUAL_REPORT_PENALTY_POINTS, at=instance.created_at)
+
+
+@receiver(post_save, sender=ModerationLog)
+def apply_warning_to_aura(sender, instance, created, **kwargs):
+    if created and instance.action_taken == ModerationLog.Action.WARNING:
+        AuraDailySnapshot.record(instance.user_id)
+        AuraPoints.apply_delta(instance.user_id, warnings=1)
+        AuraPeriodScore.add(instance.user_id, -WARNING_PENALTY_POINTS, at=instance.created_at)
+
+
+@receiver(post_save, sender=Connection)
+def mark_mutual_connection(sender, instance, created, **kwargs):
+    # A connection becomes mutual (and counts as gained) once both directions exist
+    if created and Connection.objects.filter(
+        user_id=instance.connection_with_id, connection_with_id=instance.user_id
+    ).exists():
+        Connection.set_mutual(instance.user_id, instance.connection_with_id, True)
+        instance.is_mutual = True
+        invalidate_connection_cache(instance.user_id, instance.connection_with_id)
+        AuraDailySnapshot.record(instance.user_id, connections=1)
+        AuraDailySnapshot.record(instance.connection_with_id, connections=1)
+
+
+@receiver(post_save, sender=BannedAcc)
+def disconnect_banned_user(sender, instance, **kwargs):
+    # Covers admin bans and automated moderation bans alike (both save the row)
+    if instance.active:
+        publish_ban(instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, created, **kwargs):
+    if created:
+        publish_notification(instance)
+
+
+@receiver(post_delete, sender=Connection)
+def unmark_mutual_connection(sender, instance, **kwargs):
+    if instance.is_mutual:
+        Connection.set_mutual(instance.user_id, instance.connection_with_id, False)
+        invalidate_connection_cache(instance.user_id, instance.connection_with_id)
+
+
+@receiver(post_delete, sender=RatingPoints)
+def revert_rating_on_delete(sender, instance, **kwargs):
+    AuraPoints.apply_delta(instance.given_to_id, ratings={instance.rate_points: -1}, create_missing=False)
+    AuraPeriodScore.add(
+        instance.given_to_id, -RATING_WEIGHTS[instance.rate_points], at=instance.created_at, create_missing=False
+    )
+
+
+@receiver(post_delete, sender=Report)
+def revert_report_on_delete(sender, instance, **kwargs):
+    if not instance.is_automated:
+        AuraPoints.apply_delta(instance.reported_to_id, manual_reports=-1, create_missing=False)
+        AuraPeriodScore.add(
+            instance.reported_to_id, MANUAL_REPORT_PENALTY_POINTS, at=instance.created_at, create_missing=False
+        )
+
+
+@receiver(post_delete, sender=ModerationLog)
+def revert_warning_on_delete(sender, instance, **kwargs):
+    if instance.action_taken == ModerationLog.Action.WARNING:
+        AuraPoints.apply_delta(instance.user_id, warnings=-1, create_missing=False)
+        AuraPeriodScore.add(
+            instance.user_id, WARNING_PENALTY_POINTS, at=instance.created_at, create_missing=False
+        )
+
+
+# ---------- Leaderboard cache ----------
+# apply_delta() reports its own UPDATEs; these cover full recalcs, new rows and deletions
+@receiver(post_save, sender=AuraPoints)
+def refresh_leaderboard_on_aura_save(sender, instance, **kwargs):
+    note_aura_change(instance.user_id, instance.aura_points)
+
+
+@receiver(post_delete, sender=AuraPoints)
+def refresh_leaderboard_on_aura_delete(sender, instance, **kwargs):
+    note_aura_change(instance.user_id, instance.aura_points)
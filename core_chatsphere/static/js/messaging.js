@@ -1,63 +1,147 @@
 /**
  * WebSocket client for real-time messaging
  * Handles connection, message sending/receiving, and read receipts
+ *
+ * Uses the per-user socket (ws/user/): frames are addressed to the open
+ * conversation by the other user's id, and the same socket also delivers
+ * notifications and bans.
+ *
+ * After a reconnect the client sends `resume` with the newest message id it
+ * has shown and the server streams only what it missed. Sent messages stay in
+ * pendingSends until the server echoes them with a stored id (or acks them
+ * with message_committed) and are re-sent after a resume; the server
+ * de-duplicates them by client_msg_id.
  */
 
 class MessagingClient {
     constructor(userId, currentUserId, getCsrfToken) {
-        this.userId = userId;
+        this.userId = parseInt(userId);
         this.currentUserId = parseInt(currentUserId);
         this.getCsrfToken = getCsrfToken;
         this.ws = null;
         this.wsUrl = null;
         this.isConnecting = false;
-        this.messageQueue = [];
+        // client_msg_id -> chat_message payload not yet stored by the server
+        this.pendingSends = new Map();
+        // Newest message id shown; null until the history has loaded
+        this.lastMessageId = null;
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
         this.reconnectDelay = 3000;
+        this.oldestMessageId = null;
+        this.hasMoreHistory = false;
+        this.isLoadingHistory = false;
     }
 
     /**
      * Initialize WebSocket connection and load message history
      */
     async init() {
-        // Load message history from API
+        // Load the latest page of message history from API
         await this.loadMessageHistory();
+        // Lazy-load older messages when scrolled to the top
+        this.watchHistoryScroll();
         // Connect to WebSocket
         this.connect();
     }
 
     /**
-     * Load message history from REST API
+     * Fetch one page of message history; pass beforeId to get older messages
+     */
+    async fetchHistoryPage(beforeId = null) {
+        const params = new URLSearchParams();
+        if (beforeId !== null) {
+            params.set('before_id', beforeId);
+        }
+        const response = await fetch(`/api/messages/${this.userId}/?${params.toString()}`);
+        if (!response.ok) {
+            return null;
+        }
+        const data = await response.json();
+        if (!data.success || !data.messages) {
+            return null;
+        }
+        this.hasMoreHistory = Boolean(data.has_more);
+        if (data.messages.length > 0) {
+            this.oldestMessageId = data.messages[0].id;
+        }
+        if (beforeId === null) {
+            this.trackMessageId(data.messages.length > 0 ? data.messages[data.messages.length - 1].id : 0);
+        }
+        // Normalize API field names to match WebSocket format
+        return data.messages.map(msg => ({
+            message_id: msg.id,
+            sender_id: msg.sender,
+            receiver_id: msg.receiver,
+            message: msg.conv_message,
+            created_at: msg.created_at,
+            client_msg_id: msg.client_msg_id,
+            is_read: msg.is_read,
+        }));
+    }
+
+    /**
+     * Load the latest messages from REST API
      */
     async loadMessageHistory() {
         try {
-            const response = await fetch(`/api/messages/${this.userId}/`);
-            if (response.ok) {
-                const data = await response.json();
-                if (data.success && data.messages) {
-                    // Display previous messages (normalize API field names to match WebSocket format)
-                    data.messages.forEach(msg => {
-                        this.displayMessage({
-                            message_id: msg.id,
-                            sender_id: msg.sender,
-                            receiver_id: msg.receiver,
-                            message: msg.conv_message,
-                            created_at: msg.created_at,
-                            is_read: msg.is_read,
-                        });
-                    });
-                    // Scroll to bottom
-                    this.scrollToBottom();
-                    // Mark messages as read
-                    this.markMessagesAsRead();
-                }
+            const messages = await this.fetchHistoryPage();
+            if (messages) {
+                // Display previous messages
+                messages.forEach(msg => this.displayMessage(msg));
+                // Scroll to bottom
+                this.scrollToBottom();
+                // Mark messages as read
+                this.markMessagesAsRead();
             }
         } catch (error) {
             console.error('Error loading message history:', error);
         }
     }
 
+    /**
+     * Load the page of messages before the oldest one shown, keeping the scroll position
+     */
+    async loadOlderMessages() {
+        if (this.isLoadingHistory || !this.hasMoreHistory || this.oldestMessageId === null) {
+            return;
+        }
+        const messagesContainer = document.querySelector('.chat-messages');
+        if (!messagesContainer) {
+            return;
+        }
+
+        this.isLoadingHistory = true;
+        try {
+            const messages = await this.fetchHistoryPage(this.oldestMessageId);
+            if (messages) {
+                const previousHeight = messagesContainer.scrollHeight;
+                // Prepend newest-first so the page ends up in chronological order
+                messages.slice().reverse().forEach(msg => this.displayMessage(msg, true));
+                messagesContainer.scrollTop += messagesContainer.scrollHeight - previousHeight;
+            }
+        } catch (error) {
+            console.error('Error loading older messages:', error);
+        } finally {
+            this.isLoadingHistory = false;
+        }
+    }
+
+    /**
+     * Trigger loadOlderMessages when the chat is scrolled near the top
+     */
+    watchHistoryScroll() {
+        const messagesContainer = document.querySelector('.chat-messages');
+        if (!messagesContainer) {
+            return;
+        }
+        messagesContainer.addEventListener('scroll', () => {
+            if (messagesContainer.scrollTop < 80) {
+                this.loadOlderMessages();
+            }
+        });
+    }
+
     /**
      * Connect to WebSocket
      */
@@ -68,7 +152,7 @@ class MessagingClient {
 
         this.isConnecting = true;
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        this.wsUrl = `${protocol}//${window.location.host}/ws/chat/${this.userId}/`;
+        this.wsUrl = `${protocol}//${window.location.host}/ws/user/`;
 
         try {
             this.ws = new WebSocket(this.wsUrl);
@@ -92,10 +176,55 @@ class MessagingClient {
         this.isConnecting = false;
         this.reconnectAttempts = 0;
 
-        // Send any queued messages
-        while (this.messageQueue.length > 0) {
-            const message = this.messageQueue.shift();
-            this.send(message);
+        // Join the open conversation and catch up on what arrived while we were away;
+        // the reply carries the other user's presence
+        if (this.lastMessageId === null) {
+            this.ws.send(JSON.stringify({ type: 'subscribe', conversation: this.userId }));
+        } else {
+            this.resume();
+        }
+    }
+
+    /**
+     * Ask for the messages after the newest one shown
+     */
+    resume() {
+        this.ws.send(JSON.stringify({
+            type: 'resume',
+            conversation: this.userId,
+            last_message_id: this.lastMessageId
+        }));
+    }
+
+    /**
+     * Handle the end of a resumed page: fetch the next one, or re-send unacknowledged messages
+     */
+    handleResumed(data) {
+        this.updateConnectionStatus(data.status === 'online');
+        this.trackMessageId(data.last_message_id);
+        if (data.has_more) {
+            this.resume();
+        } else {
+            this.flushPendingSends();
+        }
+    }
+
+    /**
+     * (Re-)send every message the server has not confirmed yet
+     */
+    flushPendingSends() {
+        if (!this.ws || this.ws.readyState !== WebSocket.OPEN) {
+            return;
+        }
+        this.pendingSends.forEach(payload => this.ws.send(JSON.stringify(payload)));
+    }
+
+    /**
+     * Remember the newest message id shown so a reconnect can resume after it
+     */
+    trackMessageId(messageId) {
+        if (messageId !== null && messageId !== undefined) {
+            this.lastMessageId = Math.max(this.lastMessageId || 0, Number(messageId));
         }
     }
 
@@ -106,8 +235,24 @@ class MessagingClient {
         try {
             const data = JSON.parse(event.data);
 
-            if (data.type === 'chat_message') {
+            if (data.type === 'notification') {
+                this.handleNotification(data);
+                return;
+            }
+            // Frames for other conversations are not shown on this page
+            if (data.conversation !== undefined && data.conversation !== this.userId) {
+                return;
+            }
+
+            if (data.type === 'subscribed') {
+                this.updateConnectionStatus(data.status === 'online');
+                this.flushPendingSends();
+            } else if (data.type === 'resumed') {
+                this.handleResumed(data);
+            } else if (data.type === 'chat_message') {
                 this.handleChatMessage(data);
+            } else if (data.type === 'message_committed') {
+                this.handleMessageCommitted(data);
             } else if (data.type === 'message_read') {
                 this.handleMessageRead(data);
             } else if (data.type === 'user_presence') {
@@ -126,8 +271,15 @@ class MessagingClient {
     onClose(event) {
         console.log('WebSocket closed');
         this.isConnecting = false;
+        this.ws = null;
         this.updateConnectionStatus(false);
 
+        // Banned while connected: the server closes with 4003
+        if (event.code === 4003) {
+            window.location.href = '/banned/';
+            return;
+        }
+
         if (!event.wasClean && this.reconnectAttempts < this.maxReconnectAttempts) {
             this.scheduleReconnect();
         }
@@ -168,43 +320,104 @@ class MessagingClient {
 
         const payload = {
             type: 'chat_message',
-            message: message
+            conversation: this.userId,
+            message: message,
+            client_msg_id: this.newClientMsgId()
         };
+        // Kept until the server confirms it, so a reconnect can retry it safely
+        this.pendingSends.set(payload.client_msg_id, payload);
 
         if (this.ws && this.ws.readyState === WebSocket.OPEN) {
             this.ws.send(JSON.stringify(payload));
         } else {
-            // Queue message if not connected
-            this.messageQueue.push(message);
             console.warn('WebSocket not connected. Message queued.');
         }
     }
 
+    /**
+     * A random UUID4 identifying one message across retries
+     */
+    newClientMsgId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, (c) => {
+            const r = Math.random() * 16 | 0;
+            return (c === 'x' ? r : (r & 0x3 | 0x8)).toString(16);
+        });
+    }
+
     /**
      * Handle incoming chat message
      */
     handleChatMessage(data) {
+        if (data.message_id) {
+            this.pendingSends.delete(data.client_msg_id);
+            this.trackMessageId(data.message_id);
+        }
         this.displayMessage(data);
         this.scrollToBottom();
 
-        // Mark message as read if we're the receiver
-        if (data.receiver_id === this.currentUserId && !data.is_read) {
+        // Mark message as read if we're the receiver (buffered messages wait for their ack)
+        if (data.message_id && data.receiver_id === this.currentUserId && !data.is_read) {
             this.markMessageAsRead(data.message_id);
         }
     }
 
     /**
-     * Handle message read receipt
+     * Handle the ack for buffered messages: they now have their stored ids
+     */
+    handleMessageCommitted(data) {
+        data.messages.forEach(({ client_msg_id, message_id }) => {
+            this.pendingSends.delete(client_msg_id);
+            this.trackMessageId(message_id);
+            const messageEl = document.querySelector(`[data-client-msg-id="${client_msg_id}"]`);
+            if (!messageEl) {
+                return;
+            }
+            messageEl.setAttribute('data-message-id', message_id);
+            if (messageEl.querySelector('.message-bubble.received')) {
+                this.markMessageAsRead(message_id);
+            }
+        });
+    }
+
+    /**
+     * Handle a read receipt: the other user has read every message up to up_to_id
      */
     handleMessageRead(data) {
-        const messageEl = document.querySelector(`[data-message-id="${data.message_id}"]`);
-        if (messageEl) {
+        if (data.user_id === this.currentUserId) {
+            return;
+        }
+        document.querySelectorAll('[data-message-id]').forEach((messageEl) => {
+            if (Number(messageEl.dataset.messageId) > data.up_to_id) {
+                return;
+            }
             const readEl = messageEl.querySelector('.message-read-status');
             if (readEl) {
                 readEl.textContent = '✓✓';
                 messageEl.classList.add('message-read');
             }
+        });
+    }
+
+    /**
+     * Handle a pushed notification by bumping the navbar badge
+     */
+    handleNotification(data) {
+        let badge = document.getElementById('notifications-badge');
+        if (!badge) {
+            const bell = document.querySelector('.nav-icon-link .fa-bell');
+            if (!bell) {
+                return;
+            }
+            badge = document.createElement('span');
+            badge.className = 'notification-badge';
+            badge.id = 'notifications-badge';
+            badge.textContent = '0';
+            bell.parentElement.appendChild(badge);
         }
+        badge.textContent = String(parseInt(badge.textContent || '0') + 1);
     }
 
     /**
@@ -218,16 +431,24 @@ class MessagingClient {
     }
 
     /**
-     * Display a message in the chat area
+     * Display a message in the chat area (prepend=true inserts it above older ones)
      */
-    displayMessage(msg) {
+    displayMessage(msg, prepend = false) {
         const messagesContainer = document.querySelector('.chat-messages');
         if (!messagesContainer) {
             return;
         }
 
         // Check if message already exists
-        if (document.querySelector(`[data-message-id="${msg.message_id}"]`)) {
+        if (msg.message_id && document.querySelector(`[data-message-id="${msg.message_id}"]`)) {
+            return;
+        }
+        const shownEl = msg.client_msg_id && document.querySelector(`[data-client-msg-id="${msg.client_msg_id}"]`);
+        if (shownEl) {
+            // A buffered message shown before its ack: a resumed copy carries the stored id
+            if (msg.message_id) {
+                shownEl.setAttribute('data-message-id', msg.message_id);
+            }
             return;
         }
 
@@ -235,7 +456,12 @@ class MessagingClient {
 
         const groupEl = document.createElement('div');
         groupEl.className = 'message-group';
-        groupEl.setAttribute('data-message-id', msg.message_id);
+        if (msg.message_id) {
+            groupEl.setAttribute('data-message-id', msg.message_id);
+        }
+        if (msg.client_msg_id) {
+            groupEl.setAttribute('data-client-msg-id', msg.client_msg_id);
+        }
 
         const bubbleEl = document.createElement('div');
         bubbleEl.className = `message-bubble ${isSent ? 'sent' : 'received'}`;
@@ -258,7 +484,11 @@ class MessagingClient {
 
         groupEl.appendChild(bubbleEl);
         groupEl.appendChild(timestampEl);
-        messagesContainer.appendChild(groupEl);
+        if (prepend) {
+            messagesContainer.prepend(groupEl);
+        } else {
+            messagesContainer.appendChild(groupEl);
+        }
     }
 
     /**
@@ -271,6 +501,7 @@ class MessagingClient {
 
         const payload = {
             type: 'mark_as_read',
+            conversation: this.userId,
             message_id: messageId
         };
 
@@ -586,11 +586,28 @@ async function cleanupAllStaleRooms() {
     }
 }
 
-// Check status periodically to kick banned users instantly from active calls
+// Bans are pushed over the per-user socket (closed with code 4003); the status
+// endpoint is only polled while that socket is down
 function startBanStatusHeartbeat() {
+    let userSocket = null;
+    const openUserSocket = () => {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        userSocket = new WebSocket(`${protocol}//${window.location.host}/ws/user/`);
+        userSocket.onclose = (event) => {
+            userSocket = null;
+            if (event.code === 4003) {
+                window.location.href = '/banned/';
+                return;
+            }
+            setTimeout(openUserSocket, 15000);
+        };
+    };
+    openUserSocket();
+
     setInterval(async () => {
         // Only run check if the user is actively in a call (has a currentRoomId)
         if (!currentRoomId) return;
+        if (userSocket && userSocket.readyState === WebSocket.OPEN) return;
 
         try {
             const response = await fetch('/api/check-status/');
@@ -1,11 +1,13 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from better_profanity import profanity
-from .models import Notification, ModerationLog, BannedAcc, AuraPoints
+from .models import Notification, ModerationLog, BannedAcc, AuraPoints, RatingPoints, Report
 
 User = get_user_model()
 
+@override_settings(AURA_RECALC_ASYNC=False)
 class ContentModerationTestCase(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="testuser", password="password123")
@@ -152,3 +154,910 @@ class ContentModerationTestCase(TestCase):
         self.assertFalse(Notification.objects.filter(user=self.user).exists())
 
 
+@override_settings(AURA_RECALC_ASYNC=False)
+class AuraLedgerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="rated", password="password123")
+        self.rater = User.objects.create_user(username="rater", password="password123")
+        self.aura = AuraPoints.objects.create(user=self.user)
+        cache.clear()
+
+    def test_events_apply_incremental_deltas(self):
+        """Test that ratings, reports and warnings update the cached components without recalc."""
+        RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=5)
+        RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=4)
+        Report.objects.create(user=self.rater, reported_to=self.user, report_desc="Rude")
+        Report.objects.create(
+            user=self.rater, reported_to=self.user,
+            report_desc="Automated Detection: Explicit video content (NSFW) detected on live call.",
+            is_automated=True,
+        )
+
+        self.aura.refresh_from_db()
+        self.assertEqual(self.aura.rating_component, 80)
+        self.assertEqual(self.aura.report_penalty, 50)
+        self.assertEqual(self.aura.aura_points, 30)
+
+        # A warning pushes the total below zero, which is clamped
+        ModerationLog.objects.create(
+            user=self.user,
+            content_type=ModerationLog.ContentType.VIDEO_NSFW,
+            source=ModerationLog.Source.SERVER,
+            action_taken=ModerationLog.Action.WARNING,
+            confidence=0.9,
+        )
+        self.aura.refresh_from_db()
+        self.assertEqual(self.aura.report_penalty, 200)
+        self.assertEqual(self.aura.aura_points, 0)
+
+        # The full recalc (repair path) agrees with the incremental ledger
+        expected = (self.aura.rating_component, self.aura.report_penalty, self.aura.aura_points)
+        self.aura.recalc()
+        self.assertEqual((self.aura.rating_component, self.aura.report_penalty, self.aura.aura_points), expected)
+
+    def test_streak_update_applies_delta(self):
+        """Test that a streak change is reflected in the streak component."""
+        from .models import DailyStreak
+        streak = DailyStreak.objects.create(user=self.user)
+        streak.update_streak()
+        streak.update_streak()  # Second visit on the same day is a no-op
+
+        self.aura.refresh_from_db()
+        self.assertEqual(self.aura.streak_component, 5)
+        self.assertEqual(self.aura.aura_points, 5)
+
+    def test_read_paths_only_recalc_dirty_rows(self):
+        """Test that profile views serve cached aura and only rebuild dirty rows."""
+        rating = RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=5)
+        self.aura.refresh_from_db()
+        self.aura.recalc()
+        self.client.login(username="rated", password="password123")
+
+        # A fresh, clean row is served as-is without any write
+        last_recalculated = self.aura.last_recalculated
+        response = self.client.get(reverse("profile"))
+        self.assertEqual(response.context["aura_points"], 50)
+        self.aura.refresh_from_db()
+        self.assertEqual(self.aura.last_recalculated, last_recalculated)
+
+        # Editing a rating marks the row dirty and the next read rebuilds it
+        rating.rate_points = 4
+        rating.save()
+        self.aura.refresh_from_db()
+        self.assertTrue(self.aura.is_dirty)
+        self.client.get(reverse("profile"))
+        self.aura.refresh_from_db()
+        self.assertFalse(self.aura.is_dirty)
+        self.assertEqual((self.aura.rating_count_4, self.aura.rating_count_5), (1, 0))
+        self.assertEqual(self.aura.aura_points, 30)
+
+    def test_recalc_on_stale_instance_keeps_concurrent_rating(self):
+        """Test that a recalc racing a rating neither loses the counter delta nor clears the dirty flag."""
+        stale = AuraPoints.objects.get(pk=self.aura.pk)
+        RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=5)
+        AuraPoints.mark_dirty(self.user)
+
+        self.assertEqual(stale.recalc(), 50)
+        self.aura.refresh_from_db()
+        self.assertEqual((self.aura.rating_count_5, self.aura.aura_points), (1, 50))
+        self.assertTrue(self.aura.is_dirty)
+
+        self.aura.rebuild()
+        self.aura.refresh_from_db()
+        self.assertEqual((self.aura.rating_count_5, self.aura.aura_points, self.aura.is_dirty), (1, 50, False))
+
+    def test_recalc_on_stale_instance_keeps_concurrent_report(self):
+        """Test that a recalc racing a manual report keeps the report counter and its penalty."""
+        RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=5)
+        stale = AuraPoints.objects.get(pk=self.aura.pk)
+        Report.objects.create(user=self.rater, reported_to=self.user, report_desc="Rude")
+
+        self.assertEqual(stale.recalc(), 0)
+        self.aura.refresh_from_db()
+        self.assertEqual((self.aura.manual_report_count, self.aura.report_penalty), (1, 50))
+
+    def test_rating_histogram_drives_rating_stats(self):
+        """Test that average, total and rating component come from the histogram."""
+        RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=5)
+        low = RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=2)
+        self.aura.refresh_from_db()
+        self.assertEqual(self.aura.total_ratings, 2)
+        self.assertEqual(self.aura.avg_rating, 3.5)
+        self.assertEqual(self.aura.rating_component, 55)
+
+        low.delete()
+        self.aura.refresh_from_db()
+        self.assertEqual(self.aura.rating_histogram, {5: 1, 4: 0, 3: 0, 2: 0, 1: 0})
+        self.assertEqual((self.aura.rating_sum, self.aura.rating_component), (5, 50))
+
+    def test_recompute_aura_command_repairs_drift(self):
+        """Test that the bulk recompute command rebuilds drifted and missing rows."""
+        from io import StringIO
+        from django.core.management import call_command
+
+        RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=3)
+        AuraPoints.objects.filter(user=self.user).update(aura_points=999, rating_component=999)
+
+        out = StringIO()
+        call_command("recompute_aura", "--dry-run", stdout=out)
+        self.assertIn("1 user(s) differed", out.getvalue())
+        self.assertEqual(AuraPoints.objects.get(user=self.user).aura_points, 999)
+
+        call_command("recompute_aura", "--chunk-size", "1", stdout=StringIO())
+        self.aura.refresh_from_db()
+        self.assertEqual((self.aura.rating_component, self.aura.aura_points), (15, 15))
+        self.assertTrue(AuraPoints.objects.filter(user=self.rater).exists())
+
+    def test_daily_snapshot_backs_history_chart(self):
+        """Test that the first write of the day snapshots the opening balance and counters."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import AuraDailySnapshot, Connection
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        AuraDailySnapshot.objects.create(user=self.user, date=yesterday, aura_points=0, ratings_received=1)
+        AuraPoints.objects.filter(user=self.user).update(rating_component=30, aura_points=30)
+
+        RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=5)
+        Connection.objects.create(user=self.user, connection_with=self.rater)
+        Connection.objects.create(user=self.rater, connection_with=self.user)
+
+        today = AuraDailySnapshot.objects.get(user=self.user, date=timezone.localdate())
+        self.assertEqual((today.aura_points, today.ratings_received, today.connections_gained), (30, 1, 1))
+
+        history = AuraDailySnapshot.history(self.user, 7, current_aura=80)
+        self.assertEqual(history["aura_history"][-3:], [0, 30, 80])
+        self.assertEqual(history["connections_history"][-1], 1)
+        self.assertEqual(history["opening_aura"], 0)
+
+    def test_penalty_counters_follow_creates_and_deletes(self):
+        """Test that warning/manual report counters track source rows without COUNT queries."""
+        report = Report.objects.create(user=self.rater, reported_to=self.user, report_desc="Spam")
+        warning = ModerationLog.objects.create(
+            user=self.user,
+            content_type=ModerationLog.ContentType.VIDEO_NSFW,
+            source=ModerationLog.Source.SERVER,
+            action_taken=ModerationLog.Action.WARNING,
+            confidence=0.9,
+        )
+        self.aura.refresh_from_db()
+        self.assertEqual((self.aura.manual_report_count, self.aura.warning_count), (1, 1))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.aura.manual_report_penalty + self.aura.warning_penalty, 200)
+
+        report.delete()
+        warning.delete()
+        self.aura.refresh_from_db()
+        self.assertEqual((self.aura.manual_report_count, self.aura.warning_count), (0, 0))
+        self.assertEqual(self.aura.report_penalty, 0)
+
+        # Deleting a reported user cascades without recreating their aura row
+        Report.objects.create(user=self.rater, reported_to=self.user, report_desc="Spam")
+        self.user.delete()
+        self.assertFalse(AuraPoints.objects.filter(user_id=self.aura.user_id).exists())
+
+    def test_rank_index_serves_around_me(self):
+        """Test that the rank index backs the user's rank and neighbours with and without a rebuild."""
+        from io import StringIO
+        from django.core.management import call_command
+
+        others = [User.objects.create_user(username=f"peer{i}", password="password123") for i in range(4)]
+        for points, other in zip((100, 80, 50, 10), others):
+            AuraPoints.objects.create(user=other, aura_points=points)
+        AuraPoints.objects.filter(user=self.user).update(aura_points=50)
+
+        self.client.force_login(self.user)
+        url = reverse("aura_leaderboard_around_me")
+
+        # Before a rebuild the lookup falls back to scanning the (aura_points, id) index
+        data = self.client.get(url, {"n": 1}).json()
+        self.assertEqual(data["rank"], 3)
+        self.assertEqual([e["username"] for e in data["results"]], ["peer1", "rated", "peer2"])
+
+        call_command("rebuild_aura_ranks", stdout=StringIO())
+        self.aura.refresh_from_db()
+        self.assertEqual((self.aura.aura_rank, self.aura.leaderboard_position), (3, 3))
+
+        data = self.client.get(url, {"n": 1}).json()
+        self.assertEqual(data["rank"], 3)
+        self.assertEqual([e["username"] for e in data["results"]], ["peer1", "rated", "peer2"])
+        self.assertEqual([e["rank"] for e in data["results"]], [2, 3, 3])
+
+        # Rows added or changed after the rebuild are placed live, not from the stale index
+        newcomer = User.objects.create_user(username="newcomer", password="password123")
+        AuraPoints.objects.create(user=newcomer, aura_points=60)
+        self.aura.aura_points = 55
+        self.aura.save(update_fields=["aura_points", "updated_at"])
+        data = self.client.get(url, {"n": 1}).json()
+        self.assertEqual(data["rank"], 4)
+        self.assertEqual([e["username"] for e in data["results"]], ["newcomer", "rated", "peer2"])
+        self.assertEqual([e["rank"] for e in data["results"]], [3, 4, 5])
+
+    def test_leaderboard_cursor_pagination(self):
+        """Test that cursor mode walks the leaderboard in both directions without counting."""
+        others = [User.objects.create_user(username=f"peer{i}", password="password123") for i in range(3)]
+        for points, other in zip((30, 20, 20), others):
+            AuraPoints.objects.create(user=other, aura_points=points)
+        url = reverse("aura_leaderboard")
+
+        first = self.client.get(url, {"pagination": "cursor", "limit": 2}).json()
+        self.assertNotIn("total", first)
+        self.assertIsNone(first["previous"])
+        self.assertEqual([e["username"] for e in first["results"]], ["peer0", "peer1"])
+
+        second = self.client.get(url, {"cursor": first["next"], "limit": 2, "include_total": "1"}).json()
+        self.assertEqual([e["username"] for e in second["results"]], ["peer2", "rated"])
+        self.assertEqual([e["position"] for e in second["results"]], [3, 4])
+        self.assertEqual(second["total"], 4)
+
+        back = self.client.get(url, {"cursor": second["previous"], "limit": 2}).json()
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+
+        self.assertEqual(self.client.get(url, {"cursor": "garbage!"}).status_code, 400)
+
+    def test_admin_aura_list_pages_without_counting(self):
+        """Test that the admin aura list takes its total from the cached leaderboard instead of a COUNT."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        User.objects.filter(pk=self.rater.pk).update(is_staff=True)
+        self.client.force_login(self.rater)
+        url = reverse("core_admin:aura_list")
+        self.assertEqual(self.client.get(url).context["total"], 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context["total"], 1)
+        self.assertFalse(any(
+            "COUNT(" in q["sql"] and "core_chatsphere_aurapoints" in q["sql"] for q in queries.captured_queries
+        ))
+
+    @override_settings(LEADERBOARD_CACHE_PAGES=1)
+    def test_leaderboard_cache_invalidates_on_range_changes(self):
+        """Test that cached top pages are served without queries and rebuilt only when the range changes."""
+        from .leaderboard import get_top_payload
+
+        others = [User.objects.create_user(username=f"peer{i}", password="password123") for i in range(11)]
+        for points, other in enumerate(others, start=10):
+            AuraPoints.objects.create(user=other, aura_points=points)
+        url = reverse("aura_leaderboard")
+
+        first = self.client.get(url).json()
+        self.assertEqual((first["total"], first["total_pages"]), (12, 2))
+        self.assertEqual(first["results"][0]["username"], "peer10")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json(), first)
+
+        # A change below the cached range keeps the cache
+        with self.captureOnCommitCallbacks(execute=True):
+            RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=1)
+        with self.assertNumQueries(0):
+            get_top_payload()
+
+        # A change that enters the cached range triggers a single rebuild
+        with self.captureOnCommitCallbacks(execute=True):
+            RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=5)
+        results = self.client.get(url).json()["results"]
+        self.assertEqual(results[0]["username"], "rated")
+        with self.assertNumQueries(0):
+            get_top_payload()
+
+    def test_leaderboard_cache_survives_version_eviction(self):
+        """Test that losing the version key never brings back a payload cached under an earlier version."""
+        from .leaderboard import _VERSION_KEY, get_top_payload
+
+        self.assertEqual(get_top_payload()["total"], 1)
+        cache.delete(_VERSION_KEY)
+        AuraPoints.objects.create(user=self.rater)
+        self.assertEqual(get_top_payload()["total"], 2)
+
+    def test_period_leaderboards_bucket_events(self):
+        """Test that weekly/monthly boards accumulate event deltas per period."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import AuraPeriodScore
+
+        RatingPoints.objects.create(given_by=self.rater, given_to=self.user, rate_points=5)
+        report = Report.objects.create(user=self.user, reported_to=self.rater, report_desc="Spam")
+        RatingPoints.objects.create(given_by=self.user, given_to=self.rater, rate_points=4)
+
+        # An event from a previous week lands in that week's bucket
+        last_week = timezone.now() - timedelta(days=7)
+        AuraPeriodScore.add(self.rater, 30, at=last_week)
+
+        data = self.client.get(reverse("aura_leaderboard"), {"period": "week"}).json()
+        self.assertEqual(
+            [(e["username"], e["aura_points"]) for e in data["results"]], [("rated", 50), ("rater", -20)]
+        )
+        self.assertEqual(data["period_start"], AuraPeriodScore.period_start_for("week").isoformat())
+
+        report.delete()
+        data = self.client.get(reverse("aura_leaderboard"), {"period": "week", "pagination": "cursor"}).json()
+        self.assertEqual([(e["username"], e["aura_points"]) for e in data["results"]], [("rated", 50), ("rater", 30)])
+        # Ids match the all-time board's AuraPoints ids
+        self.assertEqual(data["results"][0]["id"], self.aura.id)
+        self.assertEqual(self.client.get(reverse("aura_leaderboard"), {"period": "year"}).status_code, 400)
+
+    def test_mutual_flag_tracks_both_edges(self):
+        """Test that is_mutual is set on both edges when a connection becomes mutual and cleared on removal."""
+        from .models import Connection
+
+        Connection.objects.create(user=self.user, connection_with=self.rater)
+        self.assertFalse(Connection.objects.get(user=self.user).is_mutual)
+        self.assertEqual(Connection.mutual_count(self.user), 0)
+
+        Connection.objects.create(user=self.rater, connection_with=self.user)
+        self.assertEqual(Connection.objects.filter(is_mutual=True).count(), 2)
+        self.assertEqual(list(Connection.mutual_users(self.user)), [self.rater])
+        self.assertEqual(Connection.mutual_count(self.rater), 1)
+
+        Connection.objects.filter(user=self.rater).delete()
+        self.assertFalse(Connection.objects.get(user=self.user).is_mutual)
+        self.assertFalse(Connection.mutual_users(self.user).exists())
+
+    def test_adjacency_cache_serves_membership_without_queries(self):
+        """Test that mutual membership is cached per user and invalidated by Connection writes."""
+        from .models import Connection
+        from .utils import get_mutual_connection_ids, is_mutual_connection
+
+        self.assertFalse(is_mutual_connection(self.user.id, self.rater.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            Connection.objects.create(user=self.user, connection_with=self.rater)
+            Connection.objects.create(user=self.rater, connection_with=self.user)
+
+        self.assertTrue(is_mutual_connection(self.user.id, self.rater.id))
+        self.assertTrue(is_mutual_connection(self.rater.id, self.user.id))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_mutual_connection(self.rater.id, self.user.id))
+            self.assertEqual(get_mutual_connection_ids(self.user.id), {self.rater.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Connection.objects.filter(user=self.user).delete()
+        self.assertFalse(is_mutual_connection(self.rater.id, self.user.id))
+
+    @override_settings(ADJACENCY_CACHE_TTL=0)
+    def test_adjacency_cache_expires_without_shared_cache(self):
+        """Test that with a TTL the cached set picks up changes another process's version bump would miss."""
+        from .models import Connection
+        from .utils import is_mutual_connection
+
+        Connection.objects.create(user=self.user, connection_with=self.rater)
+        Connection.objects.create(user=self.rater, connection_with=self.user)
+        self.assertTrue(is_mutual_connection(self.user.id, self.rater.id))
+
+        # A write whose invalidation this process never saw
+        Connection.objects.filter(user=self.user).update(is_mutual=False)
+        self.assertFalse(is_mutual_connection(self.user.id, self.rater.id))
+
+    def test_adjacency_cache_survives_version_eviction(self):
+        """Test that losing the version key never brings back a set cached under an earlier version."""
+        from .models import Connection
+        from .utils import _adjacency_version_key, is_mutual_connection
+
+        Connection.objects.create(user=self.user, connection_with=self.rater)
+        Connection.objects.create(user=self.rater, connection_with=self.user)
+        self.assertTrue(is_mutual_connection(self.user.id, self.rater.id))
+
+        cache.delete(_adjacency_version_key(self.user.id))
+        Connection.objects.filter(user=self.user).update(is_mutual=False)
+        self.assertFalse(is_mutual_connection(self.user.id, self.rater.id))
+
+    def test_suggest_connections_ranks_friends_of_friends(self):
+        """Test that the batch job ranks second-degree users by shared connections and serves them."""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import Connection
+
+        def connect(a, b):
+            Connection.objects.create(user=a, connection_with=b)
+            Connection.objects.create(user=b, connection_with=a)
+
+        friend, other, popular, pending = (
+            User.objects.create_user(username=name, password="password123")
+            for name in ("friend", "other", "popular", "pending")
+        )
+        connect(self.user, friend)
+        connect(self.user, other)
+        connect(friend, popular)
+        connect(other, popular)
+        connect(friend, self.rater)
+        connect(friend, pending)
+        Connection.objects.create(user=self.user, connection_with=pending)
+
+        call_command("suggest_connections", "--top-k", "5", stdout=StringIO())
+
+        self.client.force_login(self.user)
+        data = self.client.get(reverse("connection_suggestions")).json()
+        self.assertEqual(
+            [(e["username"], e["mutual_connections"]) for e in data["results"]], [("popular", 2), ("rater", 1)]
+        )
+
+        # Aura weighting can lift a high-aura candidate above one with more shared connections
+        AuraPoints.objects.update_or_create(user=self.rater, defaults={"aura_points": 1000})
+        call_command("suggest_connections", "--aura-weight", "3", stdout=StringIO())
+        data = self.client.get(reverse("connection_suggestions")).json()
+        self.assertEqual([e["username"] for e in data["results"]], ["rater", "popular"])
+
+
+@override_settings(AURA_RECALC_ASYNC=False)
+class ConversationTestCase(TestCase):
+    def setUp(self):
+        from .message_cache import tail_cache
+
+        self.user = User.objects.create_user(username="rated", password="password123")
+        self.rater = User.objects.create_user(username="rater", password="password123")
+        cache.clear()
+        tail_cache.clear()
+
+    def test_conversation_tracks_last_message_and_unread(self):
+        """Test that sending and reading keep the conversation's inbox state in sync."""
+        from .models import Connection, Conversation
+
+        Connection.objects.create(user=self.user, connection_with=self.rater)
+        Connection.objects.create(user=self.rater, connection_with=self.user)
+        Conversation.send(self.rater, self.user, "hi")
+        last = Conversation.send(self.rater, self.user, "are you there?")
+
+        conversation = Conversation.between(self.user, self.rater)
+        self.assertEqual(conversation.last_message_id, last.id)
+        self.assertEqual((conversation.unread_for(self.user), conversation.unread_for(self.rater)), (2, 0))
+
+        self.client.force_login(self.user)
+        history = self.client.get(reverse("message_history", args=[self.rater.id])).json()
+        self.assertEqual([m["conv_message"] for m in history["messages"]], ["hi", "are you there?"])
+
+        response = self.client.get(reverse("startmessagechat", args=[self.rater.id]))
+        self.assertEqual(response.context["connected_users"][0].unread_count, 2)
+
+        self.client.post(reverse("mark_read", args=[self.rater.id]))
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.unread_for(self.user), 0)
+        self.assertEqual(list(Conversation.inbox(self.rater)), [conversation])
+
+    def test_message_history_cursor_pages(self):
+        """Test that history returns the latest page by default and walks older/newer pages by id."""
+        from .models import Conversation
+
+        sent = [Conversation.send(self.rater, self.user, f"m{i}") for i in range(5)]
+        self.client.force_login(self.user)
+        url = reverse("message_history", args=[self.rater.id])
+
+        latest = self.client.get(url, {"limit": 2}).json()
+        self.assertEqual([m["conv_message"] for m in latest["messages"]], ["m3", "m4"])
+        self.assertTrue(latest["has_more"])
+
+        older = self.client.get(url, {"limit": 2, "before_id": latest["messages"][0]["id"]}).json()
+        self.assertEqual([m["conv_message"] for m in older["messages"]], ["m1", "m2"])
+        oldest = self.client.get(url, {"limit": 2, "before_id": older["messages"][0]["id"]}).json()
+        self.assertEqual(([m["conv_message"] for m in oldest["messages"]], oldest["has_more"]), (["m0"], False))
+
+        newer = self.client.get(url, {"limit": 3, "after_id": sent[0].id}).json()
+        self.assertEqual(([m["conv_message"] for m in newer["messages"]], newer["has_more"]), (["m1", "m2", "m3"], True))
+        self.assertEqual(self.client.get(url, {"before_id": "x"}).status_code, 400)
+
+    def test_hot_conversation_history_is_served_from_tail_cache(self):
+        """Test that the latest page comes from the tail cache, follows new messages and reads, and reports stats."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .message_cache import tail_cache
+        from .models import Conversation
+
+        Conversation.send(self.rater, self.user, "m0")
+        self.client.force_login(self.user)
+        url = reverse("message_history", args=[self.rater.id])
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            latest = Conversation.send(self.rater, self.user, "m1")
+        Conversation.between(self.user, self.rater).mark_read(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            history = self.client.get(url).json()
+        self.assertFalse(any("core_chatsphere_conversationmessage" in q["sql"] for q in queries.captured_queries))
+        self.assertEqual([(m["conv_message"], m["is_read"]) for m in history["messages"]], [("m0", True), ("m1", True)])
+
+        # A message this process did not see makes the cached tail stale
+        missed = Conversation.send(self.rater, self.user, "m2")
+        history = self.client.get(url).json()
+        self.assertEqual([m["id"] for m in history["messages"]][-2:], [latest.id, missed.id])
+        self.assertEqual((tail_cache.hits, tail_cache.misses), (1, 2))
+
+        self.assertEqual(self.client.get(reverse("core_admin:chat_cache_stats")).status_code, 302)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        stats = self.client.get(reverse("core_admin:chat_cache_stats")).json()
+        self.assertEqual((stats["hits"], stats["misses"], stats["conversations"]), (1, 2, 1))
+
+    def test_message_history_values_path_matches_serializer(self):
+        """Test that the lean history serializer matches ConversationMessageSerializer field for field."""
+        import json
+        from .models import Conversation, ConversationMessage
+        from .serializers import MESSAGE_VALUE_FIELDS, ConversationMessageSerializer, serialize_message_rows
+
+        for i in range(3):
+            Conversation.send(self.rater, self.user, f"m{i}")
+            Conversation.send(self.user, self.rater, f"r{i}")
+        messages = ConversationMessage.objects.order_by("id")
+        conversation = Conversation.between(self.user, self.rater)
+        conversation.mark_read(self.user, up_to_id=messages[2].id)
+        conversation.refresh_from_db()
+
+        with self.assertNumQueries(1):
+            lean = serialize_message_rows(
+                messages.values(*MESSAGE_VALUE_FIELDS), (self.user, self.rater), conversation
+            )
+        reference = ConversationMessageSerializer(messages, many=True).data
+        self.assertEqual(json.loads(json.dumps(lean)), json.loads(json.dumps(reference)))
+        self.assertEqual(lean[1]["sender_username"], "rated")
+        self.assertEqual([m["is_read"] for m in lean], [True, False, True, False, False, False])
+
+    def test_read_watermark_only_moves_forward(self):
+        """Test that marking read is one conversation-row write and unread counts follow the watermark."""
+        from .context_processors import unread_messages_count
+        from .models import Conversation
+
+        incoming = [Conversation.send(self.rater, self.user, f"m{i}") for i in range(3)]
+        Conversation.send(self.user, self.rater, "reply")
+        conversation = Conversation.between(self.user, self.rater)
+
+        with self.assertNumQueries(2):  # the watermark UPDATE, then reading it back
+            watermark = conversation.mark_read(self.user, up_to_id=incoming[1].id)
+        self.assertEqual(watermark, incoming[1].id)
+        conversation.refresh_from_db()
+        self.assertEqual((conversation.unread_for(self.user), conversation.unread_for(self.rater)), (1, 1))
+        self.assertTrue(conversation.is_read(incoming[0].id, self.user))
+        self.assertFalse(conversation.is_read(incoming[2].id, self.user))
+
+        # Never backwards, never past the last message
+        self.assertIsNone(conversation.mark_read(self.user, up_to_id=incoming[0].id))
+        self.assertEqual(conversation.mark_read(self.rater, up_to_id=10**9), conversation.last_message_id)
+
+        request = RequestFactory().get("/")
+        request.user = self.user
+        self.assertEqual(unread_messages_count(request), {"unread_messages_count": 1})
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("mark_read", args=[self.rater.id])).json()
+        self.assertEqual(response["marked_as_read"], 1)
+        self.assertEqual(Conversation.total_unread(self.user), 0)
+
+    def test_write_behind_flush_logs_batch_it_cannot_spool(self):
+        """Test that a flush whose database write and spool write both fail logs the lost ids and keeps going."""
+        import uuid
+        from unittest import mock
+        from asgiref.sync import async_to_sync
+        from django.db import DatabaseError
+        from .message_buffer import MessageWriteBuffer
+        from .models import Conversation, ConversationMessage
+
+        buffer = MessageWriteBuffer()
+        draft = ConversationMessage(
+            sender_id=self.rater.id, receiver_id=self.user.id, conv_message="lost", client_msg_id=uuid.uuid4()
+        )
+        buffer._pending.append(draft)
+        with mock.patch.object(Conversation, "send_batch", side_effect=DatabaseError), \
+                override_settings(CHAT_WRITE_BEHIND_SPOOL="/nonexistent/spool.jsonl"), \
+                self.assertLogs("core_chatsphere.message_buffer", level="ERROR") as logs:
+            self.assertEqual(async_to_sync(buffer.flush)(), [])
+        self.assertIn(str(draft.client_msg_id), logs.output[-1])
+        self.assertEqual(len(buffer), 0)
+
+    def test_send_batch_stores_spooled_messages_once(self):
+        """Test that batched sends update every conversation and that replaying the spool is idempotent."""
+        import os
+        import tempfile
+        import uuid
+        from io import StringIO
+        from django.core.management import call_command
+        from .message_buffer import spool_messages
+        from .models import Conversation, ConversationMessage
+
+        third = User.objects.create_user(username="third", password="password123")
+        retried = uuid.uuid4()
+        drafts = [
+            ConversationMessage(sender_id=self.rater.id, receiver_id=self.user.id, conv_message="a", client_msg_id=retried),
+            ConversationMessage(sender_id=self.user.id, receiver_id=self.rater.id, conv_message="b", client_msg_id=uuid.uuid4()),
+            ConversationMessage(sender_id=third.id, receiver_id=self.user.id, conv_message="c", client_msg_id=uuid.uuid4()),
+            ConversationMessage(sender_id=self.rater.id, receiver_id=self.user.id, conv_message="a", client_msg_id=retried),
+        ]
+        saved = Conversation.send_batch(drafts)
+        self.assertEqual(ConversationMessage.objects.count(), 3)
+        self.assertEqual(saved[3].id, saved[0].id)
+
+        pair = Conversation.between(self.user, self.rater)
+        self.assertEqual(pair.last_message_id, saved[1].id)
+        self.assertEqual((pair.unread_for(self.user), pair.unread_for(self.rater)), (1, 1))
+        self.assertEqual(Conversation.between(self.user, third).unread_for(self.user), 1)
+
+        with tempfile.TemporaryDirectory() as spool_dir:
+            path = os.path.join(spool_dir, "spool.jsonl")
+            spool_messages(drafts[:1] + [
+                ConversationMessage(
+                    sender_id=third.id, receiver_id=self.user.id, conv_message="late",
+                    client_msg_id=uuid.uuid4(), created_at=saved[0].created_at,
+                ),
+            ], path=path)
+            call_command("replay_message_spool", "--path", path, stdout=StringIO())
+            self.assertFalse(os.path.exists(path))
+
+            # Bad rows go to the dead-letter file and do not hold back the rest of their batch
+            spool_messages([
+                ConversationMessage(
+                    sender_id=third.id, receiver_id=self.user.id, conv_message=None,
+                    client_msg_id=uuid.uuid4(), created_at=saved[0].created_at,
+                ),
+                ConversationMessage(
+                    sender_id=third.id, receiver_id=self.user.id, conv_message="after the bad row",
+                    client_msg_id=uuid.uuid4(), created_at=saved[0].created_at,
+                ),
+            ], path=path)
+            with open(path, "a", encoding="utf-8") as spool:
+                spool.write("{not json\n")
+            with self.assertLogs("core_chatsphere.management.commands.replay_message_spool", level="WARNING"):
+                call_command("replay_message_spool", "--path", path, stdout=StringIO())
+            self.assertFalse(os.path.exists(f"{path}.replaying"))
+            with open(f"{path}.dead", encoding="utf-8") as dead:
+                self.assertEqual(len(dead.readlines()), 2)
+        self.assertEqual(ConversationMessage.objects.count(), 5)
+        self.assertEqual(Conversation.between(self.user, third).unread_for(self.user), 3)
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    READ_RECEIPT_FLUSH_DELAY=0.05,
+    READ_RECEIPT_BATCH_SIZE=3,
+)
+class ChatConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        from .models import Connection
+
+        self.user = User.objects.create_user(username="reader", password="password123")
+        self.peer = User.objects.create_user(username="writer", password="password123")
+        Connection.objects.create(user=self.user, connection_with=self.peer)
+        Connection.objects.create(user=self.peer, connection_with=self.user)
+        cache.clear()
+        from .presence import get_presence_store
+
+        get_presence_store().clear()
+
+    async def _open(self, user, peer):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from .routing import websocket_urlpatterns
+
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/chat/{peer.id}/")
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def _connect(self):
+        communicator = await self._open(self.user, self.peer)
+        await communicator.receive_json_from()  # own presence broadcast
+        await communicator.receive_json_from()  # peer presence
+        return communicator
+
+    async def _receipt(self, communicator):
+        while True:
+            event = await communicator.receive_json_from(timeout=2)
+            if event["type"] == "message_read":
+                return event
+
+    def test_read_receipts_are_debounced_into_one_event(self):
+        """Test that receipts inside the debounce window become one UPDATE and one broadcast."""
+        from asgiref.sync import async_to_sync
+        from .models import Conversation
+
+        sent = [Conversation.send(self.peer, self.user, f"m{i}") for i in range(5)]
+
+        async def scenario():
+            communicator = await self._connect()
+            await communicator.send_json_to({"type": "mark_as_read", "message_id": sent[0].id})
+            await communicator.send_json_to({"type": "mark_as_read", "message_id": sent[1].id})
+            debounced = await self._receipt(communicator)
+
+            # Reaching the batch size flushes without waiting for the timer
+            await communicator.send_json_to({"type": "mark_as_read", "message_ids": [s.id for s in sent[2:]]})
+            batched = await self._receipt(communicator)
+
+            # Malformed ids are answered with an error frame and the socket stays open
+            await communicator.send_json_to({"type": "mark_as_read", "message_ids": 7})
+            rejected = await communicator.receive_json_from(timeout=2)
+            await communicator.send_json_to({"type": "mark_as_read", "message_ids": [{"id": 1}]})
+            rejected_items = await communicator.receive_json_from(timeout=2)
+            await communicator.disconnect()
+            return debounced, batched, rejected, rejected_items
+
+        debounced, batched, rejected, rejected_items = async_to_sync(scenario)()
+        self.assertEqual((rejected["type"], rejected_items["type"]), ("error", "error"))
+        self.assertEqual(debounced["up_to_id"], sent[1].id)
+        self.assertEqual(batched["up_to_id"], sent[4].id)
+        self.assertEqual(Conversation.between(self.user, self.peer).unread_for(self.user), 0)
+
+    @override_settings(CHAT_WRITE_BEHIND=True, CHAT_WRITE_BEHIND_BATCH_SIZE=2)
+    def test_write_behind_broadcasts_before_storing_and_acks(self):
+        """Test that buffered messages are broadcast without ids and acknowledged once stored in bulk."""
+        import uuid
+        from asgiref.sync import async_to_sync
+        from .models import ConversationMessage
+
+        client_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+
+        async def scenario():
+            communicator = await self._connect()
+            events = []
+            for client_id in client_ids:
+                await communicator.send_json_to({"type": "chat_message", "message": "hi", "client_msg_id": client_id})
+                events.append(await communicator.receive_json_from(timeout=2))
+            events.append(await communicator.receive_json_from(timeout=2))
+
+            # Retrying a message that was already flushed echoes it to the sender only
+            await communicator.send_json_to({"type": "chat_message", "message": "hi", "client_msg_id": client_ids[0]})
+            events.append(await communicator.receive_json_from(timeout=2))
+            self.assertTrue(await communicator.receive_nothing(timeout=0.3))
+            await communicator.disconnect()
+            return events
+
+        first, second, committed, retried = async_to_sync(scenario)()
+        self.assertEqual((first["message_id"], first["client_msg_id"]), (None, client_ids[0]))
+        self.assertEqual(second["client_msg_id"], client_ids[1])
+        self.assertEqual(committed["type"], "message_committed")
+
+        stored = dict(ConversationMessage.objects.values_list("client_msg_id", "id"))
+        self.assertEqual(
+            committed["messages"],
+            [{"client_msg_id": c, "message_id": stored[uuid.UUID(c)]} for c in client_ids],
+        )
+        self.assertEqual(retried["message_id"], stored[uuid.UUID(client_ids[0])])
+        self.assertEqual(ConversationMessage.objects.count(), 2)
+
+    def test_ban_closes_open_sockets_and_blocks_reconnect(self):
+        """Test that a ban is pushed to the user's open sockets and that connect re-checks it."""
+        from asgiref.sync import async_to_sync
+        from channels.db import database_sync_to_async
+        from .models import BannedAcc
+
+        async def scenario():
+            communicator = await self._connect()
+            await database_sync_to_async(BannedAcc.objects.create)(user=self.user, banned_reason="test")
+            closed = await communicator.receive_output(timeout=2)
+            await communicator.wait()
+            return closed
+
+        closed = async_to_sync(scenario)()
+        self.assertEqual((closed["type"], closed["code"]), ("websocket.close", 4003))
+
+        async def reconnect():
+            from channels.routing import URLRouter
+            from channels.testing import WebsocketCommunicator
+            from .routing import websocket_urlpatterns
+
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/chat/{self.peer.id}/")
+            communicator.scope["user"] = self.user
+            connected, _ = await communicator.connect()
+            return connected
+
+        self.assertFalse(async_to_sync(reconnect)())
+
+    def test_presence_counts_tabs_and_answers_bulk_queries(self):
+        """Test that a user stays online until their last tab closes and that presence is cluster-queryable."""
+        from asgiref.sync import async_to_sync
+        from .presence import get_presence_store
+
+        async def scenario():
+            store = get_presence_store()
+            first_tab = await self._connect()
+            second_tab = await self._open(self.user, self.peer)
+            peer_status = (await second_tab.receive_json_from())["status"]
+            self.assertEqual(await store.connection_count(self.user.id), 2)
+
+            watcher = await self._open(self.peer, self.user)
+            await first_tab.receive_json_from()  # peer came online
+            seen = [(await watcher.receive_json_from())["status"] for _ in range(2)]
+            online = await store.online_ids([self.user.id, self.peer.id, 999999])
+
+            await first_tab.disconnect()
+            self.assertTrue(await watcher.receive_nothing(timeout=0.1))
+            await second_tab.disconnect()
+            offline = await watcher.receive_json_from(timeout=2)
+            await watcher.disconnect()
+            return peer_status, seen, online, offline
+
+        peer_status, seen, online, offline = async_to_sync(scenario)()
+        self.assertEqual(peer_status, "offline")
+        self.assertEqual(seen, ["online", "online"])  # its own broadcast, then the user's status
+        self.assertEqual(online, {self.user.id, self.peer.id})
+        self.assertEqual((offline["user_id"], offline["status"]), (self.user.id, "offline"))
+
+        # The Redis store shares the channel layer's server, however its host is written
+        from .presence import channel_layer_redis_url
+
+        for host, url in (
+            ({"address": "redis://cache:6380", "socket_timeout": 15.0}, "redis://cache:6380"),
+            ("redis://cache:6381/2", "redis://cache:6381/2"),
+            (("cache", 6382), "redis://cache:6382"),
+        ):
+            layers = {"default": {"BACKEND": "channels_redis.core.RedisChannelLayer", "CONFIG": {"hosts": [host]}}}
+            with override_settings(CHANNEL_LAYERS=layers):
+                self.assertEqual(channel_layer_redis_url(), url)
+
+    def test_user_socket_multiplexes_conversations_and_notifications(self):
+        """Test that ws/user/ subscribes lazily, addresses frames by conversation and pushes notifications."""
+        from asgiref.sync import async_to_sync
+        from channels.db import database_sync_to_async
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from .models import Notification
+        from .routing import websocket_urlpatterns
+
+        stranger = User.objects.create_user(username="stranger", password="password123")
+
+        async def scenario():
+            socket = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/user/")
+            socket.scope["user"] = self.user
+            connected, _ = await socket.connect()
+            self.assertTrue(connected)
+
+            await socket.send_json_to({"type": "subscribe", "conversation": stranger.id})
+            refused = await socket.receive_json_from()
+            await socket.send_json_to({"type": "subscribe", "conversation": self.peer.id})
+            subscribed = await socket.receive_json_from()
+
+            peer_chat = await self._open(self.peer, self.user)
+            await socket.receive_json_from()  # the peer came online in this conversation
+            await peer_chat.send_json_to({"type": "chat_message", "message": "hello"})
+            delivered = await socket.receive_json_from(timeout=2)
+
+            await database_sync_to_async(Notification.objects.create)(user=self.user, title="Hi", message="pushed")
+            notified = await socket.receive_json_from(timeout=2)
+            await peer_chat.disconnect()
+            await socket.disconnect()
+            return refused, subscribed, delivered, notified
+
+        refused, subscribed, delivered, notified = async_to_sync(scenario)()
+        self.assertEqual((refused["type"], refused["conversation"]), ("error", stranger.id))
+        self.assertEqual(subscribed, {"type": "subscribed", "conversation": self.peer.id, "status": "offline"})
+        self.assertEqual(
+            (delivered["type"], delivered["conversation"], delivered["message"]),
+            ("chat_message", self.peer.id, "hello"),
+        )
+        self.assertEqual((notified["type"], notified["message"]), ("notification", "pushed"))
+
+    def test_resume_streams_missed_messages_and_retries_are_stored_once(self):
+        """Test that resume pages through missed messages with the peer's receipt and duplicate sends are idempotent."""
+        import uuid
+        from unittest import mock
+        from asgiref.sync import async_to_sync
+        from .models import Conversation, ConversationMessage
+
+        seen = Conversation.send(self.peer, self.user, "seen")
+        missed = [Conversation.send(self.peer, self.user, f"missed {i}") for i in range(2)]
+        mine = Conversation.send(self.user, self.peer, "mine")
+        Conversation.between(self.user, self.peer).mark_read(self.peer)
+        client_msg_id = str(uuid.uuid4())
+
+        async def scenario():
+            communicator = await self._connect()
+            await communicator.send_json_to({"type": "resume", "last_message_id": seen.id})
+            frames = [await communicator.receive_json_from(timeout=2) for _ in range(4)]
+
+            for _ in range(2):
+                await communicator.send_json_to(
+                    {"type": "chat_message", "message": "retried", "client_msg_id": client_msg_id}
+                )
+            echoes = [await communicator.receive_json_from(timeout=2) for _ in range(2)]
+            await communicator.disconnect()
+            return frames, echoes
+
+        with mock.patch("core_chatsphere.consumers.RESUME_PAGE_SIZE", 2):
+            frames, echoes = async_to_sync(scenario)()
+
+        self.assertEqual([f["type"] for f in frames], ["chat_message", "chat_message", "message_read", "resumed"])
+        self.assertEqual([f["message_id"] for f in frames[:2]], [m.id for m in missed])
+        self.assertEqual((frames[2]["user_id"], frames[2]["up_to_id"]), (self.peer.id, mine.id))
+        self.assertEqual(
+            frames[3],
+            {"type": "resumed", "conversation": self.peer.id, "last_message_id": missed[1].id,
+             "has_more": True, "status": "offline"},
+        )
+        stored = ConversationMessage.objects.get(client_msg_id=client_msg_id)
+        self.assertEqual([e["message_id"] for e in echoes], [stored.id, stored.id])
@@ -17,6 +17,7 @@ urlpatterns = [
     path("start_message_chat/<int:user_id>/", views.start_message_chat, name="startmessagechat"),
     path("connections/", views.connections, name="connections"),
     path("connections/remove/<int:user_id>/", views.remove_connection, name="remove_connection"),
+    path("api/connections/suggestions/", views.connection_suggestions, name="connection_suggestions"),
     path("privacy/", views.privacy_policy, name="privacy_policy"),
     path("report-user/", views.report_user, name="report_user"),
     path("submit-rating/", views.submit_rating, name="submit_rating"),
@@ -27,6 +28,7 @@ urlpatterns = [
     path("api/messages/<int:user_id>/", views.get_message_history, name="message_history"),
     path("api/messages/<int:user_id>/read/", views.mark_messages_as_read, name="mark_read"),
     path("api/aura/leaderboard/", views.aura_leaderboard, name="aura_leaderboard"),
+    path("api/aura/leaderboard/around-me/", views.aura_leaderboard_around_me, name="aura_leaderboard_around_me"),
     path("terms/", views.terms_conditions, name="terms_conditions"),
     path("notifications/", views.notifications_view, name="notifications"),
     path("banned/", views.banned_view, name="banned_view"),
@@ -1,10 +1,26 @@
 """
 Utility functions for ChatSphere platform.
-Includes streak tracking, aura calculations, and user activity handling.
+Includes streak tracking, aura calculations, user activity handling and the
+cached mutual-connection adjacency.
 """
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Background aura recalculation: user ids waiting for a recompute are coalesced
+# so a burst of reads for the same user schedules a single job.
+_pending_aura_recalcs: set = set()
+_pending_aura_lock = threading.Lock()
+_aura_recalc_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aura-recalc")
 
 
 def update_user_activity(user):
@@ -19,7 +35,7 @@ def update_user_activity(user):
 
     This will:
     1. Update the user's daily streak (consecutive login days)
-    2. Recalculate AuraPoints if needed
+    2. Apply any streak change to the cached AuraPoints components
 
     Args:
         user: The User instance to update
@@ -29,13 +45,13 @@ def update_user_activity(user):
     """
     from .models import DailyStreak, AuraPoints
 
-    # Update daily streak
+    # Ensure AuraPoints exist so the streak delta has a row to update
+    aura_points, _ = AuraPoints.objects.get_or_create(user=user)
+
+    # Update daily streak (applies its aura delta incrementally)
     daily_streak, created = DailyStreak.objects.get_or_create(user=user)
     daily_streak.update_streak()
-
-    # Ensure AuraPoints exist and recalculate
-    aura_points, _ = AuraPoints.objects.get_or_create(user=user)
-    aura_points.recalc()
+    aura_points.refresh_from_db(fields=["aura_points"])
 
     return {
         'current_streak': daily_streak.current_streak,
@@ -43,6 +59,181 @@ def update_user_activity(user):
     }
 
 
+def schedule_aura_recalc(user_id):
+    """
+    Queue a full AuraPoints recalculation for a user off the request thread.
+
+    Requests for a user that is already queued are coalesced. When
+    settings.AURA_RECALC_ASYNC is False the recalculation runs inline.
+
+    Args:
+        user_id: Primary key of the user whose aura should be rebuilt
+    """
+    if not getattr(settings, "AURA_RECALC_ASYNC", True):
+        _run_aura_recalc(user_id)
+        return
+
+    with _pending_aura_lock:
+        if user_id in _pending_aura_recalcs:
+            return
+        _pending_aura_recalcs.add(user_id)
+    _aura_recalc_executor.submit(_run_aura_recalc_job, user_id)
+
+
+def _run_aura_recalc_job(user_id):
+    # Leave the pending set first so a write landing mid-run can queue another pass
+    with _pending_aura_lock:
+        _pending_aura_recalcs.discard(user_id)
+    try:
+        _run_aura_recalc(user_id)
+    except Exception:
+        logger.exception("Background aura recalculation failed for user %s", user_id)
+    finally:
+        close_old_connections()
+
+
+def _run_aura_recalc(user_id):
+    from .models import AuraPoints
+
+    aura = AuraPoints.objects.filter(user_id=user_id).first()
+    if aura is None or not aura.needs_recalc:
+        return
+    # Dirty rows may have drifted counters; merely stale rows only need a recalc
+    if aura.is_dirty:
+        aura.rebuild()
+    else:
+        aura.recalc()
+
+
+def refresh_aura_if_stale(aura):
+    """
+    Serve the cached aura and schedule a background recompute when it is stale.
+
+    Read paths use this instead of calling recalc() so they stay write-free.
+
+    Args:
+        aura: The AuraPoints instance about to be displayed
+
+    Returns:
+        The same AuraPoints instance, unchanged
+    """
+    if aura.needs_recalc:
+        schedule_aura_recalc(aura.user_id)
+    return aura
+
+
+def _adjacency_version_key(user_id):
+    return f"adjacency:version:{user_id}"
+
+
+def get_mutual_connection_ids(user_id):
+    """
+    Get the ids of users mutually connected with a user, from cache when possible.
+
+    The set is cached under a per-user version that Connection writes bump, so
+    membership checks on a warm cache never touch the database. Without a shared
+    cache the bump only reaches this process, so the set also expires after
+    settings.ADJACENCY_CACHE_TTL seconds. A missing version (never set, or
+    evicted) starts from the current time, so it never matches a set cached
+    under an earlier version.
+
+    Args:
+        user_id: Primary key of the user
+
+    Returns:
+        frozenset of user ids
+    """
+    from .models import Connection
+
+    version = cache.get_or_set(_adjacency_version_key(user_id), time.time_ns, None)
+    key = f"adjacency:{user_id}:{version}"
+    mutual_ids = cache.get(key)
+    if mutual_ids is None:
+        mutual_ids = frozenset(
+            Connection.objects.filter(user_id=user_id, is_mutual=True).values_list("connection_with_id", flat=True)
+        )
+        cache.set(key, mutual_ids, settings.ADJACENCY_CACHE_TTL)
+    return mutual_ids
+
+
+def is_mutual_connection(user_id, other_user_id):
+    """Check whether two users are connected in both directions (cached)."""
+    return int(other_user_id) in get_mutual_connection_ids(user_id)
+
+
+def invalidate_connection_cache(*user_ids):
+    """
+    Drop the cached adjacency of the given users once the current transaction commits.
+
+    Args:
+        *user_ids: Primary keys of users whose mutual connections changed
+    """
+    def bump():
+        for user_id in user_ids:
+            try:
+                cache.incr(_adjacency_version_key(user_id))
+            except ValueError:
+                pass  # Nothing cached for this user yet
+
+    transaction.on_commit(bump)
+
+
+def user_group_name(user_id):
+    """Channel layer group joined by every open WebSocket of the user."""
+    return f"user_{user_id}"
+
+
+def chat_room_name(user_a, user_b):
+    """Channel layer group of the conversation between two users."""
+    low, high = sorted((int(user_a), int(user_b)))
+    return f"chat_{low}_{high}"
+
+
+def publish_to_user(user_id, event):
+    """
+    Send a channel layer event to every open WebSocket of the user once the
+    current transaction commits. A channel layer failure is logged, never
+    raised, so the write that triggered it still goes through.
+
+    Args:
+        user_id: Primary key of the recipient
+        event (dict): Channel layer message; its "type" names the consumer handler
+    """
+    def send():
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        try:
+            async_to_sync(get_channel_layer().group_send)(user_group_name(user_id), event)
+        except Exception:
+            logger.exception("Publishing %s to user %s failed", event.get("type"), user_id)
+
+    transaction.on_commit(send)
+
+
+def publish_ban(user_id):
+    """
+    Tell every open WebSocket of the user that they were banned. Consumers
+    close on the event, so bans do not have to be re-checked for each
+    incoming frame; the ban is re-checked when a socket reconnects.
+
+    Args:
+        user_id: Primary key of the banned user
+    """
+    publish_to_user(user_id, {"type": "account_banned"})
+
+
+def publish_notification(notification):
+    """Push a newly created Notification to the user's open WebSockets."""
+    publish_to_user(notification.user_id, {
+        "type": "notification",
+        "id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "created_at": notification.created_at.isoformat(),
+    })
+
+
 def get_user_aura_tier(aura_points):
     """
     Get the aura tier badge for a user based on their total aura points.
@@ -17,16 +17,27 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
+from django.db import transaction
 from . models import AuraPoints
 from django.core.paginator import Paginator
 
 
 from . import models
-from .serializers import ConversationMessageSerializer
-from django.db.models import Avg, Count
+from .serializers import MESSAGE_VALUE_FIELDS, serialize_message_rows
+from .message_cache import tail_cache
+from .utils import get_mutual_connection_ids, is_mutual_connection, refresh_aura_if_stale
+from django.db.models import F
+from .leaderboard import LEADERBOARD_PAGE_SIZE, cursor_page, get_neighbours, get_top_payload, get_user_rank, leaderboard_page
 
 User = get_user_model()
 
+# Day ranges offered by the home-page history charts
+HOME_HISTORY_RANGES = (7, 30, 90)
+
+# Message history page size (default and maximum)
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_PAGE_MAX = 200
+
 
 # ---------- Forms ----------
 class SignupForm(UserCreationForm):
@@ -132,15 +143,7 @@ def start_video_chat(request):
 
 def user_bidirectional_connections(request):
     """Return a list of bidirectionally connected users for the current user"""
-    outgoing_ids = set(
-        models.Connection.objects.filter(user=request.user).values_list('connection_with', flat=True)
-    )
-    incoming_ids = set(
-        models.Connection.objects.filter(connection_with=request.user).values_list('user', flat=True)
-    )
-    mutual_ids = outgoing_ids & incoming_ids
-    connected_users = User.objects.filter(id__in=mutual_ids)
-    return connected_users
+    return models.Connection.mutual_users(request.user)
 
 @login_required(login_url="signin")
 def start_message_chat(request, user_id=None): 
@@ -149,22 +152,24 @@ def start_message_chat(request, user_id=None):
         messages.error(request, "You are banned from using Message feature. Please contact support for more information.")
         return redirect("home")
     # Get only bidirectionally connected users
-    connected_users = user_bidirectional_connections(request)
-    user_connections = connected_users.values_list('id', flat=True)
-
-    from django.db.models import Count, Q as DQ
-    connected_users = User.objects.filter(id__in=user_connections).annotate(
-        unread_count=Count(
-            'sent_messages',
-            filter=DQ(sent_messages__receiver=request.user, sent_messages__is_read=False)
-        )
+    # Sidebar: connected users ordered by conversation activity, with unread counts from the Conversation rows
+    inbox = {
+        conversation.other_user_id(request.user): conversation
+        for conversation in models.Conversation.inbox(request.user)
+    }
+    inbox_order = {other_id: position for position, other_id in enumerate(inbox)}
+    connected_users = sorted(
+        user_bidirectional_connections(request), key=lambda u: inbox_order.get(u.id, len(inbox_order))
     )
+    for connected_user in connected_users:
+        conversation = inbox.get(connected_user.id)
+        connected_user.unread_count = conversation.unread_for(request.user) if conversation else 0
     
     selected_user = None
     if user_id:
         try:
             selected_user = User.objects.get(id=user_id)
-            if selected_user not in connected_users:
+            if not is_mutual_connection(request.user.id, selected_user.id):
                 messages.error(request, "You can only message connected users!")
                 return redirect("startmessagechat")
         except User.DoesNotExist:
@@ -191,6 +196,33 @@ def connections(request):
     return render(request, "connections.html", context)
 
 
+# API to get "people you may know" suggestions precomputed by suggest_connections
+@login_required(login_url="signin")
+def connection_suggestions(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+
+    # Each user has at most --top-k rows; skip anyone connected with since the last batch run
+    mutual_ids = get_mutual_connection_ids(request.user.id)
+    suggestions = (
+        models.ConnectionSuggestion.objects.filter(user=request.user)
+        .select_related('suggested_user').order_by('rank')
+    )
+    data = [
+        {
+            "id": suggestion.suggested_user_id,
+            "username": suggestion.suggested_user.username,
+            "full_name": suggestion.suggested_user.full_name,
+            "mutual_connections": suggestion.mutual_count,
+        }
+        for suggestion in suggestions
+        if suggestion.suggested_user_id not in mutual_ids
+    ]
+    return JsonResponse({"results": data[:limit]})
+
+
 @login_required(login_url="signin")
 def remove_connection(request, user_id):
     """Remove a connection between the current user and another user"""
@@ -209,115 +241,44 @@ def remove_connection(request, user_id):
 
 @login_required(login_url="signin")
 def home(request):
-    # Get or create aura points
-    aura, created = models.AuraPoints.objects.get_or_create(user=request.user)
-
-    # Get or create daily streak and update it
+    # Get or create daily streak and update it (applies the streak aura delta)
     streak, streak_created = models.DailyStreak.objects.get_or_create(user=request.user)
     streak.update_streak()
 
-    # Recalculate aura points after streak update
-    aura.recalc()
+    # Serve cached aura points; stale rows are recalculated in the background
+    aura, created = models.AuraPoints.objects.get_or_create(user=request.user)
+    refresh_aura_if_stale(aura)
+
+    # Chart range: 7 (default), 30 or 90 days, all served by one snapshot range read
+    try:
+        history_days = int(request.GET.get('range', 7))
+    except (TypeError, ValueError):
+        history_days = 7
+    if history_days not in HOME_HISTORY_RANGES:
+        history_days = 7
 
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    seven_days_ago = timezone.now() - timedelta(days=7)
-    
     # 1. Total Connections (Bidirectional)
-    bidirectional_users = user_bidirectional_connections(request)
-    total_connections = bidirectional_users.count()
-    
-    # 2. Connections Made in the Last 7 Days
-    connections_7_days = models.Connection.objects.filter(
-        user=request.user,
-        connection_with__in=bidirectional_users,
-        created_at__gte=seven_days_ago
-    ).count()
-    
-    # 3. Aura Gained/Lost in the Last 7 Days
-    new_ratings = models.RatingPoints.objects.filter(
-        given_to=request.user, 
-        created_at__gte=seven_days_ago
-    )
-    
-    RATING_WEIGHTS = {5: 50, 4: 30, 3: 15, 2: 5, 1: -5}
-    rating_aura_change = sum(RATING_WEIGHTS.get(r.rate_points, 0) for r in new_ratings)
-        
-    # Subtract Report Penalty (manual reports received in last 7 days)
-    new_reports_count = models.Report.objects.filter(
-        reported_to=request.user,
-        created_at__gte=seven_days_ago
-    ).exclude(report_desc__icontains="Automated Detection").count()
-    report_penalty_change = new_reports_count * 50
-    
-    # Subtract Warning Penalty (automated warning strikes in last 7 days)
-    from core_chatsphere.models import ModerationLog
-    new_warnings_count = models.ModerationLog.objects.filter(
-        user=request.user,
-        action_taken=models.ModerationLog.Action.WARNING,
-        created_at__gte=seven_days_ago
-    ).count()
-    warning_penalty_change = new_warnings_count * 150
-    
-    aura_gained_7_days = rating_aura_change - report_penalty_change - warning_penalty_change
-    
-    # 4. Average Rating
-    ratings_stats = models.RatingPoints.objects.filter(given_to=request.user).aggregate(
-        avg_rating=Avg('rate_points'),
-        total_ratings=Count('id')
-    )
-    avg_rating = round(ratings_stats['avg_rating'] or 0, 1)
-    total_ratings = ratings_stats['total_ratings'] or 0
+    total_connections = len(get_mutual_connection_ids(request.user.id))
+
+    # 2. Daily history from the AuraDailySnapshot rollup
+    history = models.AuraDailySnapshot.history(request.user, history_days, aura.aura_points)
+    chart_labels = [
+        d.strftime('%a') if history_days <= 7 else d.strftime('%b %d') for d in history['dates']
+    ]
+    connections_history = history['connections_history']
+    aura_history = history['aura_history']
+
+    # 3. Connections made and Aura gained/lost in the last 7 days
+    connections_7_days = sum(connections_history[-7:])
+    aura_before_7_days = history['opening_aura'] if history_days == 7 else aura_history[-8]
+    aura_gained_7_days = aura.aura_points - aura_before_7_days
+
+    # 4. Average Rating (from the cached rating histogram)
+    avg_rating = round(aura.avg_rating, 1)
+    total_ratings = aura.total_ratings
     
     # 5. Warning / Strikes Count
-    warning_count = models.ModerationLog.objects.filter(
-        user=request.user,
-        action_taken=models.ModerationLog.Action.WARNING
-    ).count()
-
-    # 6. Reconstruct Daily History for charts (last 7 days)
-    chart_labels = []
-    connections_history = []
-    aura_history = []
-    
-    ratings_7d = list(models.RatingPoints.objects.filter(given_to=request.user, created_at__gte=seven_days_ago).order_by('created_at'))
-    reports_7d = list(models.Report.objects.filter(reported_to=request.user, created_at__gte=seven_days_ago).exclude(report_desc__icontains="Automated Detection").order_by('created_at'))
-    warnings_7d = list(models.ModerationLog.objects.filter(user=request.user, action_taken=models.ModerationLog.Action.WARNING, created_at__gte=seven_days_ago).order_by('created_at'))
-    
-    current_aura_val = aura.aura_points
-    import datetime
-    
-    for i in range(7):
-        target_dt = timezone.now() - timedelta(days=i)
-        target_date = target_dt.date()
-        chart_labels.append(target_dt.strftime('%a'))
-        
-        day_start = timezone.make_aware(datetime.datetime.combine(target_date, datetime.time.min))
-        day_end = timezone.make_aware(datetime.datetime.combine(target_date, datetime.time.max))
-        
-        day_conns = models.Connection.objects.filter(
-            user=request.user,
-            connection_with__in=bidirectional_users,
-            created_at__range=(day_start, day_end)
-        ).count()
-        connections_history.append(day_conns)
-        
-        # Calculate aura at the end of this day
-        fut_ratings = [r for r in ratings_7d if r.created_at > day_end]
-        fut_reports = sum(1 for r in reports_7d if r.created_at > day_end)
-        fut_warnings = sum(1 for w in warnings_7d if w.created_at > day_end)
-        
-        fut_rating_change = sum(RATING_WEIGHTS.get(r.rate_points, 0) for r in fut_ratings)
-        fut_report_change = fut_reports * 50
-        fut_warning_change = fut_warnings * 150
-        
-        fut_delta = fut_rating_change - fut_report_change - fut_warning_change
-        aura_history.append(current_aura_val - fut_delta)
-        
-    chart_labels.reverse()
-    connections_history.reverse()
-    aura_history.reverse()
+    warning_count = aura.warning_count
 
     return render(request, "home.html", {
         'aura_points': aura.aura_points,
@@ -333,6 +294,8 @@ def home(request):
         'chart_labels': chart_labels,
         'connections_history': connections_history,
         'aura_history': aura_history,
+        'history_days': history_days,
+        'history_ranges': HOME_HISTORY_RANGES,
     })
 
 
@@ -344,20 +307,14 @@ def profile_view(request):
     # Get or create aura points
     aura, created = models.AuraPoints.objects.get_or_create(user=user)
 
-    # Recalculate to ensure latest values (ratings, streaks, verification, reports)
-    aura.recalc()
+    # Serve cached aura points; stale rows are recalculated in the background
+    refresh_aura_if_stale(aura)
 
-    # Calculate average rating
-    ratings_stats = models.RatingPoints.objects.filter(given_to=user).aggregate(
-        avg_rating=Avg('rate_points'),
-        total_ratings=Count('id')
-    )
     # Get total bidirectional connections
-    total_connections = user_bidirectional_connections(request).count()
+    total_connections = len(get_mutual_connection_ids(user.id))
 
     # Get list of connected users
-    user_connections = user_bidirectional_connections(request).values_list('id', flat=True)
-    connected_users_list = User.objects.filter(id__in=user_connections).all()[:5]
+    connected_users_list = user_bidirectional_connections(request)[:5]
 
     # Get daily streak information
     streak, _ = models.DailyStreak.objects.get_or_create(user=user)
@@ -367,8 +324,8 @@ def profile_view(request):
     context = {
         'user': user,
         'aura_points': aura.aura_points,
-        'avg_rating': ratings_stats['avg_rating'] or 0,
-        'total_ratings': ratings_stats['total_ratings'],
+        'avg_rating': aura.avg_rating,
+        'total_ratings': aura.total_ratings,
         'total_connections': total_connections or 0,
         'user_connections': connected_users_list,
         'streak_days': streak_days,
@@ -501,17 +458,15 @@ def report_user(request):
         # Format the report description with room context
         report_desc = f"[Room: {room_id}] [Reason: {reason}]\n\n{description}"
 
-        # Create the report
-        report = models.Report.objects.create(
-            user=request.user,
-            reported_to=reported_user,
-            report_desc=report_desc,
-            report_status=models.Report.Status.OPEN
-        )
-
-        # Update aura points for the reported user (report penalty applies)
-        aura_obj, _ = models.AuraPoints.objects.get_or_create(user=reported_user)
-        aura_obj.recalc()
+        # Create the report; the report penalty is applied to the reported
+        # user's aura by the post_save signal in the same transaction
+        with transaction.atomic():
+            report = models.Report.objects.create(
+                user=request.user,
+                reported_to=reported_user,
+                report_desc=report_desc,
+                report_status=models.Report.Status.OPEN
+            )
 
         return JsonResponse({
             'success': True,
@@ -600,22 +555,24 @@ def submit_rating(request):
                 'error': 'You have already rated this user today. Try again tomorrow.'
             }, status=400)
 
-        # Create the rating
-        rating = models.RatingPoints.objects.create(
-            given_by=request.user,
-            given_to=rated_user,
-            rate_points=rate_points
-        )
-
-        # Update aura points for the rated user
-        aura_obj, _ = models.AuraPoints.objects.get_or_create(user=rated_user)
-        aura_obj.recalc()
+        # Create the rating; the rated user's aura is updated incrementally
+        # by the post_save signal in the same transaction
+        with transaction.atomic():
+            rating = models.RatingPoints.objects.create(
+                given_by=request.user,
+                given_to=rated_user,
+                rate_points=rate_points
+            )
+
+        new_aura_points = models.AuraPoints.objects.filter(user=rated_user).values_list(
+            'aura_points', flat=True
+        ).first()
 
         return JsonResponse({
             'success': True,
             'message': 'Rating submitted successfully',
             'rating_id': rating.id,
-            'new_aura_points': aura_obj.aura_points
+            'new_aura_points': new_aura_points or 0
         })
 
     except json.JSONDecodeError:
@@ -774,28 +731,22 @@ def get_peer_stats(request, user_id):
                 'error': 'User not found'
             }, status=404)
 
-        # Get or create aura points and recalculate
+        # Get or create aura points (stale rows are recalculated in the background)
         aura, _ = models.AuraPoints.objects.get_or_create(user=peer_user)
-        aura.recalc()
-
-        # Get average rating and total ratings count
-        ratings_stats = models.RatingPoints.objects.filter(given_to=peer_user).aggregate(
-            avg_rating=Avg('rate_points'),
-            total_ratings=Count('id')
-        )
+        refresh_aura_if_stale(aura)
 
         # Check if user is new
         from django.utils import timezone
         from datetime import timedelta
 
         account_age_days = (timezone.now() - peer_user.date_joined).days
-        total_ratings = ratings_stats['total_ratings'] or 0
+        total_ratings = aura.total_ratings
         is_new_user = account_age_days < 4 and total_ratings < 3
 
         return JsonResponse({
             'success': True,
             'aura_points': aura.aura_points,
-            'avg_rating': round(ratings_stats['avg_rating'] or 0, 1),
+            'avg_rating': round(aura.avg_rating, 1),
             'total_ratings': total_ratings,
             'is_new_user': is_new_user,
             'account_age_days': account_age_days
@@ -814,7 +765,13 @@ def get_peer_stats(request, user_id):
 def get_message_history(request, user_id):
     """
     API endpoint to get message history between the current user and another user.
-    GET /api/messages/<user_id>/
+    GET /api/messages/<user_id>/?limit=50                 latest messages
+    GET /api/messages/<user_id>/?before_id=<id>&limit=50  older page, for lazy loading on scroll
+    GET /api/messages/<user_id>/?after_id=<id>&limit=50   newer page, for catching up
+    Messages are always returned oldest first; has_more tells whether another
+    page exists in the requested direction.
+    The latest page of recently opened conversations comes from this process's
+    tail cache (see message_cache) instead of a message query.
     """
     try:
         other_user = User.objects.get(id=user_id)
@@ -824,16 +781,41 @@ def get_message_history(request, user_id):
             status=status.HTTP_404_NOT_FOUND
         )
 
-    # Get all messages between the two users, ordered chronologically
-    messages_qs = models.ConversationMessage.objects.filter(
-        (models.Q(sender=request.user, receiver=other_user) |
-         models.Q(sender=other_user, receiver=request.user))
-    ).order_by('created_at')
+    try:
+        limit = min(max(int(request.GET.get('limit', MESSAGE_PAGE_SIZE)), 1), MESSAGE_PAGE_MAX)
+        before_id = int(request.GET['before_id']) if request.GET.get('before_id') else None
+        after_id = int(request.GET['after_id']) if request.GET.get('after_id') else None
+    except ValueError:
+        return Response({'error': 'Invalid pagination parameters'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Keyset page over the conversation's (conversation, id) index; ids follow creation order
+    page, has_more = [], False
+    conversation = models.Conversation.between(request.user, other_user)
+    if conversation:
+        messages_qs = models.ConversationMessage.objects.filter(
+            conversation=conversation
+        ).values(*MESSAGE_VALUE_FIELDS)
+        if after_id is not None:
+            page = list(messages_qs.filter(id__gt=after_id).order_by('id')[:limit + 1])
+            has_more = len(page) > limit
+            page = page[:limit]
+        elif before_id is None and (cached := tail_cache.get(conversation, limit)) is not None:
+            # Latest page of a hot conversation, straight from this process's tail cache
+            page, has_more = cached
+        elif before_id is None:
+            size = max(limit, settings.CHAT_TAIL_CACHE_MESSAGES)
+            tail = list(messages_qs.order_by('-id')[:size + 1])[::-1]
+            tail_cache.fill(conversation.pk, tail[-size:], len(tail) > size)
+            page, has_more = tail[-limit:], len(tail) > limit
+        else:
+            page = list(messages_qs.filter(id__lt=before_id).order_by('-id')[:limit + 1])
+            has_more = len(page) > limit
+            page = page[:limit][::-1]
 
-    serializer = ConversationMessageSerializer(messages_qs, many=True)
     return Response({
         'success': True,
-        'messages': serializer.data,
+        'messages': serialize_message_rows(page, (request.user, other_user), conversation) if conversation else [],
+        'has_more': has_more,
         'other_user': {
             'id': other_user.id,
             'username': other_user.username,
@@ -857,15 +839,12 @@ def mark_messages_as_read(request, user_id):
             status=status.HTTP_404_NOT_FOUND
         )
 
-    # Mark all unread messages from the other user as read
-    updated_count = models.ConversationMessage.objects.filter(
-        sender=other_user,
-        receiver=request.user,
-        is_read=False
-    ).update(
-        is_read=True,
-        read_at=timezone.now()
-    )
+    # Move the read watermark to the last message: one conversation row, not every unread message
+    updated_count = 0
+    conversation = models.Conversation.between(request.user, other_user)
+    if conversation:
+        updated_count = conversation.unread_for(request.user)
+        conversation.mark_read(request.user)
 
     return Response({
         'success': True,
@@ -874,8 +853,58 @@ def mark_messages_as_read(request, user_id):
 
 # Api view to get aura leaderboard
 def aura_leaderboard(request):
-    aura_qs = AuraPoints.objects.select_related('user').order_by('-aura_points')
-    paginator = Paginator(aura_qs, 10)
+    period = request.GET.get('period')
+    if period and period != 'all':
+        return _period_leaderboard(request, period)
+
+    aura_qs = AuraPoints.objects.select_related('user').order_by('-aura_points', 'id')
+
+    # Cursor mode: keyset pagination on (aura_points, id), count only on request
+    if 'cursor' in request.GET or request.GET.get('pagination') == 'cursor':
+        try:
+            limit = min(max(int(request.GET.get('limit', LEADERBOARD_PAGE_SIZE)), 1), 100)
+            page = leaderboard_page(request.GET.get('cursor'), limit)
+        except ValueError:
+            return JsonResponse({"error": "Invalid cursor or limit"}, status=400)
+        response = {
+            "results": [
+                {
+                    "id": entry["id"],
+                    "username": entry["username"],
+                    "aura_points": entry["aura_points"],
+                    "position": entry["position"],
+                }
+                for entry in page
+            ],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+        }
+        if request.GET.get('include_total') in ('1', 'true'):
+            response["total"] = get_top_payload()["total"]
+        return JsonResponse(response)
+
+    # The first pages are served from the cached payload
+    try:
+        page_number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page_number = 1
+    if page_number <= settings.LEADERBOARD_CACHE_PAGES:
+        payload = get_top_payload()
+        total_pages = max(1, -(-payload["total"] // LEADERBOARD_PAGE_SIZE))
+        page_number = min(page_number, total_pages)
+        start = (page_number - 1) * LEADERBOARD_PAGE_SIZE
+        if start < len(payload["entries"]):
+            return JsonResponse({
+                "results": [
+                    {"id": entry["id"], "username": entry["username"], "aura_points": entry["aura_points"]}
+                    for entry in payload["entries"][start:start + LEADERBOARD_PAGE_SIZE]
+                ],
+                "total": payload["total"],
+                "page": page_number,
+                "total_pages": total_pages,
+            })
+
+    paginator = Paginator(aura_qs, LEADERBOARD_PAGE_SIZE)
     page = paginator.get_page(request.GET.get('page'))
     data = [
         {
@@ -892,31 +921,112 @@ def aura_leaderboard(request):
         "total_pages": paginator.num_pages
     })
 
+def _period_leaderboard(request, period):
+    """
+    Weekly/monthly leaderboard read from the current period's AuraPeriodScore rows.
+    Entries keep the all-time shape, including its AuraPoints id, so rows can be
+    matched across boards; aura_points holds the points earned in the period.
+    """
+    if period not in models.AuraPeriodScore.PeriodType.values:
+        return JsonResponse({"error": "Invalid period"}, status=400)
+
+    period_start = models.AuraPeriodScore.period_start_for(period)
+    score_qs = models.AuraPeriodScore.objects.filter(
+        period_type=period, period_start=period_start
+    ).select_related('user').annotate(aura_id=F('user__aura__id'))
+
+    if 'cursor' in request.GET or request.GET.get('pagination') == 'cursor':
+        try:
+            limit = min(max(int(request.GET.get('limit', LEADERBOARD_PAGE_SIZE)), 1), 100)
+            page = cursor_page(score_qs, request.GET.get('cursor'), limit, field='points')
+        except ValueError:
+            return JsonResponse({"error": "Invalid cursor or limit"}, status=400)
+        response = {
+            "results": [
+                {
+                    "id": entry.aura_id,
+                    "username": entry.user.username,
+                    "aura_points": entry.points,
+                    "position": entry.position,
+                }
+                for entry in page
+            ],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+            "period": period,
+            "period_start": period_start.isoformat(),
+        }
+        if request.GET.get('include_total') in ('1', 'true'):
+            response["total"] = score_qs.count()
+        return JsonResponse(response)
+
+    paginator = Paginator(score_qs.order_by('-points', 'id'), LEADERBOARD_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get('page'))
+    return JsonResponse({
+        "results": [
+            {"id": entry.aura_id, "username": entry.user.username, "aura_points": entry.points}
+            for entry in page
+        ],
+        "total": paginator.count,
+        "page": page.number,
+        "total_pages": paginator.num_pages,
+        "period": period,
+        "period_start": period_start.isoformat(),
+    })
+
 # View to render aura leaderboard page for all users
 @login_required(login_url="signin")
 def aura_leaderboard_view(request):
-    aura_qs = AuraPoints.objects.select_related('user').order_by('-aura_points')
-
-    # Calculate current user's rank and aura
+    # Current user's rank and aura, read from the precomputed rank index
     user_aura = AuraPoints.objects.filter(user=request.user).first()
     if user_aura:
-        user_rank = AuraPoints.objects.filter(aura_points__gt=user_aura.aura_points).count() + 1
+        user_rank = get_user_rank(user_aura)
         user_aura_points = user_aura.aura_points
+        neighbours = get_neighbours(user_aura, n=2)
     else:
         user_rank = None
         user_aura_points = 0
+        neighbours = []
 
-    paginator = Paginator(aura_qs, 10)
-    page = paginator.get_page(request.GET.get('page'))
+    try:
+        page = leaderboard_page(request.GET.get('cursor'))
+    except ValueError:
+        page = leaderboard_page()
     context = {
         'aura_entries': page,
-        'total': paginator.count,
+        'total': get_top_payload()['total'],
         'user_rank': user_rank,
         'user_aura_points': user_aura_points,
+        'neighbours': neighbours,
     }
     return render(request, "aura_leaderboard.html", context)
 
 
+# API to get the leaderboard entries around the current user
+@login_required(login_url="signin")
+def aura_leaderboard_around_me(request):
+    try:
+        n = min(max(int(request.GET.get('n', 5)), 0), 50)
+    except ValueError:
+        return JsonResponse({"error": "Invalid n"}, status=400)
+
+    user_aura = AuraPoints.objects.filter(user=request.user).first()
+    if not user_aura:
+        return JsonResponse({"rank": None, "results": []})
+
+    data = [
+        {
+            "id": entry.id,
+            "username": entry.user.username,
+            "aura_points": entry.aura_points,
+            "rank": entry.aura_rank,
+            "is_me": entry.user_id == request.user.id,
+        }
+        for entry in get_neighbours(user_aura, n=n)
+    ]
+    return JsonResponse({"rank": get_user_rank(user_aura), "results": data})
+
+
 # -------------------------------------------------------------
 # CONTENT MODERATION, NOTIFICATIONS & POLICIES
 # -------------------------------------------------------------
@@ -991,77 +1101,77 @@ def moderate_frame(request):
                 ).count()
                 new_count = existing_violations_count + 1
                 
-                # 3. Deduct Aura points & create Report
-                Report.objects.create(
-                    user=request.user,  # Reporter is the peer
-                    reported_to=violating_user,
-                    report_desc="Automated Detection: Explicit video content (NSFW) detected on live call.",
-                    report_status=Report.Status.CLOSED
-                )
-                
-                # 4. Check Ban Threshold
-                if new_count >= 3:
-                    # Execute Ban
-                    BannedAcc.objects.update_or_create(
-                        user=violating_user,
-                        defaults={
-                            "banned_by": None,
-                            "banned_reason": "Automated Content Moderation: 3 NSFW video chat violations confirmed.",
-                            "active": True
-                        }
+                # Steps 3-4 run in one transaction; the WARNING log applies its
+                # aura penalty through the ModerationLog post_save signal
+                with transaction.atomic():
+                    # 3. Create Report
+                    Report.objects.create(
+                        user=request.user,  # Reporter is the peer
+                        reported_to=violating_user,
+                        report_desc="Automated Detection: Explicit video content (NSFW) detected on live call.",
+                        report_status=Report.Status.CLOSED,
+                        is_automated=True
                     )
-                    
-                    # Log Moderation action
-                    ModerationLog.objects.create(
-                        user=violating_user,
-                        content_type=ModerationLog.ContentType.VIDEO_NSFW,
-                        source=ModerationLog.Source.SERVER,
-                        action_taken=ModerationLog.Action.BAN,
-                        confidence=max([v["score"] for v in violations]),
-                        image_path=saved_path,
-                        details={"violations": violations}
-                    )
-                    
-                    # Notification: Account Suspended
-                    Notification.objects.create(
-                        user=violating_user,
-                        title="Your Account Has Been Banned",
-                        message=(
-                            "Your account has been permanently suspended due to repeated violations of our Terms of Service. "
-                            "Violation #3: Explicit video content was confirmed by our verification system. "
-                            "You are banned from using ChatSphere's matching and communication tools."
-                        ),
-                        image=saved_path
-                    )
-                    action_taken = "ban"
-                else:
-                    # Log Moderation action
-                    ModerationLog.objects.create(
-                        user=violating_user,
-                        content_type=ModerationLog.ContentType.VIDEO_NSFW,
-                        source=ModerationLog.Source.SERVER,
-                        action_taken=ModerationLog.Action.WARNING,
-                        confidence=max([v["score"] for v in violations]),
-                        image_path=saved_path,
-                        details={"violations": violations}
-                    )
-                    
-                    # Notification: Warning Issued
-                    Notification.objects.create(
-                        user=violating_user,
-                        title="Content Moderation Warning (NSFW Video)",
-                        message=(
-                            "Our automated systems detected inappropriate behavior/NSFW content on your video stream. "
-                            f"This is violation #{new_count} of 3. Reaching 3 violations will result in an automatic account ban. "
-                            "A penalty of 150 Aura Points has been applied to your account."
-                        ),
-                        image=saved_path
-                    )
-                    action_taken = "warning"
-                
-                # Recalculate aura points to enforce penalty
-                aura_obj, _ = AuraPoints.objects.get_or_create(user=violating_user)
-                aura_obj.recalc()
+
+                    # 4. Check Ban Threshold
+                    if new_count >= 3:
+                        # Execute Ban
+                        BannedAcc.objects.update_or_create(
+                            user=violating_user,
+                            defaults={
+                                "banned_by": None,
+                                "banned_reason": "Automated Content Moderation: 3 NSFW video chat violations confirmed.",
+                                "active": True
+                            }
+                        )
+
+                        # Log Moderation action
+                        ModerationLog.objects.create(
+                            user=violating_user,
+                            content_type=ModerationLog.ContentType.VIDEO_NSFW,
+                            source=ModerationLog.Source.SERVER,
+                            action_taken=ModerationLog.Action.BAN,
+                            confidence=max([v["score"] for v in violations]),
+                            image_path=saved_path,
+                            details={"violations": violations}
+                        )
+
+                        # Notification: Account Suspended
+                        Notification.objects.create(
+                            user=violating_user,
+                            title="Your Account Has Been Banned",
+                            message=(
+                                "Your account has been permanently suspended due to repeated violations of our Terms of Service. "
+                                "Violation #3: Explicit video content was confirmed by our verification system. "
+                                "You are banned from using ChatSphere's matching and communication tools."
+                            ),
+                            image=saved_path
+                        )
+                        action_taken = "ban"
+                    else:
+                        # Log Moderation action
+                        ModerationLog.objects.create(
+                            user=violating_user,
+                            content_type=ModerationLog.ContentType.VIDEO_NSFW,
+                            source=ModerationLog.Source.SERVER,
+                            action_taken=ModerationLog.Action.WARNING,
+                            confidence=max([v["score"] for v in violations]),
+                            image_path=saved_path,
+                            details={"violations": violations}
+                        )
+
+                        # Notification: Warning Issued
+                        Notification.objects.create(
+                            user=violating_user,
+                            title="Content Moderation Warning (NSFW Video)",
+                            message=(
+                                "Our automated systems detected inappropriate behavior/NSFW content on your video stream. "
+                                f"This is violation #{new_count} of 3. Reaching 3 violations will result in an automatic account ban. "
+                                "A penalty of 150 Aura Points has been applied to your account."
+                            ),
+                            image=saved_path
+                        )
+                        action_taken = "warning"
                 
                 return JsonResponse({
                     "status": "nsfw",